@@ -1,13 +1,21 @@
 import os
+import atexit
 import json
+import hashlib
+import heapq
 import random
 import re
 import logging
+import shutil
+import tempfile
+import threading
+import uuid
 import unicodedata
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import boto3
 import numpy as np
@@ -15,19 +23,42 @@ try:
     from openai import OpenAI  # type: ignore
 except ImportError:  # SDK nemusí být v lokálním prostředí
     OpenAI = None  # type: ignore
-from openpyxl import load_workbook
 
-from backend.services.tdd_prices import get_yearly_tdd_prices
+from backend.services.admission import AdmissionRejected, admit
+from backend.services.context_packer import pack_context
+from backend.services.embeddings import bedrock_body, get_embedder, project
+from backend.services.index_refresh import IndexRefresher, LocalS3Client
+from backend.services.index_shards import LEGACY_INDEX, MANIFEST_NAME, load_manifest
+from backend.services.json_codec import dumps_str as json_dumps, loads as json_loads
+from backend.services.offers import OfferQueue
+from backend.services.prefork import SharedStrings, SharedVocab, array_info, save_shared_array
+from backend.services.readiness import Readiness
+from backend.services.session_store import SessionStore
+from backend.services.singleflight import SingleFlight
+from backend.services.tdd_map import get_tariff_map, normalize_sazba, tdd_for_sazba
+from backend.services.tdd_prices import get_price_cube, get_yearly_tdd_prices, load_tdd_price_summary
 
 RAG_BUCKET = os.getenv("RAG_BUCKET", "")
 RAG_PREFIX = os.getenv("RAG_PREFIX", "index/")
 TOP_K = int(os.getenv("TOP_K", "5"))
+RAG_REFRESH_SECONDS = float(os.getenv("RAG_REFRESH_SECONDS", "300"))
+RAG_S3_LOCAL_ROOT = os.getenv("RAG_S3_LOCAL_ROOT", "")
+# matice indexu jako .npy namapované jen pro čtení – více procesů sdílí jednu kopii
+INDEX_MMAP = os.getenv("RAG_INDEX_MMAP", "0") not in ("0", "false", "False")
+# kolik shardů se prohledává souběžně (numpy při násobení matic uvolňuje GIL)
+SHARD_WORKERS = int(os.getenv("RAG_SHARD_WORKERS", str(min(8, os.cpu_count() or 2))))
 
 REG = os.getenv("AWS_REGION", "eu-central-1")
 EMB_ID = os.getenv("EMBEDDINGS_MODEL_ID", "amazon.titan-embed-text-v2:0")
 CHAT_ID = os.getenv("CHAT_MODEL_ID", "amazon.titan-text-lite-v1")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ENABLE_BEDROCK = os.getenv("ENABLE_BEDROCK", "1") not in ("0", "false", "False")
+# jak dlouho čeká požadavek na výsledek stejného, už rozběhnutého volání modelu
+SINGLEFLIGHT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_TIMEOUT", "30"))
+# kolikrát víc pasáží než TOP_K si session drží pro navazující dotazy
+SESSION_POOL_FACTOR = int(os.getenv("SESSION_POOL_FACTOR", "3"))
+# Lambda: zahřát už při inicializaci prostředí (na pozadí), ne až prvním dotazem
+WARMUP_ON_INIT = os.getenv("WARMUP_ON_INIT", "0") not in ("0", "false", "False")
 
 logger = logging.getLogger(__name__)
 
@@ -35,13 +66,31 @@ PROJECT_ROOT = Path(__file__).resolve().parent.parent
 DATA_DIR = PROJECT_ROOT / "rag" / "docs" / "data"
 
 br = None
-s3 = boto3.client("s3")
+s3 = LocalS3Client(RAG_S3_LOCAL_ROOT) if RAG_S3_LOCAL_ROOT else boto3.client("s3")
 _OPENAI = None
 
 INDEX_LOCAL = "/tmp/index.npz"
-CACHE = {"V": None, "chunks": None}
-LEX = {"matrix": None, "idf": None, "vocab": None}
-SAZBA_TO_TDD: Dict[str, str] = {}
+SHARDS_LOCAL = "/tmp/index_shards"
+# verzované .npy indexu a popis aktuální generace sdílené mezi pre-fork workery;
+# bez RAG_SHARED_DIR si writer založí soukromý adresář (0700) a předá ho workerům v prostředí
+SHARED_LOCAL = os.getenv("RAG_SHARED_DIR", "")
+SHARED_STATE = "generation.json"
+# načtené shardy indexu: {"name", "sha1", "offset", "cache", "lex"}; None = ještě nenačteno
+SHARDS: Optional[Tuple[dict, ...]] = None
+_INDEX_LOCK = threading.Lock()
+_LOAD_LOCK = threading.Lock()
+_REFRESHER: Optional[IndexRefresher] = None
+_SEARCH_POOL: Optional[ThreadPoolExecutor] = None
+# s INDEX_MMAP načítá a obnovuje index jediný proces (master před forkem); ostatní generace jen mapují
+_WRITER_PID: Optional[int] = None
+_SHARED_SEEN: Optional[Tuple[int, int]] = None
+# soubory, na které odkazuje poslední publikovaná generace (writer maže jen ty své)
+_SHARED_FILES: set = set()
+_FLIGHTS = SingleFlight()
+SESSIONS = SessionStore()
+READINESS = Readiness()
+# PDF nabídky po zadání e-mailu: výpočet, vykreslení a odeslání běží na pozadí
+OFFERS = OfferQueue(lambda sazba, consumption_mwh: compute_tariff_stats(sazba, consumption_mwh))
 TDD_PRICES: Dict[str, float] = {}
 
 DEFAULT_SAZBA = "D25D"
@@ -160,27 +209,386 @@ def _get_bedrock():
     return br
 
 
+def _get_openai():
+    global _OPENAI
+    if _OPENAI is None and OpenAI is not None and OPENAI_API_KEY:
+        _OPENAI = OpenAI(api_key=OPENAI_API_KEY)
+    return _OPENAI
+
+
+def _snapshot() -> Tuple[dict, ...]:
+    """Konzistentní sada shardů – rozběhnutý požadavek ji drží i přes výměnu indexu."""
+    with _INDEX_LOCK:
+        return SHARDS or ()
+
+
+def _swap_index(shards: Tuple[dict, ...]):
+    global SHARDS
+    with _INDEX_LOCK:
+        SHARDS = shards
+    if INDEX_MMAP and _WRITER_PID == os.getpid():
+        _publish_shared(shards)
+
+
+def _shared_dir() -> str:
+    """Adresář sdílených .npy; musí patřit tomuto uživateli a nesmí do něj psát nikdo jiný."""
+    global SHARED_LOCAL
+    if not SHARED_LOCAL:
+        SHARED_LOCAL = tempfile.mkdtemp(prefix="rag-index-")
+        os.environ["RAG_SHARED_DIR"] = SHARED_LOCAL
+        atexit.register(_remove_shared_dir, SHARED_LOCAL, os.getpid())
+        return SHARED_LOCAL
+    os.makedirs(SHARED_LOCAL, mode=0o700, exist_ok=True)
+    st = os.stat(SHARED_LOCAL)
+    if (hasattr(os, "getuid") and st.st_uid != os.getuid()) or st.st_mode & 0o022:
+        raise PermissionError(f"RAG_SHARED_DIR {SHARED_LOCAL} musí patřit tomuto uživateli a nesmí být zapisovatelný pro ostatní")
+    return SHARED_LOCAL
+
+
+def _remove_shared_dir(path: str, owner: int):
+    if os.getpid() == owner:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _share_index(cache: dict, lex: dict, prefix: str) -> Tuple[dict, dict]:
+    """Writer: celý shard (matice, texty chunků, zdroje, slovník) do .npy namapovaných jen pro čtení."""
+    cache = dict(cache)
+    if cache["V"] is not None:
+        cache["V"] = save_shared_array(f"{prefix}.vectors.npy", cache["V"])
+    cache["chunks"] = SharedStrings.save(f"{prefix}.chunks", cache["chunks"] or [])
+    if cache["sources"] is not None:
+        cache["sources"] = SharedStrings.save(f"{prefix}.sources", cache["sources"])
+        cache["pages"] = save_shared_array(f"{prefix}.pages.npy", np.asarray(cache["pages"], dtype="int64"))
+    if cache["projection"] is not None:
+        cache["projection"] = tuple(save_shared_array(f"{prefix}.projection{i}.npy", a) for i, a in enumerate(cache["projection"]))
+    lex = {
+        "matrix": save_shared_array(f"{prefix}.lex.npy", lex["matrix"]),
+        "idf": save_shared_array(f"{prefix}.idf.npy", lex["idf"]),
+        "vocab": SharedVocab.save(f"{prefix}.vocab", lex["vocab"]),
+    }
+    return cache, lex
+
+
+def _describe_shared(value):
+    """Namapovaná hodnota shardu -> JSON popis s cestami k .npy (skaláry beze změny)."""
+    if isinstance(value, np.memmap):
+        return {"npy": value.filename}
+    if isinstance(value, SharedStrings):
+        return {"strings": value.describe()}
+    if isinstance(value, SharedVocab):
+        return {"vocab": value.describe()}
+    if isinstance(value, tuple):
+        return {"tuple": [_describe_shared(v) for v in value]}
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    raise TypeError(f"Hodnotu typu {type(value).__name__} nelze sdílet mezi workery")
+
+
+def _open_shared(desc):
+    if not isinstance(desc, dict):
+        return desc
+    if "npy" in desc:
+        return np.load(desc["npy"], mmap_mode="r")
+    if "strings" in desc:
+        return SharedStrings.open(desc["strings"])
+    if "vocab" in desc:
+        return SharedVocab.open(desc["vocab"])
+    return tuple(_open_shared(v) for v in desc["tuple"])
+
+
+def _shared_paths(desc) -> set:
+    if isinstance(desc, dict):
+        return set().union(*(_shared_paths(v) for v in desc.values())) if desc else set()
+    if isinstance(desc, list):
+        return set().union(*(_shared_paths(v) for v in desc)) if desc else set()
+    return {desc} if isinstance(desc, str) and desc.endswith(".npy") else set()
+
+
+def _publish_shared(shards: Tuple[dict, ...]):
+    """
+    Writer zapíše JSON popis nové generace (cesty k .npy místo dat) a smaže
+    soubory své předchozí generace, na které už nový popis neodkazuje –
+    workery, které je ještě mají namapované, to neovlivní (unlink), nové je
+    už neotevřou.
+    """
+    global _SHARED_SEEN, _SHARED_FILES
+    state = [
+        {
+            "name": s["name"],
+            "sha1": s["sha1"],
+            "offset": s["offset"],
+            "cache": {k: _describe_shared(v) for k, v in s["cache"].items()},
+            "lex": {k: _describe_shared(v) for k, v in s["lex"].items()},
+        }
+        for s in shards
+    ]
+    path = os.path.join(_shared_dir(), SHARED_STATE)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(state, fh)
+    os.replace(tmp, path)
+    st = os.stat(path)
+    _SHARED_SEEN = (st.st_ino, st.st_mtime_ns)
+    keep = _shared_paths(state)
+    for stale in _SHARED_FILES - keep:
+        try:
+            os.remove(stale)
+        except FileNotFoundError:
+            pass
+    _SHARED_FILES = keep
+
+
+def _sync_shared():
+    """Worker: když writer publikoval novou generaci, namapuje její soubory a vymění sadu shardů (jinak jen stat)."""
+    global _SHARED_SEEN
+    if not SHARED_LOCAL:
+        return
+    path = os.path.join(SHARED_LOCAL, SHARED_STATE)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return
+    if (st.st_ino, st.st_mtime_ns) == _SHARED_SEEN:
+        return
+    with _LOAD_LOCK:
+        try:
+            with open(path, encoding="utf-8") as fh:
+                st = os.fstat(fh.fileno())
+                if (st.st_ino, st.st_mtime_ns) == _SHARED_SEEN:
+                    return
+                state = json.load(fh)
+            shards = tuple(
+                {
+                    "name": s["name"],
+                    "sha1": s["sha1"],
+                    "offset": s["offset"],
+                    "cache": {k: _open_shared(v) for k, v in s["cache"].items()},
+                    "lex": {k: _open_shared(v) for k, v in s["lex"].items()},
+                }
+                for s in state
+            )
+        except (OSError, ValueError) as exc:
+            # writer mezitím publikoval další generaci – zkusí se při příštím dotazu
+            logger.warning("Sdílenou generaci indexu se nepodařilo namapovat (%s), ponechávám původní.", exc)
+            return
+        _swap_index(shards)
+        _SHARED_SEEN = (st.st_ino, st.st_mtime_ns)
+
+
+def _load_index(path, name: str = "index", version: Optional[str] = None) -> Tuple[dict, dict]:
+    """Jeden soubor indexu (monolit nebo shard) -> (cache, lex); ``version`` (sha1 shardu) pojmenuje sdílené .npy."""
+    cache = {"V": None, "chunks": None, "sources": None, "pages": None, "embedding": None, "dim": None, "projection": None}
+    with np.load(path, allow_pickle=True) as data:
+        V = data["vectors"].astype("float32")
+        if V.size:
+            V /= (np.linalg.norm(V, axis=1, keepdims=True) + 1e-9)
+            cache["V"] = V
+        cache["chunks"] = data["chunks"].tolist()
+        # starší indexy (před streamovaným buildem) metadata nemají
+        # spec embeddingů, kterými byl index postaven (chybí = Bedrock)
+        if "embedding" in data.files:
+            cache["embedding"] = str(data["embedding"]) or None
+        # dimenze vektorů indexu; index zmenšený PCA nese i projekci dotazu
+        if "dim" in data.files:
+            cache["dim"] = int(data["dim"])
+            if V.size and V.shape[1] != cache["dim"]:
+                raise ValueError(f"Index {path}: vektory mají dimenzi {V.shape[1]}, metadata {cache['dim']}")
+        if "projection" in data.files:
+            cache["projection"] = (data["projection_mean"].astype("float32"), data["projection"].astype("float32"))
+        if "sources" in data.files:
+            cache["sources"] = data["sources"].tolist()
+            cache["pages"] = data["pages"].tolist()
+    lex = _compute_lex(cache["chunks"])
+    if INDEX_MMAP:
+        # každá verze do vlastních souborů – workery mapující starší verzi se nepřepisují pod rukama
+        cache, lex = _share_index(cache, lex, os.path.join(_shared_dir(), f"{name}-{(version or uuid.uuid4().hex)[:16]}"))
+    return cache, lex
+
+
+def _load_shards(entries: List[dict], resolve) -> Tuple[dict, ...]:
+    """
+    Sestaví sadu shardů podle manifestu. Shard se stejným jménem a ``sha1``
+    jako v aktuální sadě se převezme bez načítání, ostatní se stáhnou
+    (``resolve`` vrací lokální cestu) a načtou každý zvlášť – nový dokument
+    tak znamená načíst jen jeho shard.
+    """
+    current = {s["name"]: s for s in _snapshot()}
+    shards, offset = [], 0
+    for entry in entries:
+        name, sha1 = entry["name"], entry.get("sha1")
+        old = current.get(name)
+        if old is not None and sha1 and old["sha1"] == sha1:
+            cache, lex = old["cache"], old["lex"]
+        else:
+            cache, lex = _load_index(resolve(entry), name, sha1)
+            logger.info("Shard %s načten (%d chunků).", name, len(cache["chunks"]))
+        # id hitů jsou globální (offset shardu + pořadí v něm), aby je šlo slučovat napříč shardy
+        shards.append({"name": name, "sha1": sha1, "offset": offset, "cache": cache, "lex": lex})
+        offset += len(cache["chunks"])
+    return tuple(shards)
+
+
+def _reload_index(path):
+    _swap_index(_load_shards([{"name": "index", "sha1": None}], lambda _: path))
+
+
+def _reload_manifest(path):
+    """Lokální shardovaný index (``rag/out/manifest.json``): soubory shardů leží vedle manifestu."""
+    root = os.path.dirname(os.fspath(path))
+    _swap_index(_load_shards(load_manifest(path)["shards"], lambda e: os.path.join(root, e["file"])))
+
+
+def _fetch_shard(entry: dict) -> str:
+    path = os.path.join(SHARDS_LOCAL, f"{entry['name']}.npz")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    s3.download_file(RAG_BUCKET, RAG_PREFIX + entry["file"], tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def _reload_remote_manifest(path):
+    # načtené shardy drží data v paměti (nebo ve vlastních .npy), stažené .npz v /tmp už nejsou potřeba
+    _swap_index(_load_shards(load_manifest(path)["shards"], _fetch_shard))
+    for name in os.listdir(SHARDS_LOCAL):
+        if name.endswith(".npz"):
+            os.remove(os.path.join(SHARDS_LOCAL, name))
+
+
+def _index_refresher() -> IndexRefresher:
+    """Sleduje manifest shardů v S3; bez manifestu (starší nasazení) jediný ``index.npz``."""
+    os.makedirs(SHARDS_LOCAL, exist_ok=True)
+    try:
+        s3.head_object(Bucket=RAG_BUCKET, Key=RAG_PREFIX + MANIFEST_NAME)
+    except Exception:
+        return IndexRefresher(s3, RAG_BUCKET, RAG_PREFIX + LEGACY_INDEX, INDEX_LOCAL, _reload_index, RAG_REFRESH_SECONDS)
+    return IndexRefresher(
+        s3,
+        RAG_BUCKET,
+        RAG_PREFIX + MANIFEST_NAME,
+        os.path.join(SHARDS_LOCAL, MANIFEST_NAME),
+        _reload_remote_manifest,
+        RAG_REFRESH_SECONDS,
+    )
+
+
 def _ensure_index():
-    if CACHE["chunks"] is not None:
+    global _REFRESHER, _WRITER_PID
+    if _WRITER_PID is not None and _WRITER_PID != os.getpid():
+        _sync_shared()
         return
-    local = PROJECT_ROOT / "rag" / "out" / "index.npz"
-    path = local if local.exists() else None
-    if path is None:
-        s3.download_file(RAG_BUCKET, RAG_PREFIX + "index.npz", INDEX_LOCAL)
-        path = Path(INDEX_LOCAL)
-    data = np.load(path, allow_pickle=True)
-    V = data["vectors"].astype("float32")
-    if V.size:
-        V /= (np.linalg.norm(V, axis=1, keepdims=True) + 1e-9)
-        CACHE["V"] = V
-    CACHE["chunks"] = data["chunks"].tolist()
-    _build_lex_index()
-
-
-def _build_lex_index():
-    if LEX["matrix"] is not None:
+    if SHARDS is not None:
         return
-    texts = CACHE.get("chunks") or []
+    # souběžné první dotazy (nebo dotaz během zahřívání) čekají na jedno načtení
+    with _LOAD_LOCK:
+        if SHARDS is not None:
+            return
+        if INDEX_MMAP:
+            # adresář vznikne ještě před forkem, aby ho workery zdědily
+            _WRITER_PID = os.getpid()
+            _shared_dir()
+        out = PROJECT_ROOT / "rag" / "out"
+        if (out / MANIFEST_NAME).exists():
+            _reload_manifest(out / MANIFEST_NAME)
+            return
+        if (out / LEGACY_INDEX).exists():
+            _reload_index(out / LEGACY_INDEX)
+            return
+        if _REFRESHER is None:
+            _REFRESHER = _index_refresher()
+        # první načtení proběhne synchronně, další kontroly ETagu už na pozadí
+        # (i po chybě – master s workery sám dotazy neobsluhuje, jinak by to znovu nezkusil)
+        try:
+            _REFRESHER.refresh()
+        finally:
+            _REFRESHER.start()
+
+
+def _search_pool() -> ThreadPoolExecutor:
+    global _SEARCH_POOL
+    with _INDEX_LOCK:
+        if _SEARCH_POOL is None:
+            _SEARCH_POOL = ThreadPoolExecutor(max_workers=max(1, SHARD_WORKERS), thread_name_prefix="shard-search")
+        return _SEARCH_POOL
+
+
+def _after_fork_in_child():
+    global _SEARCH_POOL, _INDEX_LOCK, _LOAD_LOCK
+    # vlákna fork nepřežijí a zámky mohl v okamžiku forku držet refresher rodiče – v dítěti by zůstaly zamčené
+    _INDEX_LOCK, _LOAD_LOCK = threading.Lock(), threading.Lock()
+    _SEARCH_POOL = None
+    if _REFRESHER is not None:
+        _REFRESHER._lock = threading.Lock()
+        # se sdíleným (mmap) indexem obnovuje jen writer, worker si nové generace jen namapuje
+        if _REFRESHER._thread is not None and _WRITER_PID is None:
+            _REFRESHER.start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _warm_prices():
+    cube = get_price_cube()
+    for year in cube.years():
+        cube.table(year)
+    load_tdd_price_summary()
+
+
+def _warm_clients():
+    _get_bedrock()
+    if CHAT_ID.startswith("openai:"):
+        _get_openai()
+    for spec in {shard["cache"].get("embedding") for shard in _snapshot()}:
+        if spec:
+            get_embedder(spec)
+
+
+def warmup_steps():
+    """Kroky zahřátí v pořadí: index (shardy včetně TF-IDF matic), sazby, ceny, klienti poskytovatelů."""
+    return [
+        ("index", _ensure_index),
+        ("tariffs", lambda: (_ensure_tariff_assets(), get_tariff_map().mapping())),
+        ("prices", _warm_prices),
+        ("clients", _warm_clients),
+    ]
+
+
+def warm_up(background: bool = False, extra_steps=()) -> Dict[str, object]:
+    """
+    Předem načte vše, co se jinak inicializuje líně prvním dotazem. Spustí se
+    jen jednou; stav (pro ``/ready``) vrací ``READINESS.status()``.
+    """
+    READINESS.start(list(warmup_steps()) + list(extra_steps), background)
+    return READINESS.status()
+
+
+def preload():
+    """Synchronní zahřátí před forkem workerů – workery zdědí načtená data i stav ready."""
+    warm_up(background=False)
+
+
+def flight_metrics() -> Dict[str, object]:
+    return _FLIGHTS.metrics()
+
+
+def index_memory() -> Dict[str, object]:
+    shards = _snapshot()
+    return {
+        "chunks": sum(len(s["cache"]["chunks"]) for s in shards),
+        "shards": [
+            {
+                "name": s["name"],
+                "chunks": len(s["cache"]["chunks"]),
+                "vectors": array_info(s["cache"].get("V")),
+                "lex": array_info(s["lex"].get("matrix")),
+            }
+            for s in shards
+        ],
+    }
+
+
+def _compute_lex(texts: List[str]) -> dict:
+    texts = texts or []
     tokens = [re.findall(r"\w+", (t or "").lower()) for t in texts]
     vocab: Dict[str, int] = {}
     for tok_list in tokens:
@@ -188,10 +596,11 @@ def _build_lex_index():
             if tok not in vocab:
                 vocab[tok] = len(vocab)
     if not vocab:
-        LEX["matrix"] = np.zeros((len(texts), 0), dtype="float32")
-        LEX["idf"] = np.zeros((0,), dtype="float32")
-        LEX["vocab"] = {}
-        return
+        return {
+            "matrix": np.zeros((len(texts), 0), dtype="float32"),
+            "idf": np.zeros((0,), dtype="float32"),
+            "vocab": {},
+        }
     df = np.zeros(len(vocab), dtype="float32")
     for tok_list in tokens:
         for tok in set(tok_list):
@@ -208,22 +617,11 @@ def _build_lex_index():
             matrix[i, j] = (cnt / denom) * idf[j]
         norm = np.linalg.norm(matrix[i]) + 1e-9
         matrix[i] /= norm
-    LEX["matrix"] = matrix
-    LEX["idf"] = idf
-    LEX["vocab"] = vocab
+    return {"matrix": matrix, "idf": idf, "vocab": vocab}
 
 
 def _ensure_tariff_assets():
-    global SAZBA_TO_TDD, TDD_PRICES
-    if not SAZBA_TO_TDD:
-        try:
-            wb = load_workbook(DATA_DIR / "D_sazba_TDD vazby.xlsx", data_only=True)
-            ws = wb.active
-            for sazba, tdd in ws.iter_rows(min_row=2, values_only=True):
-                if sazba and tdd:
-                    SAZBA_TO_TDD[sazba.strip().upper()] = tdd.strip().upper()
-        except Exception as exc:
-            logger.warning("Nepodařilo se načíst mapování sazeb: %s", exc)
+    global TDD_PRICES
     if not TDD_PRICES:
         try:
             yearly_prices = get_yearly_tdd_prices()
@@ -240,19 +638,25 @@ def _ensure_tariff_assets():
         TDD_PRICES[DEFAULT_TDD] = 2700.0
 
 
-def _embed_bedrock(text: str):
+def _embed_bedrock(text: str, model_id: str = EMB_ID, dimensions: Optional[int] = None):
+    # stejný vstup ve stejnou chvíli = jedno volání Bedrocku, vektor dostanou všichni
+    key = ("embed", model_id, dimensions, text)
+    return _FLIGHTS.do(key, lambda: _embed_upstream(text, model_id, dimensions), SINGLEFLIGHT_TIMEOUT)
+
+
+def _embed_upstream(text: str, model_id: str = EMB_ID, dimensions: Optional[int] = None):
     client = _get_bedrock()
     if client is None:
         raise RuntimeError("Bedrock není k dispozici.")
-    body = json.dumps({"inputText": text})
-    r = client.invoke_model(modelId=EMB_ID, body=body)
+    body = bedrock_body(text, model_id, dimensions)
+    r = admit(model_id, lambda: client.invoke_model(modelId=model_id, body=body))
     v = np.array(json.loads(r["body"].read())["embedding"], dtype="float32")
     v /= (np.linalg.norm(v) + 1e-9)
     return v
 
 
-def _lexical_vector(text: str):
-    vocab = LEX.get("vocab") or {}
+def _lexical_vector(text: str, lex: dict):
+    vocab = lex.get("vocab") or {}
     if not vocab:
         return np.zeros((0,), dtype="float32")
     tokens = re.findall(r"\w+", text.lower())
@@ -260,7 +664,7 @@ def _lexical_vector(text: str):
         return np.zeros((len(vocab),), dtype="float32")
     counts = Counter(tokens)
     vec = np.zeros((len(vocab),), dtype="float32")
-    idf = LEX["idf"]
+    idf = lex["idf"]
     denom = float(len(tokens))
     for tok, cnt in counts.items():
         j = vocab.get(tok)
@@ -271,34 +675,83 @@ def _lexical_vector(text: str):
     return vec / norm
 
 
-def _retrieve_from_matrix(matrix: np.ndarray, qv: np.ndarray, k: int) -> List[dict]:
+def _top_k(sims: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, sims.shape[0])
+    if k <= 0:
+        return np.zeros((0,), dtype="int64")
+    idx = np.argpartition(-sims, k - 1)[:k]
+    return idx[np.argsort(-sims[idx])]
+
+
+def _retrieve_from_matrix(matrix: np.ndarray, qv: np.ndarray, k: int, shard: dict) -> List[dict]:
     if matrix is None or qv.size == 0 or matrix.shape[1] != qv.shape[0]:
         return []
-    k = min(k, matrix.shape[0])
     sims = matrix @ qv
-    idx = np.argpartition(-sims, k - 1)[:k]
-    idx = idx[np.argsort(-sims[idx])]
-    return [{"score": float(sims[i]), "text": CACHE["chunks"][int(i)][:2000]} for i in idx]
+    return [_hit(int(i), float(sims[i]), shard) for i in _top_k(sims, k)]
 
 
-def _retrieve_hits(query: str, k: int) -> List[dict]:
-    _ensure_index()
-    V = CACHE.get("V")
-    if V is not None:
+def _hit(i: int, score: float, shard: dict) -> dict:
+    cache = shard["cache"]
+    hit = {"id": shard["offset"] + i, "score": score, "text": cache["chunks"][i][:2000], "shard": shard["name"]}
+    if cache.get("sources") is not None:
+        hit["source"] = cache["sources"][i]
+        hit["page"] = int(cache["pages"][i])
+    return hit
+
+
+def _hit_sources(hits: List[dict]) -> List[dict]:
+    seen = set()
+    out = []
+    for h in hits:
+        key = (h.get("source"), h.get("page"))
+        if key[0] is None or key in seen:
+            continue
+        seen.add(key)
+        out.append({"source": key[0], "page": key[1], "score": round(h["score"], 4)})
+    return out
+
+
+def _query_vectors(query: str, shards: Tuple[dict, ...]) -> Dict[Optional[str], Optional[np.ndarray]]:
+    """Vektor dotazu jednou pro každý backend embeddingů, kterým jsou shardy postavené (obvykle jeden); None = selhal."""
+    out: Dict[Optional[str], Optional[np.ndarray]] = {}
+    for shard in shards:
+        spec = shard["cache"].get("embedding")
+        if shard["cache"].get("V") is None or spec in out:
+            continue
         try:
-            qv = _embed_bedrock(query)
-            return _retrieve_from_matrix(V, qv, k)
+            out[spec] = _embed_spec(query, spec)
         except Exception as exc:
             logger.warning("Vektorové vyhledávání přes Bedrock selhalo (%s), přepínám na TF-IDF.", exc)
-    qv = _lexical_vector(query)
-    matrix = LEX["matrix"]
+            out[spec] = None
+    return out
+
+
+def _search_shard(shard: dict, query: str, k: int, vectors: Dict[Optional[str], Optional[np.ndarray]]) -> List[dict]:
+    cache, lex = shard["cache"], shard["lex"]
+    V = cache.get("V")
+    raw = vectors.get(cache.get("embedding")) if V is not None else None
+    if raw is not None:
+        try:
+            return _retrieve_from_matrix(V, _embed_query(query, cache, raw), k, shard)
+        except ValueError as exc:
+            logger.warning("Shard %s: %s, přepínám na TF-IDF.", shard["name"], exc)
+    matrix = lex["matrix"]
     if matrix is None:
         return []
-    k = min(k, matrix.shape[0])
+    qv = _lexical_vector(query, lex)
     sims = matrix @ qv if qv.size else np.zeros(matrix.shape[0])
-    idx = np.argpartition(-sims, k - 1)[:k]
-    idx = idx[np.argsort(-sims[idx])]
-    return [{"score": float(sims[i]), "text": CACHE["chunks"][int(i)][:2000]} for i in idx]
+    return [_hit(int(i), float(sims[i]), shard) for i in _top_k(sims, k)]
+
+
+def _retrieve_hits(query: str, k: int) -> List[dict]:
+    _ensure_index()
+    shards = _snapshot()
+    vectors = _query_vectors(query, shards)
+    if len(shards) <= 1:
+        return [hit for shard in shards for hit in _search_shard(shard, query, k, vectors)]
+    # top-k z každého shardu souběžně, pak sloučení podle skóre
+    results = _search_pool().map(lambda shard: _search_shard(shard, query, k, vectors), shards)
+    return heapq.nlargest(k, (hit for hits in results for hit in hits), key=lambda h: h["score"])
 
 
 def _fallback_answer(hits: List[dict]) -> str:
@@ -316,7 +769,45 @@ def _append_lead_hint(text: str) -> str:
     return text.rstrip() + "\n\n" + random.choice(LEAD_LINES_BUSINESS)
 
 
+def _embed_spec(text: str, spec: Optional[str]) -> np.ndarray:
+    """Dotaz vektorizuje stejný backend (a dimenze), jakým byl postaven index; lokální backend jde bez sítě."""
+    embedder = get_embedder(spec) if spec else None
+    if embedder is not None and embedder.local:
+        return embedder.embed([text])[0]
+    if embedder is not None:
+        return _embed_bedrock(text, embedder.model_id, embedder.dimensions)
+    return _embed_bedrock(text)
+
+
+def _embed_query(text: str, cache: dict, raw: Optional[np.ndarray] = None):
+    """
+    Vektor dotazu pro jeden index/shard (``raw`` = už spočtený vektor pro jeho
+    spec, sdílí se mezi shardy). U indexu zmenšeného PCA se vektor promítne
+    stejnou projekcí. Nesedí-li dimenze s indexem, vyhodí ValueError.
+    """
+    qv = _embed_spec(text, cache.get("embedding")) if raw is None else raw
+    if cache.get("projection") is not None:
+        qv = project(qv, *cache["projection"])
+    V = cache.get("V")
+    if V is not None and qv.shape[0] != V.shape[1]:
+        raise ValueError(f"dimenze dotazu {qv.shape[0]} neodpovídá indexu ({V.shape[1]})")
+    return qv
+
+
+def _query_key(q: str) -> str:
+    return re.sub(r"\s+", " ", _normalized(q)).strip(" ?!.")
+
+
 def _chat(ctx: str, q: str, hits: List[dict]) -> str:
+    key = ("chat", CHAT_ID, _query_key(q), hashlib.sha1(ctx.encode("utf-8")).hexdigest())
+    try:
+        return _FLIGHTS.do(key, lambda: _chat_upstream(ctx, q, hits), SINGLEFLIGHT_TIMEOUT)
+    except TimeoutError as exc:
+        logger.warning("%s, vracím fallback.", exc)
+        return _fallback_answer(hits)
+
+
+def _chat_upstream(ctx: str, q: str, hits: List[dict]) -> str:
     lead_hint = random.choice(LEAD_LINES_BUSINESS)
     prompt = (
         "Jsi Energo – firemní energetický poradce jménem Martin. Soustřeď se na B2B klientelu, "
@@ -336,7 +827,11 @@ def _chat(ctx: str, q: str, hits: List[dict]) -> str:
             "max_tokens": 400,
             "messages": [{"role": "user", "content": [{"type": "text", "text": prompt}]}],
         }
-        r = client.invoke_model(modelId=CHAT_ID, body=json.dumps(body))
+        try:
+            r = admit(CHAT_ID, lambda: client.invoke_model(modelId=CHAT_ID, body=json.dumps(body)))
+        except AdmissionRejected as exc:
+            logger.warning("%s, vracím fallback.", exc)
+            return _fallback_answer(hits)
         out = json.loads(r["body"].read())
         return _append_lead_hint(out["content"][0]["text"])
     if CHAT_ID.startswith("amazon.titan-text"):
@@ -347,22 +842,24 @@ def _chat(ctx: str, q: str, hits: List[dict]) -> str:
             "inputText": prompt,
             "textGenerationConfig": {"maxTokenCount": 400, "temperature": 0.2, "topP": 0.9},
         }
-        r = client.invoke_model(modelId=CHAT_ID, body=json.dumps(body))
+        try:
+            r = admit(CHAT_ID, lambda: client.invoke_model(modelId=CHAT_ID, body=json.dumps(body)))
+        except AdmissionRejected as exc:
+            logger.warning("%s, vracím fallback.", exc)
+            return _fallback_answer(hits)
         out = json.loads(r["body"].read())
         return _append_lead_hint(out["results"][0]["outputText"].strip())
     if CHAT_ID.startswith("openai:"):
         model = CHAT_ID.split(":", 1)[1] or "gpt-4o-mini"
-        global _OPENAI
         if OpenAI is None:
             logger.warning("OpenAI SDK není nainstalováno. Přepínám na fallback odpověď.")
             return _fallback_answer(hits)
-        if _OPENAI is None:
-            if not OPENAI_API_KEY:
-                logger.warning("Chybí OPENAI_API_KEY, nelze použít OpenAI chat. Přepínám na fallback.")
-                return _fallback_answer(hits)
-            _OPENAI = OpenAI(api_key=OPENAI_API_KEY)
+        client = _get_openai()
+        if client is None:
+            logger.warning("Chybí OPENAI_API_KEY, nelze použít OpenAI chat. Přepínám na fallback.")
+            return _fallback_answer(hits)
         try:
-            resp = _OPENAI.chat.completions.create(
+            resp = admit(CHAT_ID, lambda: client.chat.completions.create(
                 model=model,
                 messages=[
                     {"role": "system", "content": "Jsi český firemní energetický poradce jménem Martin. Zaměř se na B2B klienty, navrhuj analýzy spotřeby a výpočet úspor a buď proaktivní, ale nenásilný."},
@@ -370,7 +867,7 @@ def _chat(ctx: str, q: str, hits: List[dict]) -> str:
                 ],
                 max_tokens=400,
                 temperature=0.2,
-            )
+            ))
             return _append_lead_hint(resp.choices[0].message.content.strip())
         except Exception as exc:
             logger.warning("OpenAI odpověď selhala (%s). Přepínám na fallback.", exc)
@@ -409,8 +906,8 @@ def _extract_email(text: str) -> str:
 
 
 def _extract_sazba(text: str) -> str:
-    match = re.search(r"d\d{2}d", text.lower())
-    return match.group(0).upper() if match else ""
+    match = re.search(r"d\s*\d{2}\s*d", text.lower())
+    return normalize_sazba(match.group(0)) if match else ""
 
 
 def _extract_consumption_mwh(text: str) -> float:
@@ -425,12 +922,64 @@ def _fmt_currency(value: float) -> str:
     return f"{int(round(value))} Kč"
 
 
-def compute_tariff_stats(sazba: str, consumption_mwh: float, fixed_price_kwh: Optional[float] = None) -> Dict[str, float]:
+def _spot_price(tdd: str, year: Optional[int]) -> Tuple[float, Optional[int]]:
+    """Kč/MWh z předpočítané kostky cen pro daný rok; bez dat fallback na TDD_PRICES."""
+    try:
+        cube = get_price_cube()
+        price_year = cube.resolve_year(year)
+        price = cube.price(tdd, price_year)
+        if price:
+            return price, price_year
+    except FileNotFoundError:
+        pass
+    except Exception as exc:
+        logger.warning("Nepodařilo se načíst ceny TDD pro rok %s: %s", year, exc)
+    return TDD_PRICES.get(tdd, TDD_PRICES.get(DEFAULT_TDD, 2700.0)), None
+
+
+MONTH_NAMES = (
+    "Leden", "Únor", "Březen", "Duben", "Květen", "Červen",
+    "Červenec", "Srpen", "Září", "Říjen", "Listopad", "Prosinec",
+)
+
+
+def _monthly_breakdown(tdd: str, price_year: Optional[int], consumption: float, fix_price: float) -> Optional[Dict[str, list]]:
+    """Měsíční spotřeba, ceny a náklady spot/fix jako sloupce (jedna maticová operace nad tabulkou měsíc × TDD)."""
+    if price_year is None:
+        return None
+    try:
+        profile = get_price_cube().monthly_profile(tdd, price_year)
+    except Exception as exc:
+        logger.warning("Měsíční rozpad pro %s/%s není k dispozici: %s", tdd, price_year, exc)
+        return None
+    if profile is None:
+        return None
+    shares, spot = np.nan_to_num(profile.astype("float64"))
+    prices = np.column_stack([spot, np.full_like(spot, fix_price)])
+    consumption_m = consumption * shares
+    costs = consumption_m[:, None] * prices
+    return {
+        "month": list(range(1, 13)),
+        "month_name": list(MONTH_NAMES),
+        "consumption_mwh": consumption_m.round(4).tolist(),
+        "spot_price_per_mwh": prices[:, 0].round(2).tolist(),
+        "fix_price_per_mwh": prices[:, 1].round(2).tolist(),
+        "spot_cost": costs[:, 0].round(2).tolist(),
+        "fix_cost": costs[:, 1].round(2).tolist(),
+    }
+
+
+def compute_tariff_stats(
+    sazba: str,
+    consumption_mwh: float,
+    fixed_price_kwh: Optional[float] = None,
+    year: Optional[int] = None,
+) -> Dict[str, float]:
     _ensure_tariff_assets()
-    sazba = (sazba or DEFAULT_SAZBA).upper()
-    tdd = SAZBA_TO_TDD.get(sazba, DEFAULT_TDD)
+    sazba = normalize_sazba(sazba) or DEFAULT_SAZBA
+    tdd = tdd_for_sazba(sazba, default=DEFAULT_TDD)
     consumption = consumption_mwh if consumption_mwh > 0 else DEFAULT_CONSUMPTION_MWH
-    spot_price = TDD_PRICES.get(tdd, TDD_PRICES.get(DEFAULT_TDD, 2700.0))
+    spot_price, price_year = _spot_price(tdd, year)
     if fixed_price_kwh is not None:
         fix_price = fixed_price_kwh * 1000.0
     else:
@@ -441,16 +990,21 @@ def compute_tariff_stats(sazba: str, consumption_mwh: float, fixed_price_kwh: Op
         "sazba": sazba,
         "tdd": tdd,
         "consumption_mwh": consumption,
+        "price_year": price_year,
         "spot_price_per_mwh": spot_price,
         "fix_price_per_mwh": fix_price,
         "spot_total": spot_total,
         "fix_total": fix_total,
+        "monthly": _monthly_breakdown(tdd, price_year, consumption, fix_price),
     }
 
 
-def calculate_business_savings(query: str) -> Dict:
+def calculate_business_savings(query: str, sazba: Optional[str] = None, consumption_mwh: Optional[float] = None) -> Dict:
     _ensure_tariff_assets()
-    stats = compute_tariff_stats(_extract_sazba(query) or DEFAULT_SAZBA, _extract_consumption_mwh(query))
+    stats = compute_tariff_stats(
+        sazba or _extract_sazba(query) or DEFAULT_SAZBA,
+        consumption_mwh if consumption_mwh is not None else _extract_consumption_mwh(query),
+    )
     sazba = stats["sazba"]
     tdd = stats["tdd"]
     consumption = stats["consumption_mwh"]
@@ -478,10 +1032,13 @@ def calculate_business_savings(query: str) -> Dict:
             "tdd": tdd,
             "consumption_mwh": consumption,
             "year": datetime.now().year,
+            "price_year": stats["price_year"],
             "spot_price_per_mwh": spot_price,
             "fix_price_per_mwh": fix_price,
         },
     }
+    if stats["monthly"]:
+        chart["monthly"] = stats["monthly"]
     return {"answer": answer, "sources": [], "chart": chart}
 
 
@@ -511,71 +1068,161 @@ def _is_silova_elekt_query(normalized_text: str) -> bool:
     return False
 
 
+# otevření, které samo o sobě znamená navázání („a kolik…“, „co když…“)
+_FOLLOW_UP_STARTS = ("a ", "co kdyz", "no a ", "jeste ")
+# slabé náznaky navázání – platí jen, když dotaz nenese žádné vlastní obsahové slovo
+_FOLLOW_UP_HINTS = {"to", "tom", "tomu", "tim", "toho", "ten", "ta", "tech", "tu", "tohle", "tam", "jeho", "ji", "kdyz", "pri", "pro"}
+# slova bez vlastního tématu (tázací, pomocná, předložky, jednotky)
+_FUNCTION_WORDS = {
+    "a", "i", "co", "jak", "kolik", "proc", "kde", "kdy", "ktery", "ktera", "ktere", "jaky", "jaka", "jake",
+    "je", "jsou", "bude", "budou", "by", "bych", "byl", "byla", "bylo", "stoji", "vyjde", "vychazi", "znamena",
+    "muze", "mohu", "muzu", "mam", "ma", "mit", "tak", "taky", "take", "jeste", "no", "ale", "nebo", "si",
+    "v", "ve", "na", "za", "do", "od", "s", "se", "z", "u", "o", "k", "mi", "me", "nam", "vam", "dal", "potom",
+    "mwh", "kwh", "kc", "rok", "rocne", "mesicne", "sazba", "sazbe", "sazbu", "spotreba", "spotrebe", "spotrebu", "spotrebuju",
+}
+# pod touto TF-IDF podobností obsahových slov dotazu s pasážemi z minula se vyhledává znovu
+REFINE_MIN_SCORE = float(os.getenv("REFINE_MIN_SCORE", "0.05"))
+
+
+def _content_words(normalized_text: str) -> List[str]:
+    return [
+        w for w in re.findall(r"\w+", normalized_text)
+        # čísla a kódy sazeb (d57d) jsou parametry výpočtu, ne nové téma
+        if not any(c.isdigit() for c in w) and w not in _FUNCTION_WORDS and w not in _FOLLOW_UP_HINTS
+    ]
+
+
+def _is_follow_up(normalized_text: str) -> bool:
+    """
+    Krátký navazující dotaz („a kolik to bude pro 5 MWh?“), který sám o sobě
+    nemá dost kontextu: začíná navazujícím otevřením, nebo obsahuje zájmeno či
+    „pro/při/když“ a žádné vlastní obsahové slovo („kolik to stojí?“). Běžné
+    „to/ta“ v samostatné otázce („Co je to spotový tarif?“) navázání neznamená.
+    """
+    words = re.findall(r"\w+", normalized_text)
+    if not words or len(words) > 10:
+        return False
+    if normalized_text.lstrip().startswith(_FOLLOW_UP_STARTS):
+        return True
+    return any(w in _FOLLOW_UP_HINTS for w in words) and not _content_words(normalized_text)
+
+
+def _refine_hits(query: str, pool: List[dict], k: int, focus: str = "") -> Optional[List[dict]]:
+    """
+    Přeřadí pasáže z předchozího vyhledávání podle navazujícího dotazu bez nového
+    embeddingu: původní skóre se zkombinuje s TF-IDF podobností spojeného dotazu.
+    Nese-li nový dotaz vlastní obsahová slova (``focus``) a žádná pasáž jim
+    lexikálně neodpovídá (pod ``REFINE_MIN_SCORE``), vrátí None – dotaz míří
+    jinam a je třeba vyhledat znovu.
+    """
+    shards = {shard["name"]: shard for shard in _snapshot()}
+    query_vectors: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+    rescored, best_focus = [], 0.0
+    for hit in pool:
+        # TF-IDF podobnost ve slovníku shardu, ze kterého pasáž pochází
+        shard = shards.get(hit.get("shard"))
+        lexical = 0.0
+        if shard is not None:
+            if shard["name"] not in query_vectors:
+                query_vectors[shard["name"]] = (_lexical_vector(query, shard["lex"]), _lexical_vector(focus, shard["lex"]))
+            qv, fv = query_vectors[shard["name"]]
+            hv = _lexical_vector(hit["text"], shard["lex"]) if qv.size else qv
+            lexical = float(hv @ qv) if qv.size else 0.0
+            if focus and fv.size:
+                best_focus = max(best_focus, float(hv @ fv))
+        rescored.append({**hit, "score": 0.5 * hit["score"] + 0.5 * lexical})
+    if focus and best_focus < REFINE_MIN_SCORE:
+        return None
+    rescored.sort(key=lambda h: -h["score"])
+    return rescored[:k]
+
+
+def session_metrics() -> Dict[str, object]:
+    return SESSIONS.metrics()
+
+
+def offer_metrics() -> Dict[str, object]:
+    return OFFERS.metrics()
+
+
+def _is_warmup_event(event) -> bool:
+    # plánovaný ping z EventBridge / serverless-plugin-warmup nebo {"warmup": true}
+    return isinstance(event, dict) and (
+        bool(event.get("warmup")) or event.get("source") in ("aws.events", "serverless-plugin-warmup")
+    )
+
+
 def lambda_handler(event, context):
+    """Tenký adaptér pro API Gateway: JSON z ``event["body"]`` -> ``answer_query`` -> JSON odpověď."""
+    if _is_warmup_event(event):
+        warm_up(background=False)
+        READINESS.wait()  # zahřívání mohlo začít už při inicializaci (WARMUP_ON_INIT)
+        status = READINESS.status()
+        return {"statusCode": 200 if status["ready"] else 503, "headers": {"Content-Type": "application/json"}, "body": json_dumps(status)}
+    try:
+        body = json_loads(event.get("body") or "{}")
+    except Exception:
+        body = {}
+    status, payload = answer_query(body if isinstance(body, dict) else {})
+    return {
+        "statusCode": status,
+        "headers": {"Content-Type": "application/json"},
+        "body": json_dumps(payload),
+    }
+
+
+def answer_query(body: Dict) -> Tuple[int, Dict]:
     """
     Handles incoming API requests, integrates the RAG retrieval process,
     calculates energy savings, and returns comprehensive responses.
     Enhanced with logging and smarter detection of silová elektřina queries.
+    Takes and returns plain Python objects: (HTTP status, response payload).
     """
-    try:
-        body = json.loads(event.get("body") or "{}")
-    except Exception:
-        body = {}
     q = (body.get("q") or "").strip()
     logger.info(f"lambda_handler input: {q!r}")
     if not q:
         logger.warning("Missing 'q' in request body.")
-        return {
-            "statusCode": 400,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"error": "missing q"}),
-        }
+        return 400, {"error": "missing q"}
     email = _extract_email(q)
+    session_id = str(body.get("sessionId") or "")
+    session = SESSIONS.get(session_id) if session_id else None
     if email:
         logger.info(f"Detected email in query: {email}")
-        return {
-            "statusCode": 200,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"answer": EMAIL_ACK_TEMPLATE.format(email=email)}, ensure_ascii=False),
-        }
+        # nabídka z údajů konverzace (nebo přímo ze zprávy); odpověď na PDF nečeká
+        offer_id = OFFERS.enqueue(
+            email,
+            sazba=_extract_sazba(q) or (session or {}).get("sazba") or "",
+            consumption_mwh=_extract_consumption_mwh(q) or (session or {}).get("consumption_mwh") or 0.0,
+        )
+        return 200, {"answer": EMAIL_ACK_TEMPLATE.format(email=email), "offer": {"queued": offer_id is not None, "id": offer_id}}
     normalized = _normalized(q)
+    follow_up = session is not None and _is_follow_up(normalized)
+    q_sazba = _extract_sazba(q)
+    q_consumption = _extract_consumption_mwh(q)
+    # chybějící sazbu/spotřebu doplníme z dřívějších zpráv téže konverzace
+    sazba = q_sazba or (session or {}).get("sazba") or ""
+    consumption = q_consumption or (session or {}).get("consumption_mwh") or 0.0
+    calc_follow_up = follow_up and bool(q_sazba or q_consumption) and session.get("intent") in ("silova", "savings")
     # Handle household queries
     if _is_household_query(normalized):
         logger.info("Detected household query.")
-        return {
-            "statusCode": 200,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"answer": HOUSEHOLD_NOTICE}),
-        }
+        return 200, {"answer": HOUSEHOLD_NOTICE}
     # Handle competition queries
     if _contains_competition(normalized):
         logger.info("Detected competition query.")
-        return {
-            "statusCode": 200,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"answer": COMPETITION_NOTICE}),
-        }
+        return 200, {"answer": COMPETITION_NOTICE}
     # Handle weather queries
     if _contains_weather(normalized):
         logger.info("Detected weather query.")
-        return {
-            "statusCode": 200,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"answer": WEATHER_NOTICE}),
-        }
+        return 200, {"answer": WEATHER_NOTICE}
     # Handle testing queries
     if _is_testing_query(normalized):
         logger.info("Detected testing query.")
-        return {
-            "statusCode": 200,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"answer": TESTING_NOTICE}),
-        }
+        return 200, {"answer": TESTING_NOTICE}
     # Handle silová elektřina and power price on bill queries, including direct calculation
-    if _is_silova_elekt_query(normalized):
-        # Try to extract sazba and consumption for a concrete calculation
-        sazba = _extract_sazba(q)
-        consumption = _extract_consumption_mwh(q)
+    if _is_silova_elekt_query(normalized) or (calc_follow_up and session.get("intent") == "silova"):
+        if session_id:
+            SESSIONS.update(session_id, intent="silova", sazba=sazba, consumption_mwh=consumption)
         logger.info(f"Silová elektřina query detected. Sazba: {sazba}, Consumption: {consumption}")
         # If both rate and consumption are present, provide a calculation
         if sazba or consumption > 0:
@@ -590,36 +1237,50 @@ def lambda_handler(event, context):
                 "Pokud chcete přesnější výpočet nebo porovnat s fixním tarifem, napište mi vaši sazbu a roční spotřebu."
             )
             logger.info(f"Returning silová elektřina calculation answer: {answer}")
-            return {
-                "statusCode": 200,
-                "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"answer": answer}, ensure_ascii=False),
-            }
+            return 200, {"answer": answer}
         # Otherwise, provide the explanation
         logger.info("Returning silová elektřina explanation.")
-        return {
-            "statusCode": 200,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"answer": SILOVA_ELEKTRINA_EXPLANATION}, ensure_ascii=False),
-        }
+        return 200, {"answer": SILOVA_ELEKTRINA_EXPLANATION}
     # Handle direct savings queries with calculation
-    if _is_savings_query(normalized):
+    if _is_savings_query(normalized) or calc_follow_up:
         logger.info("Detected savings query.")
-        savings_payload = calculate_business_savings(q)
+        savings_payload = calculate_business_savings(q, sazba, consumption or None)
+        if session_id:
+            meta = savings_payload["chart"]["meta"]
+            SESSIONS.update(
+                session_id, intent="savings", sazba=meta["sazba"], consumption_mwh=meta["consumption_mwh"]
+            )
         logger.info(f"Savings calculation result: {savings_payload}")
-        return {
-            "statusCode": 200,
-            "headers": {"Content-Type": "application/json"},
-            "body": json.dumps(savings_payload, ensure_ascii=False),
-        }
-    # RAG process: retrieve relevant context from data sources
-    hits = _retrieve_hits(q, TOP_K)
-    ctx = "\n\n---\n".join([h["text"] for h in hits])
+        return 200, savings_payload
+    # RAG process: navazující dotaz přeřadí pasáže z minulého kola, jinak plné vyhledávání
+    hits = None
+    if follow_up and session.get("pool"):
+        rag_query = f"{session.get('query', '')} {q}".strip()
+        pool = session["pool"]
+        focus = " ".join(w for w in re.findall(r"\w+", q.lower()) if _content_words(_normalized(w)))
+        hits = _refine_hits(rag_query, pool, TOP_K, focus)
+    context_reused = hits is not None
+    if not context_reused:
+        rag_query = q
+        pool = _retrieve_hits(q, TOP_K * SESSION_POOL_FACTOR) if session_id else _retrieve_hits(q, TOP_K)
+        hits = pool[:TOP_K]
+    if session_id:
+        SESSIONS.update(session_id, intent="rag", query=rag_query, pool=pool)
+    # Merge overlapping chunks, drop near-duplicates and fit the token budget
+    ctx, ctx_stats = pack_context(hits)
+    logger.info(
+        "Context packed: %d -> %d tokens (saved %d)", ctx_stats["raw"], ctx_stats["packed"], ctx_stats["saved"]
+    )
     # Generate answer using the chat model and context
     ans = _chat(ctx, q, hits)
     logger.info(f"RAG answer: {ans}")
-    return {
-        "statusCode": 200,
-        "headers": {"Content-Type": "application/json"},
-        "body": json.dumps({"answer": ans, "sources": []}, ensure_ascii=False),
+    return 200, {
+        "answer": ans,
+        "sources": _hit_sources(hits),
+        "context_tokens": ctx_stats,
+        "context_reused": context_reused,
     }
+
+
+if WARMUP_ON_INIT:
+    warm_up(background=True)
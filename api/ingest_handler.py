@@ -1,3 +1,143 @@
-import json
+import os
+import hashlib
+import logging
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import boto3
+
+from backend.services.embeddings import EMBEDDINGS_BACKEND, EMBEDDINGS_DIM, get_embedder
+from backend.services.index_refresh import LocalS3Client
+from backend.services.index_shards import (
+    LEGACY_INDEX,
+    MANIFEST_NAME,
+    add_shard,
+    file_sha1,
+    load_manifest,
+    new_manifest,
+    save_manifest,
+    shard_file,
+    shard_name,
+)
+from backend.services.json_codec import dumps_str as json_dumps, loads as json_loads
+from rag.build_index import BATCH_SIZE, DEDUP_THRESHOLD, BuildStats, build
+
+RAG_BUCKET = os.getenv("RAG_BUCKET", "")
+RAG_PREFIX = os.getenv("RAG_PREFIX", "index/")
+RAG_S3_LOCAL_ROOT = os.getenv("RAG_S3_LOCAL_ROOT", "")
+# sem se nahrávají nové dokumenty; ingest se spouští přes POST /ingest s jejich klíči
+INGEST_PREFIX = os.getenv("INGEST_PREFIX", "incoming/")
+
+logger = logging.getLogger(__name__)
+
+s3 = LocalS3Client(RAG_S3_LOCAL_ROOT) if RAG_S3_LOCAL_ROOT else boto3.client("s3")
+
+
+def _not_found(exc: Exception) -> bool:
+    if isinstance(exc, FileNotFoundError):
+        return True
+    code = (getattr(exc, "response", None) or {}).get("Error", {}).get("Code")
+    return code in ("404", "NoSuchKey", "NotFound")
+
+
+def _head(key: str) -> Optional[dict]:
+    """Metadata objektu, None jen pokud neexistuje – jiné chyby (práva, throttling) propadnou, aby se nepřepsal manifest."""
+    try:
+        return s3.head_object(Bucket=RAG_BUCKET, Key=key)
+    except Exception as exc:
+        if _not_found(exc):
+            return None
+        raise
+
+
+def _remote_manifest(path: str) -> Dict[str, object]:
+    """Aktuální manifest z S3; první ingest převezme existující ``index.npz`` jako shard ``base`` (bez stahování)."""
+    if _head(RAG_PREFIX + MANIFEST_NAME) is not None:
+        s3.download_file(RAG_BUCKET, RAG_PREFIX + MANIFEST_NAME, path)
+        return load_manifest(path)
+    legacy = _head(RAG_PREFIX + LEGACY_INDEX)
+    return new_manifest(legacy["ETag"].strip('"') if legacy else None)
+
+
+def _keys_digest(keys: List[str]) -> str:
+    return hashlib.sha1("\n".join(sorted(keys)).encode("utf-8")).hexdigest()[:8]
+
+
+def _event_keys(event: Dict) -> Tuple[List[str], Optional[str]]:
+    """Klíče dokumentů a volitelné jméno shardu z API Gateway (JSON body) nebo přímého volání."""
+    body = event
+    if "body" in event:
+        try:
+            body = json_loads(event.get("body") or "{}")
+        except Exception:
+            body = {}
+    keys = body.get("keys") or ([body["key"]] if body.get("key") else [])
+    return [str(k) for k in keys], body.get("shard")
+
+
+def ingest(keys: List[str], shard: Optional[str] = None) -> Dict[str, object]:
+    """
+    Postaví z dokumentů ``keys`` (v ``RAG_BUCKET``) nový shard, nahraje ho do
+    ``<RAG_PREFIX>shards/`` a zapíše do manifestu. Chunkují a embedují se jen
+    nové dokumenty (deduplikace jen v rámci shardu), existující shardy zůstávají
+    beze změny a čtenáři si dotáhnou jen ten nový. Stejné ``shard`` nahradí
+    shard téhož jména. Manifest se aktualizuje čtením a zápisem – ingesty mají
+    běžet po jednom (v šabloně ReservedConcurrentExecutions: 1).
+    """
+    t0 = time.perf_counter()
+    work = tempfile.mkdtemp(prefix="ingest-")
+    try:
+        src, out = os.path.join(work, "src"), os.path.join(work, "out")
+        for key in keys:
+            rel = key[len(INGEST_PREFIX):] if key.startswith(INGEST_PREFIX) else os.path.basename(key)
+            dest = os.path.join(src, *[p for p in rel.split("/") if p not in ("", ".", "..")])
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            s3.download_file(RAG_BUCKET, key, dest)
+        manifest = _remote_manifest(os.path.join(work, MANIFEST_NAME))
+        # nový shard embedujeme stejně jako ty stávající, aby dotaz stačilo vektorizovat jednou
+        spec = next((s["embedding"] for s in reversed(manifest["shards"]) if s.get("embedding")), None)
+        embedder = get_embedder(spec) if spec else get_embedder(EMBEDDINGS_BACKEND, EMBEDDINGS_DIM)
+        name = shard_name(shard) if shard else f"ingest-{time.strftime('%Y%m%d-%H%M%S')}-{_keys_digest(keys)}"
+        filename = shard_file(name)
+        stats = BuildStats()
+        path, count, sources = build(
+            src, out, BATCH_SIZE, os.path.join(work, "cache"), embedder, DEDUP_THRESHOLD, False, stats, filename
+        )
+        s3.upload_file(path, RAG_BUCKET, RAG_PREFIX + filename)
+        # manifest až po shardu: čtenář nikdy neuvidí odkaz na nenahraný soubor
+        add_shard(manifest, name, filename, file_sha1(path), count, embedder.spec, sources)
+        manifest_path = os.path.join(work, MANIFEST_NAME)
+        save_manifest(manifest_path, manifest)
+        s3.upload_file(manifest_path, RAG_BUCKET, RAG_PREFIX + MANIFEST_NAME)
+        logger.info("Ingest: shard %s (%d chunků z %d dokumentů), manifest v%s.", name, count, len(keys), manifest["version"])
+        return {
+            "shard": name,
+            "chunks": count,
+            "sources": sources,
+            "shards": len(manifest["shards"]),
+            "version": manifest["version"],
+            "embedding": embedder.spec,
+            "seconds": round(time.perf_counter() - t0, 2),
+            "timings": stats.report(),
+        }
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def _response(status: int, payload: Dict) -> Dict:
+    return {"statusCode": status, "headers": {"Content-Type": "application/json"}, "body": json_dumps(payload)}
+
+
 def lambda_handler(event, context):
-    return {"statusCode":200,"headers":{"Content-Type":"application/json"},"body":json.dumps({"ok":True,"hint":"Run rag/build_index.py locally and upload to S3 under index/."})}
+    """``{"keys": [...], "shard": "..."}`` (POST /ingest nebo přímé volání) -> nový shard indexu."""
+    keys, shard = _event_keys(event if isinstance(event, dict) else {})
+    if not keys:
+        return _response(400, {"error": "missing keys"})
+    try:
+        return _response(200, ingest(keys, shard))
+    except SystemExit as exc:  # build bez použitelného textu (prázdné/skenované dokumenty)
+        return _response(422, {"error": str(exc)})
+    except ValueError as exc:
+        return _response(400, {"error": str(exc)})
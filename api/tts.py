@@ -1,12 +1,14 @@
 import os, io
 import boto3
+from functools import lru_cache
 from fastapi.responses import StreamingResponse
 from api.speech import tts_prepare  # už jsme přidali dřív (normalizace CZ textu)
 
 VOICE_ID = os.getenv("TTS_VOICE_ID", "Vit")   # doporučený CZ mužský hlas
 LANG     = os.getenv("TTS_LANG", "cs-CZ")
 
-def polly_client():
+@lru_cache(maxsize=1)
+def polly_client():  # klient je thread-safe, vytvoří se jednou (i při zahřátí)
     return boto3.client("polly", region_name=os.getenv("AWS_REGION", "eu-central-1"))
 
 def synthesize(text: str) -> StreamingResponse:
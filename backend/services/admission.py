@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+INITIAL_LIMIT = float(os.getenv("LLM_CONCURRENCY", "4"))
+MIN_LIMIT = float(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+MAX_LIMIT = float(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "32"))
+QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "5"))
+BACKOFF = float(os.getenv("LLM_BACKOFF", "0.5"))
+
+_THROTTLE_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "RateLimitError",
+}
+
+
+class AdmissionRejected(RuntimeError):
+    """Volání providera nebylo vpuštěno (plná fronta nebo vypršel deadline) – volající přejde na fallback."""
+
+
+def is_throttling_error(exc: BaseException) -> bool:
+    """Rozpozná throttling Bedrocku (botocore ClientError) i OpenAI (RateLimitError / HTTP 429)."""
+    if type(exc).__name__ in _THROTTLE_CODES:
+        return True
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict) and response.get("Error", {}).get("Code") in _THROTTLE_CODES:
+        return True
+    return getattr(exc, "status_code", None) == 429
+
+
+class AdaptiveLimiter:
+    """
+    Limit souběžných volání jednoho modelu řízený AIMD: každé úspěšné volání
+    zvedne limit o ``1/limit`` (tj. +1 za „kolo“), throttling ho vynásobí
+    ``backoff`` – nejvýš jednou za dobu trvání volání, aby jedna vlna chyb limit
+    nesrazila na minimum. Čekající tvoří omezenou frontu s deadlinem; když je
+    fronta plná, požadavek se odmítne hned.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: float = INITIAL_LIMIT,
+        min_limit: float = MIN_LIMIT,
+        max_limit: float = MAX_LIMIT,
+        queue_size: int = QUEUE_SIZE,
+        timeout: float = QUEUE_TIMEOUT,
+        backoff: float = BACKOFF,
+    ):
+        self.name = name
+        self.min_limit = max(1.0, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(self.max_limit, max(self.min_limit, initial))
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.backoff = backoff
+        self.in_flight = 0
+        self.queued = 0
+        self._cond = threading.Condition()
+        self._last_decrease = 0.0
+        self._latency = 0.0  # EWMA v sekundách
+        self.stats = {"admitted": 0, "rejected": 0, "timeouts": 0, "throttled": 0, "errors": 0, "wait_ms": 0.0}
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """Počká na volný slot; vrací dobu čekání v sekundách, jinak ``AdmissionRejected``."""
+        started = time.monotonic()
+        deadline = started + (self.timeout if timeout is None else timeout)
+        with self._cond:
+            if self.in_flight >= int(self.limit):
+                if self.queued >= self.queue_size:
+                    self.stats["rejected"] += 1
+                    raise AdmissionRejected(f"{self.name}: fronta je plná ({self.queued} čekajících)")
+                self.queued += 1
+                try:
+                    while self.in_flight >= int(self.limit):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.stats["timeouts"] += 1
+                            raise AdmissionRejected(f"{self.name}: vypršel čas ve frontě")
+                        self._cond.wait(remaining)
+                finally:
+                    self.queued -= 1
+            self.in_flight += 1
+            waited = time.monotonic() - started
+            self.stats["admitted"] += 1
+            self.stats["wait_ms"] += waited * 1000.0
+            return waited
+
+    def release(self, latency: float, throttled: bool = False, failed: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            self._latency = latency if not self._latency else 0.8 * self._latency + 0.2 * latency
+            if throttled:
+                self.stats["throttled"] += 1
+                if now - self._last_decrease >= self._latency:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+                    logger.warning("Throttling %s, snižuji limit souběhu na %.1f", self.name, self.limit)
+            elif failed:
+                self.stats["errors"] += 1
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def call(self, fn: Callable[[], T], timeout: Optional[float] = None) -> T:
+        self.acquire(timeout)
+        started = time.monotonic()
+        try:
+            result = fn()
+        except Exception as exc:
+            throttled = is_throttling_error(exc)
+            self.release(time.monotonic() - started, throttled=throttled, failed=not throttled)
+            raise
+        self.release(time.monotonic() - started)
+        return result
+
+    def metrics(self) -> Dict[str, object]:
+        with self._cond:
+            admitted = self.stats["admitted"]
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "queue_size": self.queue_size,
+                "latency_ms": round(self._latency * 1000.0, 1),
+                "avg_wait_ms": round(self.stats["wait_ms"] / admitted, 1) if admitted else 0.0,
+                **{k: v for k, v in self.stats.items() if k != "wait_ms"},
+            }
+
+
+_LIMITERS: Dict[str, AdaptiveLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_limiter(model_id: str) -> AdaptiveLimiter:
+    limiter = _LIMITERS.get(model_id)
+    if limiter is None:
+        with _LIMITERS_LOCK:
+            limiter = _LIMITERS.setdefault(model_id, AdaptiveLimiter(model_id))
+    return limiter
+
+
+def admit(model_id: str, fn: Callable[[], T], timeout: Optional[float] = None) -> T:
+    """Zavolá ``fn`` přes limiter daného modelu (viz ``AdaptiveLimiter``)."""
+    return get_limiter(model_id).call(fn, timeout)
+
+
+def limiter_metrics() -> Dict[str, Dict[str, object]]:
+    return {name: limiter.metrics() for name, limiter in sorted(_LIMITERS.items())}
+
+
+__all__ = [
+    "AdaptiveLimiter",
+    "AdmissionRejected",
+    "admit",
+    "get_limiter",
+    "is_throttling_error",
+    "limiter_metrics",
+]
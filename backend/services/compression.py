@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import gzip
+from typing import List
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # brotli je volitelné, jinak jen gzip
+    brotli = None  # type: ignore
+
+COMPRESSIBLE = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+def _accepts(header: str, coding: str) -> bool:
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip() != coding:
+            continue
+        q = params.replace(" ", "").partition("q=")[2]
+        try:
+            return float(q) > 0 if q else True
+        except ValueError:
+            return True
+    return False
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware: odpovědi s textovým obsahem nad ``minimum_size`` bajtů
+    komprimuje brotli (pokud je nainstalované a klient ho přijímá), jinak gzipem.
+    Streamované odpovědi (audio, SSE), už komprimovaný obsah, HEAD a požadavky
+    na rozsah (``Range`` / 206) propouští beze změny.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        ranged = False
+        for name, value in scope.get("headers") or []:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1").lower()
+            elif name == b"range":
+                ranged = True
+        # HEAD nemá tělo (content-length popisuje GET) a bajtové rozsahy se vztahují k nekomprimovanému obsahu
+        if scope.get("method") == "HEAD" or ranged:
+            await self.app(scope, receive, send)
+            return
+        if brotli is not None and _accepts(accept, "br"):
+            coding = "br"
+        elif _accepts(accept, "gzip"):
+            coding = "gzip"
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        chunks: List[bytes] = []
+        passthrough = False
+
+        async def wrapped_send(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = {k.lower(): v for k, v in message.get("headers", [])}
+                ctype = headers.get(b"content-type", b"").decode("latin-1")
+                if message["status"] == 206 or b"content-encoding" in headers or not ctype.startswith(COMPRESSIBLE):
+                    passthrough = True
+                    await send(message)
+                    return
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                # streamovaná odpověď: pošli, co je nasbíráno, a dál bez komprese
+                passthrough = True
+                await send(start)
+                await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": True})
+                return
+            body = b"".join(chunks)
+            headers = [(k, v) for k, v in start.get("headers", []) if k.lower() != b"content-length"]
+            if len(body) >= self.minimum_size:
+                if coding == "br":
+                    body = brotli.compress(body, quality=self.brotli_quality)
+                else:
+                    body = gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+                headers.append((b"content-encoding", coding.encode()))
+                headers.append((b"vary", b"Accept-Encoding"))
+            headers.append((b"content-length", str(len(body)).encode()))
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, wrapped_send)
+
+
+__all__ = ["CompressionMiddleware"]
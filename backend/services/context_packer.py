@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import math
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+CHARS_PER_TOKEN = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "4"))
+MIN_MERGE_OVERLAP = 40
+DUPLICATE_CONTAINMENT = 0.8
+SHINGLE_SIZE = 5
+MIN_TAIL_TOKENS = 40
+SEPARATOR = "\n\n---\n"
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Hrubý odhad počtu tokenů (bez závislosti na tokenizéru konkrétního modelu)."""
+    if not text:
+        return 0
+    return int(math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def _overlap(left: str, right: str, min_len: int = MIN_MERGE_OVERLAP) -> int:
+    """Délka nejdelšího suffixu ``left``, který je zároveň prefixem ``right``."""
+    limit = min(len(left), len(right))
+    for size in range(limit, min_len - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _shingles(text: str) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i : i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _containment(a: set, b: set) -> float:
+    """Podíl shinglů ``a`` obsažených v ``b`` (zachytí i pasáže, které jsou podmnožinou jiného bloku)."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / float(len(a))
+
+
+def _merge_adjacent(hits: List[dict]) -> List[dict]:
+    """Spojí sousední/překrývající se chunky ze stejného dokumentu do jednoho bloku."""
+    blocks = [
+        {
+            "text": h.get("text") or "",
+            "score": float(h.get("score", 0.0)),
+            "source": h.get("source"),
+            "first": h.get("id"),
+            "last": h.get("id"),
+        }
+        for h in hits
+    ]
+    ordered = sorted(
+        (b for b in blocks if b["first"] is not None),
+        key=lambda b: (str(b["source"]), b["first"]),
+    )
+    merged: List[dict] = [b for b in blocks if b["first"] is None]
+    current: Optional[dict] = None
+    for block in ordered:
+        if current is not None and current["source"] == block["source"] and block["first"] - current["last"] <= 1:
+            size = _overlap(current["text"], block["text"])
+            if size or block["first"] == current["last"]:
+                current["text"] += block["text"][size:]
+                current["last"] = max(current["last"], block["last"])
+                current["score"] = max(current["score"], block["score"])
+                continue
+        if current is not None:
+            merged.append(current)
+        current = dict(block)
+    if current is not None:
+        merged.append(current)
+    return merged
+
+
+def _drop_near_duplicates(blocks: List[dict]) -> List[dict]:
+    kept: List[Tuple[dict, set]] = []
+    for block in sorted(blocks, key=lambda b: -b["score"]):
+        sh = _shingles(block["text"])
+        if any(_containment(sh, other) >= DUPLICATE_CONTAINMENT for _, other in kept):
+            continue
+        kept.append((block, sh))
+    return [b for b, _ in kept]
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    boundary = max(cut.rfind(". "), cut.rfind("\n"))
+    if boundary > max_chars // 2:
+        return cut[: boundary + 1]
+    space = cut.rfind(" ")
+    return cut[:space] if space > 0 else cut
+
+
+def pack_context(hits: List[dict], budget_tokens: Optional[int] = None) -> Tuple[str, Dict[str, int]]:
+    """
+    Poskládá kontext pro prompt z RAG hitů:
+      - sloučí sousední chunky téhož dokumentu (odstraní překryv z ``chunk_text``),
+      - zahodí téměř duplicitní pasáže,
+      - plní tokenový rozpočet v pořadí podle skóre.
+    Vrací text kontextu a statistiku ``raw``/``packed``/``saved`` v tokenech.
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget_tokens is None else int(budget_tokens)
+    raw_tokens = estimate_tokens(SEPARATOR.join(h.get("text") or "" for h in hits))
+    blocks = _drop_near_duplicates(_merge_adjacent(hits))
+    parts: List[str] = []
+    used = 0
+    sep_tokens = estimate_tokens(SEPARATOR)
+    for block in blocks:
+        text = block["text"].strip()
+        if not text:
+            continue
+        remaining = budget - used - (sep_tokens if parts else 0)
+        if remaining <= 0:
+            break
+        cost = estimate_tokens(text)
+        if cost > remaining:
+            if remaining < MIN_TAIL_TOKENS:
+                break
+            text = _truncate(text, remaining)
+            cost = estimate_tokens(text)
+        parts.append(text)
+        used += cost + (sep_tokens if len(parts) > 1 else 0)
+    ctx = SEPARATOR.join(parts)
+    packed_tokens = estimate_tokens(ctx)
+    stats = {
+        "raw": raw_tokens,
+        "packed": packed_tokens,
+        "saved": max(0, raw_tokens - packed_tokens),
+        "blocks": len(parts),
+    }
+    return ctx, stats
+
+
+__all__ = ["pack_context", "estimate_tokens", "CONTEXT_TOKEN_BUDGET"]
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import unicodedata
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "bedrock")
+EMB_ID = os.getenv("EMBEDDINGS_MODEL_ID", "amazon.titan-embed-text-v2:0")
+HASHING_DIM = int(os.getenv("HASHING_EMBED_DIM", "1024"))
+# výchozí dimenze Titan v2 pro build indexu (prázdné = nativních 1024)
+EMBEDDINGS_DIM = int(os.getenv("EMBEDDINGS_DIM", "0")) or None
+TITAN_V2_DIMS = (256, 512, 1024)
+
+_PRIME = np.uint64(0x100000001B3)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+# řídicí znaky (včetně NUL z extrahovaných PDF) – NUL je v dávce oddělovač textů
+_CONTROL_RE = re.compile(r"[\x00-\x1f\x7f]")
+
+
+class EmbeddingBackend(ABC):
+    """
+    Společné rozhraní pro výpočet embeddingů: ``embed`` vrací matici
+    (počet textů × ``dim``) float32 s L2 normou 1. ``spec`` jednoznačně
+    popisuje model i parametry a ukládá se do indexu, aby se dotazy
+    vektorizovaly stejně jako dokumenty. Backend bez ``embed`` nejde vytvořit.
+    """
+
+    spec = ""
+    local = False
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Embeddingy ``texts`` (počet textů × ``dim``, float32, L2 norma 1)."""
+
+
+def bedrock_body(text: str, model_id: str = EMB_ID, dimensions: Optional[int] = None) -> str:
+    """Tělo ``invoke_model`` pro Titan embeddings; ``dimensions`` umí jen Titan v2 (256/512/1024)."""
+    body = {"inputText": text}
+    if dimensions:
+        body["dimensions"] = int(dimensions)
+        body["normalize"] = True
+    return json.dumps(body)
+
+
+class BedrockEmbedder(EmbeddingBackend):
+    """Embeddingy z Bedrocku (Titan), jedno volání ``invoke_model`` na text."""
+
+    def __init__(self, model_id: str = EMB_ID, dimensions: Optional[int] = None, client=None):
+        if dimensions and "titan-embed-text-v2" in model_id and int(dimensions) not in TITAN_V2_DIMS:
+            raise ValueError(f"Titan v2 podporuje dimenze {TITAN_V2_DIMS}, ne {dimensions}")
+        self.model_id = model_id
+        self.dimensions = int(dimensions) if dimensions else None
+        self.spec = f"bedrock:{model_id}" + (f"?dim={self.dimensions}" if self.dimensions else "")
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.client("bedrock-runtime", region_name=os.getenv("AWS_REGION", "eu-central-1"))
+        return self._client
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vecs = []
+        for text in texts:
+            r = self.client.invoke_model(modelId=self.model_id, body=bedrock_body(text, self.model_id, self.dimensions))
+            vecs.append(json.loads(r["body"].read())["embedding"])
+        V = np.array(vecs, dtype="float32")
+        V /= np.linalg.norm(V, axis=1, keepdims=True) + 1e-9
+        return V
+
+
+def _mix(h: np.ndarray) -> np.ndarray:
+    # finalizer splitmix64 – rozprostře bity, aby modulo dim i znaménko byly rovnoměrné
+    h = h ^ (h >> np.uint64(30))
+    h = h * np.uint64(0xBF58476D1CE4E5B9)
+    h = h ^ (h >> np.uint64(27))
+    h = h * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+def _codepoints(texts: Sequence[str]) -> np.ndarray:
+    """Celá dávka jako jedno pole kódových bodů: malá písmena, jedna mezera mezi slovy, texty oddělené nulou."""
+    cleaned = (_CONTROL_RE.sub(" ", t or "") for t in texts)
+    joined = " ".join(unicodedata.normalize("NFKD", " \x00 ".join(cleaned)).lower().split())
+    codes = np.frombuffer(f" {joined} ".encode("utf-32-le"), dtype="<u4")
+    # bez diakritiky: NFKD rozloží "ř" na "r" + kombinující háček (U+0300–U+036F), ten zahodíme
+    return codes[(codes < 0x300) | (codes > 0x36F)].astype("uint64")
+
+
+class HashingEmbedder(EmbeddingBackend):
+    """
+    Lokální deterministické embeddingy bez sítě: znakové n-gramy (bez diakritiky,
+    malými písmeny, s mezerami na hranicích slov) se hashují rovnou do ``dim``
+    dimenzí se znaménkem ±1 – řídká náhodná projekce („hashing trick“). Četnosti
+    se tlumí ``log1p`` a vektor se normalizuje. Celá dávka se počítá vektorově
+    v numpy nad jedním polem kódových bodů.
+    """
+
+    version = "v1"
+    local = True
+
+    def __init__(self, dim: int = HASHING_DIM, ngrams: Sequence[int] = (3, 4, 5), batch_size: int = 512):
+        self.dim = int(dim)
+        self.ngrams = tuple(sorted(int(n) for n in ngrams))
+        self.batch_size = batch_size
+        self.spec = f"hashing-{self.version}:dim={self.dim}:n={','.join(map(str, self.ngrams))}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        texts = list(texts)
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        for start in range(0, len(texts), self.batch_size):
+            out[start : start + self.batch_size] = self._embed_batch(texts[start : start + self.batch_size])
+        return out
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        n_texts = len(texts)
+        codes = _codepoints(texts)
+        sep = codes == 0
+        seg = np.cumsum(sep) - sep  # index textu pro každou pozici
+        seg = np.where(sep, -1, seg)
+        counts = np.zeros(n_texts * self.dim, dtype="float64")
+        size = codes.size
+        with np.errstate(over="ignore"):
+            for n in self.ngrams:
+                if size < n:
+                    continue
+                m = size - n + 1
+                h = np.full(m, np.uint64(n) * _GOLDEN, dtype="uint64")
+                for j in range(n):
+                    h = h * _PRIME + codes[j : j + m]
+                h = _mix(h)
+                valid = (seg[:m] >= 0) & (seg[:m] == seg[n - 1 :])
+                h = h[valid]
+                bucket = (h % np.uint64(self.dim)).astype("int64")
+                sign = np.where(h >> np.uint64(63), -1.0, 1.0)
+                counts += np.bincount(seg[:m][valid] * self.dim + bucket, weights=sign, minlength=counts.size)
+        V = counts.reshape(n_texts, self.dim)
+        V = np.sign(V) * np.log1p(np.abs(V))
+        V /= np.linalg.norm(V, axis=1, keepdims=True) + 1e-9
+        return V.astype("float32")
+
+
+@lru_cache(maxsize=8)
+def get_embedder(spec: Optional[str] = None, dim: Optional[int] = None) -> EmbeddingBackend:
+    """
+    Backend podle ``spec`` (nebo ``EMBEDDINGS_BACKEND``): ``bedrock[:model][?dim=512]``,
+    ``hashing`` nebo plný spec uložený v indexu (``hashing-v1:dim=1024:n=3,4,5``).
+    ``dim`` přepíše dimenzi ze specu (parametr buildu indexu).
+    """
+    spec = (spec or EMBEDDINGS_BACKEND).strip()
+    name, _, rest = spec.partition(":")
+    if name == "bedrock":
+        model, _, query = rest.partition("?")
+        opts = dict(item.partition("=")[::2] for item in query.split("&") if item)
+        return BedrockEmbedder(model or EMB_ID, dim or int(opts.get("dim") or 0) or None)
+    if name in ("hashing", f"hashing-{HashingEmbedder.version}"):
+        opts = dict(item.partition("=")[::2] for item in rest.split(":") if item)
+        ngrams = tuple(int(n) for n in opts["n"].split(",")) if opts.get("n") else (3, 4, 5)
+        return HashingEmbedder(dim or int(opts.get("dim") or HASHING_DIM), ngrams)
+    raise ValueError(f"Neznámý embedding backend: {spec!r}")
+
+
+def fit_pca(V: np.ndarray, dim: int, block: int = 65536):
+    """
+    PCA pro dodatečné zmenšení indexu: vrací (mean, projekce D×dim). Kovariance
+    se sčítá po blocích, takže stačí i memmap velkého indexu.
+    """
+    n, d = V.shape
+    if not 0 < dim <= d:
+        raise ValueError(f"Cílová dimenze {dim} musí být v rozsahu 1..{d}")
+    mean = np.zeros(d, dtype="float64")
+    for start in range(0, n, block):
+        mean += V[start : start + block].sum(axis=0, dtype="float64")
+    mean /= max(n, 1)
+    cov = np.zeros((d, d), dtype="float64")
+    for start in range(0, n, block):
+        X = V[start : start + block].astype("float64") - mean
+        cov += X.T @ X
+    _, vecs = np.linalg.eigh(cov)
+    return mean.astype("float32"), np.ascontiguousarray(vecs[:, ::-1][:, :dim], dtype="float32")
+
+
+def project(V: np.ndarray, mean: np.ndarray, projection: np.ndarray) -> np.ndarray:
+    """Promítne vektory (nebo jeden vektor) do PCA prostoru a znovu normalizuje."""
+    X = (np.asarray(V, dtype="float32") - mean) @ projection
+    return X / (np.linalg.norm(X, axis=-1, keepdims=True) + 1e-9)
+
+
+__all__ = [
+    "BedrockEmbedder",
+    "EmbeddingBackend",
+    "HashingEmbedder",
+    "bedrock_body",
+    "fit_pca",
+    "get_embedder",
+    "project",
+]
@@ -19,7 +19,8 @@ def _to_float(raw: str | None) -> Optional[float]:
         return None
 
 
-def _normalize(text: str) -> str:
+def normalize_text(text: str) -> str:
+    """Malá písmena bez diakritiky – tvar, nad kterým pracují regulární výrazy parseru."""
     return "".join(
         c for c in unicodedata.normalize("NFKD", text or "") if not unicodedata.combining(c)
     ).lower()
@@ -48,7 +49,7 @@ def parse_energy_message(text: str) -> Dict[str, Optional[float]]:
     Heuristicky vytáhne spotřebu (MWh), cenu komodity (Kč/MWh),
     stálý plat (Kč/měs) a počet měsíců z volného textu.
     """
-    normalized = _normalize(text)
+    normalized = normalize_text(text)
     parsed = ParsedEnergyMessage()
 
     # Spotřeba
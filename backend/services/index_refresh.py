@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LocalS3Client:
+    """
+    Minimální náhrada S3 klienta nad lokálním adresářem (``root/bucket/key``).
+    Stačí pro vývoj a testy refreshe indexu – ETag je MD5 obsahu jako u S3.
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root).expanduser()
+
+    def _path(self, bucket: str, key: str) -> Path:
+        return self.root / bucket / key
+
+    def head_object(self, Bucket: str, Key: str, **_):
+        path = self._path(Bucket, Key)
+        if not path.exists():
+            raise FileNotFoundError(f"s3://{Bucket}/{Key} neexistuje ({path})")
+        md5 = hashlib.md5()
+        with path.open("rb") as fh:
+            for block in iter(lambda: fh.read(1 << 20), b""):
+                md5.update(block)
+        return {"ETag": f'"{md5.hexdigest()}"', "ContentLength": path.stat().st_size}
+
+    def download_file(self, Bucket: str, Key: str, Filename: str, **_):
+        shutil.copyfile(self._path(Bucket, Key), Filename)
+
+    def upload_file(self, Filename: str, Bucket: str, Key: str, **_):
+        dest = self._path(Bucket, Key)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(dest.name + ".tmp")
+        shutil.copyfile(Filename, tmp)
+        os.replace(tmp, dest)
+
+
+class IndexRefresher:
+    """
+    Hlídá objekt indexu v S3 podle ETag/VersionId a stahuje ho jen při změně.
+    Nový soubor předá ``on_change`` (sestavení struktur + atomická výměna),
+    kontrola běží v daemon vlákně mimo obsluhu požadavků.
+    """
+
+    def __init__(
+        self,
+        client,
+        bucket: str,
+        key: str,
+        local_path: str,
+        on_change: Callable[[str], None],
+        interval: float = 300.0,
+    ):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.local_path = local_path
+        self.on_change = on_change
+        self.interval = interval
+        self.etag: Optional[str] = None
+        self.version: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def refresh(self) -> bool:
+        """Zkontroluje ETag a při změně stáhne a načte index. Vrací True, pokud došlo k výměně."""
+        with self._lock:
+            head = self.client.head_object(Bucket=self.bucket, Key=self.key)
+            etag = head.get("ETag")
+            version = head.get("VersionId")
+            if etag is not None and etag == self.etag and version == self.version:
+                return False
+            extra = {"VersionId": version} if version else None
+            tmp = f"{self.local_path}.{os.getpid()}.tmp"
+            self.client.download_file(self.bucket, self.key, tmp, ExtraArgs=extra)
+            os.replace(tmp, self.local_path)
+            self.on_change(self.local_path)
+            logger.info("Index s3://%s/%s načten (ETag %s).", self.bucket, self.key, etag)
+            self.etag, self.version = etag, version
+            return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as exc:
+                logger.warning("Obnova indexu z S3 selhala (%s), ponechávám původní.", exc)
+
+    def start(self):
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="index-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+__all__ = ["IndexRefresher", "LocalS3Client"]
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+MANIFEST_NAME = "manifest.json"
+LEGACY_INDEX = "index.npz"
+SHARD_DIR = "shards"
+# shard, do kterého se při prvním ingestu převezme původní monolitický index.npz
+BASE_SHARD = "base"
+
+
+def shard_name(text: str) -> str:
+    """Bezpečné jméno shardu (i klíče v S3) z názvu zdroje/distributora: ``ČEZ Distribuce`` -> ``cez-distribuce``."""
+    ascii_text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    name = re.sub(r"[^a-z0-9_-]+", "-", ascii_text.lower()).strip("-")
+    if not name:
+        raise ValueError(f"Z {text!r} nejde odvodit jméno shardu")
+    return name
+
+
+def shard_file(name: str) -> str:
+    """Cesta shardu relativně k manifestu (lokální adresář nebo prefix v S3)."""
+    return f"{SHARD_DIR}/{name}.npz"
+
+
+def file_sha1(path: str | Path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_manifest(path: str | Path) -> Optional[Dict[str, object]]:
+    """Manifest ze souboru, nebo None, pokud neexistuje."""
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+
+def save_manifest(path: str | Path, manifest: Dict[str, object]):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def new_manifest(legacy_sha1: Optional[str] = None) -> Dict[str, object]:
+    """
+    Prázdný manifest; existující monolitický ``index.npz`` (jeho otisk, lokálně
+    SHA-1, v S3 ETag) se do něj převezme jako shard ``base``.
+    """
+    manifest: Dict[str, object] = {"version": 0, "updated": None, "shards": []}
+    if legacy_sha1:
+        add_shard(manifest, BASE_SHARD, LEGACY_INDEX, legacy_sha1)
+    return manifest
+
+
+def add_shard(
+    manifest: Dict[str, object],
+    name: str,
+    file: str,
+    sha1: str,
+    chunks: Optional[int] = None,
+    embedding: Optional[str] = None,
+    sources: Iterable[str] = (),
+) -> Dict[str, object]:
+    """
+    Zapíše shard do manifestu (stejné jméno = náhrada, jinak se přidá na
+    konec) a zvýší verzi. Čtenář podle ``sha1`` pozná, které shardy se
+    změnily, a načte jen ty.
+    """
+    entry = {
+        "name": name,
+        "file": file,
+        "sha1": sha1,
+        "chunks": chunks,
+        "embedding": embedding,
+        "sources": sorted(set(sources)),
+        "created": time.time(),
+    }
+    names = [s["name"] for s in manifest["shards"]]
+    if name in names:
+        manifest["shards"][names.index(name)] = entry
+    else:
+        manifest["shards"].append(entry)
+    manifest["version"] = int(manifest.get("version") or 0) + 1
+    manifest["updated"] = entry["created"]
+    return entry
+
+
+def remove_shard(manifest: Dict[str, object], name: str) -> bool:
+    shards = [s for s in manifest["shards"] if s["name"] != name]
+    if len(shards) == len(manifest["shards"]):
+        return False
+    manifest["shards"] = shards
+    manifest["version"] = int(manifest.get("version") or 0) + 1
+    manifest["updated"] = time.time()
+    return True
+
+
+__all__ = [
+    "BASE_SHARD",
+    "LEGACY_INDEX",
+    "MANIFEST_NAME",
+    "SHARD_DIR",
+    "add_shard",
+    "file_sha1",
+    "load_manifest",
+    "new_manifest",
+    "remove_shard",
+    "save_manifest",
+    "shard_file",
+    "shard_name",
+]
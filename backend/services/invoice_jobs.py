@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, Optional
+
+from backend.services.energy_calc import compute_commodity_cost, normalize_text, parse_energy_message
+from backend.services.tdd_map import normalize_sazba, resolve_tdd
+
+try:
+    from pypdf import PdfReader  # type: ignore
+except ImportError:  # bez pypdf jdou zpracovat jen textové faktury
+    PdfReader = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+INVOICE_WORKERS = int(os.getenv("INVOICE_WORKERS", "2"))
+INVOICE_TIMEOUT = float(os.getenv("INVOICE_TIMEOUT", "120"))
+INVOICE_JOBS_MAX = int(os.getenv("INVOICE_JOBS_MAX", "1000"))
+SUPPORTED_SUFFIXES = (".pdf", ".txt")
+
+_SAZBA_RE = re.compile(r"\b([cd])\s*(\d{2})\s*d\b")
+# klíčová slova v textu faktury -> název distributora v mapě sazeb
+DISTRIBUTORS = (
+    ("cez distribuce", "ČEZ Distribuce"),
+    ("eg.d", "EG.D"),
+    ("e.on distribuce", "EG.D"),
+    ("predistribuce", "PREdistribuce"),
+    ("pre distribuce", "PREdistribuce"),
+)
+
+
+def extract_text(path: str) -> Dict[str, object]:
+    """Text faktury: PDF po stránkách přes pypdf, .txt přímo. Skeny bez textové vrstvy vrací prázdný text."""
+    suffix = Path(path).suffix.lower()
+    if suffix == ".pdf":
+        if PdfReader is None:
+            raise RuntimeError("Pro čtení PDF je potřeba balíček pypdf.")
+        pages = [page.extract_text() or "" for page in PdfReader(path).pages]
+        return {"pages": len(pages), "text": "\n".join(pages)}
+    if suffix == ".txt":
+        with open(path, encoding="utf-8", errors="ignore") as fh:
+            return {"pages": 1, "text": fh.read()}
+    raise ValueError(f"Nepodporovaný typ souboru {suffix or '(bez přípony)'} – podporované: {', '.join(SUPPORTED_SUFFIXES)}")
+
+
+def parse_invoice(path: str) -> Dict[str, object]:
+    """
+    Těžká část zpracování (běží v procesu z poolu): extrakce textu,
+    ``parse_energy_message``, ``compute_commodity_cost`` a rozpoznání sazby
+    a distributora. TDD se dohledá až v hlavním procesu, kde je mapa sazeb.
+    """
+    doc = extract_text(path)
+    text = doc["text"]
+    normalized = normalize_text(text)
+    parsed = parse_energy_message(text)
+    match = _SAZBA_RE.search(normalized)
+    distributor = next((name for key, name in DISTRIBUTORS if key in normalized), None)
+    return {
+        "pages": doc["pages"],
+        "chars": len(text),
+        "parsed": parsed,
+        "calculation": compute_commodity_cost(**parsed),
+        "sazba": normalize_sazba(match.group(0)) if match else None,
+        "distributor": distributor,
+    }
+
+
+def _file_sha1(path: Path) -> str:
+    h = hashlib.sha1()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class InvoiceJobs:
+    """
+    Fronta zpracování nahraných faktur. ``submit`` jen založí job a vrátí jeho
+    id; parsování běží v poolu procesů (mimo vlákna požadavků i GIL). Stav
+    jobu (queued / done / failed) se ukládá do ``<store>/<id>.json``,
+    takže ho vrátí kterýkoli pre-fork worker. Stejný obsah souboru (SHA-1) se
+    podruhé neparsuje – job rovnou dostane hotový výsledek. Drží se nejvýš
+    ``max_jobs`` jobů (v paměti i na disku), starší se mažou.
+    """
+
+    def __init__(self, store_dir: Path, workers: int = INVOICE_WORKERS, timeout: float = INVOICE_TIMEOUT, max_jobs: int = INVOICE_JOBS_MAX):
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.workers = workers
+        self.timeout = timeout
+        self.max_jobs = max_jobs
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._jobs: "OrderedDict[str, Dict[str, object]]" = OrderedDict()
+        self._by_hash: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._prune_store()
+
+    def _prune_store(self):
+        """Na disku nechá jen ``max_jobs`` nejnovějších stavů (i po jiných workerech a restartech)."""
+        files = sorted(self.store_dir.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for path in files[self.max_jobs :]:
+            path.unlink(missing_ok=True)
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        # spawn: worker nedědí vlákna ani stav serveru; pool vzniká líně v procesu, který ho použije
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=max(1, self.workers), mp_context=get_context("spawn"))
+            return self._pool
+
+    def _save(self, job: Dict[str, object]):
+        path = self.store_dir / f"{job['id']}.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(job, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _put(self, job: Dict[str, object]):
+        with self._lock:
+            self._jobs[job["id"]] = job
+            self._jobs.move_to_end(job["id"])
+            evicted = []
+            while len(self._jobs) > self.max_jobs:
+                old_id, old = self._jobs.popitem(last=False)
+                if self._by_hash.get(old["sha1"]) == old_id:
+                    del self._by_hash[old["sha1"]]
+                evicted.append(old_id)
+        self._save(job)
+        for old_id in evicted:
+            (self.store_dir / f"{old_id}.json").unlink(missing_ok=True)
+
+    def submit(self, path: Path, name: Optional[str] = None, sha1: Optional[str] = None) -> Dict[str, object]:
+        """
+        Založí job pro nahraný soubor a hned vrátí jeho stav (bez čekání na
+        parsování). ``name`` je původní jméno souboru, ``sha1`` otisk, pokud ho
+        volající spočítal už při ukládání.
+        """
+        path = Path(path)
+        sha1 = sha1 or _file_sha1(path)
+        job = {"id": uuid.uuid4().hex, "file": name or path.name, "sha1": sha1, "status": "queued", "submitted": time.time()}
+        with self._lock:
+            done = self._jobs.get(self._by_hash.get(sha1, ""))
+        if done is not None and done["status"] == "done":
+            job.update(status="done", result=done["result"], finished=time.time(), cached=True)
+            self._put(job)
+            return job
+        self._put(job)
+        # stav se uloží dřív, než job může doběhnout – callback ho pak jen přepíše na done/failed
+        try:
+            future = self.pool.submit(parse_invoice, str(path))
+        except BrokenProcessPool:
+            # worker spadl (např. pád parseru na poškozeném PDF) – pool založíme znovu
+            logger.warning("Pool zpracování faktur je rozbitý, zakládám nový.")
+            with self._lock:
+                self._pool = None
+            future = self.pool.submit(parse_invoice, str(path))
+        future.add_done_callback(lambda f: self._finish(job["id"], f))
+        return dict(job)
+
+    def _finish(self, job_id: str, future: Future):
+        with self._lock:
+            job = dict(self._jobs.get(job_id) or {})
+        if not job:
+            return
+        try:
+            result = future.result()
+            entry = resolve_tdd(result["sazba"], result["distributor"]) if result.get("sazba") else None
+            result["tdd"] = entry["tdd"] if entry else None
+            job.update(status="done", result=result)
+            with self._lock:
+                self._by_hash[job["sha1"]] = job_id
+        except Exception as exc:
+            logger.warning("Zpracování faktury %s selhalo: %s", job.get("file"), exc)
+            job.update(status="failed", error=str(exc))
+        job["finished"] = time.time()
+        self._put(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, object]]:
+        """Stav jobu z paměti, jinak z disku (job mohl založit jiný worker)."""
+        if not re.fullmatch(r"[0-9a-f]{32}", job_id or ""):
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            path = self.store_dir / f"{job_id}.json"
+            if not path.exists():
+                return None
+            job = json.loads(path.read_text(encoding="utf-8"))
+        job = dict(job)
+        # proces v poolu nejde bezpečně přerušit – job po timeoutu aspoň hlásíme jako neúspěšný
+        if job["status"] == "queued" and time.time() - job["submitted"] > self.timeout:
+            job.update(status="failed", error=f"timeout po {self.timeout:.0f} s")
+        return job
+
+    def metrics(self) -> Dict[str, object]:
+        with self._lock:
+            states = [job["status"] for job in self._jobs.values()]
+        return {"workers": self.workers, "jobs": len(states), **{s: states.count(s) for s in ("queued", "done", "failed")}}
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+__all__ = ["InvoiceJobs", "SUPPORTED_SUFFIXES", "extract_text", "parse_invoice"]
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+import numpy as np
+
+from backend.services.tdd_prices import get_price_cube, interpolate_gaps
+
+QH_PER_HOUR = 4
+QH_PER_DAY = 96
+
+
+def shift_load(
+    load_kwh: np.ndarray,
+    prices: np.ndarray,
+    shiftable_share: float,
+    window_qh: int = QH_PER_DAY,
+    max_power_kw: Optional[float] = None,
+) -> np.ndarray:
+    """
+    Přesune ``shiftable_share`` spotřeby v rámci každého okna ``window_qh``
+    čtvrthodin do nejlevnějších čtvrthodin téhož okna. Při lineární ceně a
+    omezení výkonu je to zlomkový batoh – plnění od nejlevnější čtvrthodiny
+    je optimální a jde celé vektorově (řazení + kumulativní součty po oknech).
+    Energie, která se kvůli ``max_power_kw`` nevejde, zůstává na původním místě.
+    Bez ``max_power_kw`` je limitem původní špička profilu – posun nesmí
+    vytvořit vyšší odběr, než jaký přípojka už zvládá.
+    """
+    n = load_kwh.size
+    windows = -(-n // window_qh)
+    pad = windows * window_qh - n
+    load = np.pad(load_kwh.astype("float64"), (0, pad)).reshape(windows, window_qh)
+    price = np.pad(prices.astype("float64"), (0, pad), constant_values=np.inf).reshape(windows, window_qh)
+    share = float(np.clip(shiftable_share, 0.0, 1.0))
+    base = load * (1.0 - share)
+    movable = load.sum(axis=1) * share
+    if max_power_kw is None:
+        max_power_kw = float(load.max()) * QH_PER_HOUR
+    capacity = np.maximum(max_power_kw / QH_PER_HOUR - base, 0.0)
+    capacity[np.isinf(price)] = 0.0
+    order = np.argsort(price, axis=1, kind="stable")
+    cap_sorted = np.take_along_axis(capacity, order, axis=1)
+    filled_before = np.cumsum(cap_sorted, axis=1) - cap_sorted
+    alloc_sorted = np.clip(movable[:, None] - filled_before, 0.0, cap_sorted)
+    alloc = np.empty_like(alloc_sorted)
+    np.put_along_axis(alloc, order, alloc_sorted, axis=1)
+    leftover = movable - alloc.sum(axis=1)
+    # co se nevešlo pod limit výkonu, zůstane rozložené jako původní posunutelná část
+    with np.errstate(invalid="ignore", divide="ignore"):
+        back = np.where(movable[:, None] > 0, load * share * (leftover / movable)[:, None], 0.0)
+    return (base + alloc + back).ravel()[:n]
+
+
+def optimize_load_shift(
+    tdd: str,
+    consumption_mwh: float,
+    shiftable_share: float,
+    window_hours: float = 24.0,
+    max_power_kw: Optional[float] = None,
+    year: Optional[int] = None,
+    include_profile: bool = False,
+) -> Dict[str, object]:
+    """
+    Úspora spotových nákladů při přesunu části spotřeby do levných hodin.
+    Výstup používá stejné klíče jako ``compute_tariff_stats`` (spot_total,
+    spot_price_per_mwh, ...) pro původní i posunutý profil a průměrný denní
+    průběh obou profilů (96 čtvrthodin, kWh) pro graf. Bez ``max_power_kw``
+    se výkon omezí původní špičkou profilu (``max_power_kw`` ve výstupu).
+    Podíl mimo 0–1, okno mimo (0, 168] h nebo nekladný výkon vyhodí ValueError.
+    """
+    if not 0.0 <= shiftable_share <= 1.0:
+        raise ValueError("Podíl přesunutelné spotřeby musí být 0–1")
+    if not 0.0 < window_hours <= 168.0:
+        raise ValueError("Okno přesunu musí být 0–168 hodin")
+    if max_power_kw is not None and max_power_kw <= 0:
+        raise ValueError("Maximální výkon musí být kladný")
+    cube = get_price_cube()
+    price_year = cube.resolve_year(year)
+    profile = cube.tdd_profile(tdd, price_year)
+    if profile is None:
+        raise ValueError(f"Neznámá třída TDD: {tdd}")
+    prices = interpolate_gaps(cube.spot_series(price_year))
+    load = profile.astype("float64") * consumption_mwh * 1000.0
+    window_qh = max(1, int(round(window_hours * QH_PER_HOUR)))
+    if max_power_kw is None:
+        max_power_kw = float(load.max()) * QH_PER_HOUR
+    shifted = shift_load(load, prices, shiftable_share, window_qh, max_power_kw)
+    spot_total = float(load @ prices) / 1000.0
+    shifted_total = float(shifted @ prices) / 1000.0
+    days = -(-load.size // QH_PER_DAY)
+    active_days = max(1, int((load.reshape(days, QH_PER_DAY).sum(axis=1) > 0).sum()))
+    result: Dict[str, object] = {
+        "tdd": tdd.upper(),
+        "price_year": price_year,
+        "consumption_mwh": consumption_mwh,
+        "shiftable_share": shiftable_share,
+        "window_hours": window_qh / QH_PER_HOUR,
+        "max_power_kw": max_power_kw,
+        "spot_total": spot_total,
+        "spot_price_per_mwh": spot_total / consumption_mwh if consumption_mwh else 0.0,
+        "shifted_spot_total": shifted_total,
+        "shifted_spot_price_per_mwh": shifted_total / consumption_mwh if consumption_mwh else 0.0,
+        "savings": spot_total - shifted_total,
+        "shifted_mwh": float(np.abs(shifted - load).sum()) / 2000.0,
+        "peak_kw": {
+            "original": float(load.max()) * QH_PER_HOUR,
+            "shifted": float(shifted.max()) * QH_PER_HOUR,
+        },
+        "daily_profile": {
+            "original": (load.reshape(days, QH_PER_DAY).sum(axis=0) / active_days).round(4).tolist(),
+            "shifted": (shifted.reshape(days, QH_PER_DAY).sum(axis=0) / active_days).round(4).tolist(),
+        },
+    }
+    if include_profile:
+        result["profile"] = {"original": load, "shifted": shifted}
+    return result
+
+
+__all__ = ["optimize_load_shift", "shift_load"]
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import csv
+import io
+import re
+import unicodedata
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from backend.services.tdd_prices import get_price_cube, parse_datetimes, quarter_of_year
+
+CHUNK_ROWS = 100_000
+Source = Union[str, Path, BinaryIO]
+
+_TIME_HINTS = ("datum", "cas", "time", "timestamp", "date", "od", "interval")
+_VALUE_HINTS = ("kwh", "spotreba", "hodnota", "odber", "value", "energie", "mwh", "kw")
+
+
+def _norm(text: str) -> str:
+    text = "".join(c for c in unicodedata.normalize("NFKD", str(text)) if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def _pick_columns(columns) -> Tuple[str, str, float]:
+    """Vybere sloupec s časem, sloupec s hodnotou a převodní faktor na kWh za čtvrthodinu."""
+    normed = {col: _norm(col) for col in columns}
+    # nápovědy se porovnávají s celými slovy záhlaví („od“ nesmí chytit „hodnota“ ani „odběr“)
+    tokens = {col: set(re.findall(r"[a-z0-9]+", n)) for col, n in normed.items()}
+    time_col = next((c for c in columns if tokens[c] & set(_TIME_HINTS)), list(columns)[0])
+    value_col = next((c for c in columns if c != time_col and tokens[c] & set(_VALUE_HINTS)), None)
+    if value_col is None:
+        rest = [c for c in columns if c != time_col]
+        if not rest:
+            raise ValueError("Export neobsahuje sloupec s naměřenými hodnotami.")
+        value_col = rest[0]
+    unit = normed[value_col]
+    if "mwh" in unit:
+        factor = 1000.0
+    elif "kwh" in unit or "kw" not in unit:
+        factor = 1.0
+    else:  # průměrný výkon v kW za čtvrthodinu
+        factor = 0.25
+    return time_col, value_col, factor
+
+
+def _is_excel(name: str, head: bytes) -> bool:
+    return name.lower().endswith((".xlsx", ".xlsm")) or head.startswith(b"PK\x03\x04")
+
+
+def _open_binary(source: Source) -> Tuple[BinaryIO, str, bool]:
+    if isinstance(source, (str, Path)):
+        return open(source, "rb"), str(source), True
+    name = getattr(source, "name", "")
+    return source, name if isinstance(name, str) else "", False
+
+
+def _csv_chunks(fh: BinaryIO, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    text = io.TextIOWrapper(fh, encoding="utf-8-sig", errors="replace", newline="")
+    sample = text.read(64 * 1024)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
+        sep = dialect.delimiter
+    except csv.Error:
+        sep = ";" if sample.count(";") >= sample.count(",") else ","
+    # český export: středník jako oddělovač a desetinná čárka
+    decimal = "," if sep != "," else "."
+    try:
+        yield from pd.read_csv(text, sep=sep, decimal=decimal, chunksize=chunk_rows, dtype=str)
+    finally:
+        text.detach()  # zavření souboru nechává na volajícím
+
+
+def _excel_chunks(fh: BinaryIO, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+
+    wb = load_workbook(fh, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(h) if h is not None else f"col{i}" for i, h in enumerate(header)]
+        buf = []
+        for row in rows:
+            buf.append(row[: len(columns)])
+            if len(buf) >= chunk_rows:
+                yield pd.DataFrame(buf, columns=columns)
+                buf = []
+        if buf:
+            yield pd.DataFrame(buf, columns=columns)
+    finally:
+        wb.close()
+
+
+def iter_meter_chunks(source: Source, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Čte CSV/XLSX export po dávkách; vrací rámce se sloupci ``time`` a ``kwh``."""
+    fh, name, owned = _open_binary(source)
+    try:
+        head = fh.read(4)
+        fh.seek(0)
+        chunks = _excel_chunks(fh, chunk_rows) if _is_excel(name, head) else _csv_chunks(fh, chunk_rows)
+        picked = None
+        for raw in chunks:
+            if picked is None:
+                picked = _pick_columns(raw.columns)
+            time_col, value_col, factor = picked
+            values = raw[value_col]
+            if not pd.api.types.is_numeric_dtype(values):
+                values = values.astype(str).str.replace("\u00a0", "", regex=False).str.replace(" ", "", regex=False)
+                values = values.str.replace(",", ".", regex=False)
+            times = parse_datetimes(raw[time_col])
+            frame = pd.DataFrame({"time": times, "kwh": pd.to_numeric(values, errors="coerce") * factor})
+            yield frame.dropna()
+    finally:
+        if owned:
+            fh.close()
+
+
+def compute_meter_cost(
+    source: Source,
+    fixed_price_kwh: Optional[float] = None,
+    fix_markup: Optional[float] = None,
+    interval_end: bool = False,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Dict[str, object]:
+    """
+    Přesný spotový náklad z čtvrthodinových odečtů.
+      - ``interval_end``: časy v exportu označují konec intervalu (00:15 = 00:00–00:15),
+      - roky bez cenových dat se oceňují cenami nejbližšího dostupného roku,
+      - čtvrthodiny bez ceny se ocení průměrem daného měsíce.
+    Fixní cenu lze zadat přímo (Kč/kWh) nebo jako přirážku ke spotové ceně.
+    """
+    cube = get_price_cube()
+    per_year: Dict[int, np.ndarray] = {}  # rok -> [kWh, Kč, nespárované kWh, řádky]
+    month_means: Dict[int, np.ndarray] = {}
+    start = end = None
+    for frame in iter_meter_chunks(source, chunk_rows):
+        if frame.empty:
+            continue
+        times = pd.DatetimeIndex(frame["time"])
+        if interval_end:
+            times = times - pd.Timedelta(minutes=15)
+        kwh = frame["kwh"].to_numpy(dtype="float64")
+        qh = quarter_of_year(times)
+        years = times.year.to_numpy()
+        start = times.min() if start is None else min(start, times.min())
+        end = times.max() if end is None else max(end, times.max())
+        for year in np.unique(years):
+            mask = years == year
+            series = cube.spot_series(int(year))
+            prices = series[qh[mask]].astype("float64")
+            missing = np.isnan(prices)
+            if missing.any():
+                if int(year) not in month_means:
+                    month_means[int(year)] = _monthly_means(series, int(year))
+                prices[missing] = month_means[int(year)][times.month.to_numpy()[mask][missing] - 1]
+            acc = per_year.setdefault(int(year), np.zeros(4))
+            acc += (
+                kwh[mask].sum(),
+                (kwh[mask] * prices).sum() / 1000.0,
+                kwh[mask][missing].sum(),
+                mask.sum(),
+            )
+    if not per_year:
+        raise ValueError("Export neobsahuje žádné platné čtvrthodinové hodnoty.")
+    totals = np.sum(list(per_year.values()), axis=0)
+    total_kwh, spot_cost, unmatched_kwh, rows = (float(v) for v in totals)
+    weighted = spot_cost / total_kwh * 1000.0 if total_kwh else 0.0
+    if fixed_price_kwh is not None:
+        fix_price = float(fixed_price_kwh) * 1000.0
+    else:
+        fix_price = weighted * (1 + (fix_markup or 0.0))
+    fix_cost = fix_price * total_kwh / 1000.0
+    return {
+        "rows": int(rows),
+        "period_start": start.isoformat() if start is not None else None,
+        "period_end": end.isoformat() if end is not None else None,
+        "consumption_mwh": total_kwh / 1000.0,
+        "spot_total": spot_cost,
+        "spot_price_per_mwh": weighted,
+        "fix_price_per_mwh": fix_price,
+        "fix_total": fix_cost,
+        "savings": fix_cost - spot_cost,
+        "unmatched_mwh": unmatched_kwh / 1000.0,
+        "years": {
+            year: {
+                "price_year": cube.resolve_year(year),
+                "consumption_mwh": float(acc[0]) / 1000.0,
+                "spot_total": float(acc[1]),
+                "spot_price_per_mwh": float(acc[1] / acc[0]) * 1000.0 if acc[0] else 0.0,
+            }
+            for year, acc in sorted(per_year.items())
+        },
+    }
+
+
+def _monthly_means(series: np.ndarray, year: int) -> np.ndarray:
+    """
+    Průměrná cena po měsících; čtvrthodiny se přiřadí měsícům podle kalendáře
+    oceňovaného roku (v nepřestupném roce zbývá 366. den řady mimo výpočet).
+    """
+    months = np.repeat(pd.date_range(f"{year}-01-01", f"{year}-12-31", freq="D").month.to_numpy(), 96)
+    series = series[: len(months)]
+    months = months[: len(series)]
+    sums = np.bincount(months - 1, weights=np.nan_to_num(series), minlength=12)
+    counts = np.bincount(months - 1, weights=~np.isnan(series), minlength=12)
+    overall = np.nanmean(series) if counts.sum() else 0.0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, overall)
+
+
+__all__ = ["compute_meter_cost", "iter_meter_chunks"]
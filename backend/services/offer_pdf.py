@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import zlib
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+PAGE_W, PAGE_H = 595, 842  # A4 v bodech
+MARGIN = 40
+BRAND = (0.09, 0.35, 0.27)
+SPOT_COLOR = (0.13, 0.55, 0.40)
+FIX_COLOR = (0.62, 0.65, 0.70)
+MONTHS = ("Led", "Úno", "Bře", "Dub", "Kvě", "Čvn", "Čvc", "Srp", "Zář", "Říj", "Lis", "Pro")
+
+# Helvetica (jedno z 14 standardních písem PDF, nic se nevkládá) s kódováním CP1250:
+# znaky, které WinAnsi nemá, se mapují na názvy glyfů přes /Differences
+_GLYPHS = {
+    "á": "aacute", "č": "ccaron", "ď": "dcaron", "é": "eacute", "ě": "ecaron", "í": "iacute",
+    "ň": "ncaron", "ó": "oacute", "ř": "rcaron", "š": "scaron", "ť": "tcaron", "ú": "uacute",
+    "ů": "uring", "ý": "yacute", "ž": "zcaron", "Á": "Aacute", "Č": "Ccaron", "Ď": "Dcaron",
+    "É": "Eacute", "Ě": "Ecaron", "Í": "Iacute", "Ň": "Ncaron", "Ó": "Oacute", "Ř": "Rcaron",
+    "Š": "Scaron", "Ť": "Tcaron", "Ú": "Uacute", "Ů": "Uring", "Ý": "Yacute", "Ž": "Zcaron",
+    "–": "endash", "„": "quotedblbase", "“": "quotedblleft", "”": "quotedblright", "•": "bullet",
+    "×": "multiply", "°": "degree", " ": "space",
+}
+# šířky Helvetica (1/1000 em) pro zarovnání čísel doprava; ostatní znaky odhadem
+_WIDTHS = {**dict.fromkeys("0123456789", 556), " ": 278, ",": 278, ".": 278, "-": 333, "%": 889, "/": 278, "K": 667, "č": 500, "M": 833, "W": 944, "h": 556}
+
+
+@lru_cache(maxsize=1)
+def _font_objects() -> Tuple[bytes, bytes]:
+    """Objekty písem (normální + tučné) – sestaví se jednou za proces."""
+    diffs = " ".join(f"{ch.encode('cp1250')[0]} /{name}" for ch, name in _GLYPHS.items())
+    enc = f"<< /Type /Encoding /BaseEncoding /WinAnsiEncoding /Differences [{diffs}] >>"
+    return tuple(
+        f"<< /Type /Font /Subtype /Type1 /BaseFont /{base} /Encoding {enc} >>".encode("ascii")
+        for base in ("Helvetica", "Helvetica-Bold")
+    )
+
+
+def _pdf_str(text: str) -> bytes:
+    raw = str(text).encode("cp1250", errors="replace")
+    return b"(" + raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def text_width(text: str, size: float) -> float:
+    return sum(_WIDTHS.get(ch, 556) for ch in str(text)) * size / 1000.0
+
+
+class _Canvas:
+    """Minimální kreslení do obsahového streamu stránky (text, obdélníky, čáry)."""
+
+    def __init__(self):
+        self.ops: List[bytes] = []
+
+    def text(self, x: float, y: float, s: str, size: float = 10, bold: bool = False, align: str = "left", color=(0, 0, 0)):
+        if align == "right":
+            x -= text_width(s, size)
+        elif align == "center":
+            x -= text_width(s, size) / 2
+        font = b"/F2" if bold else b"/F1"
+        self.ops.append(b"%.3f %.3f %.3f rg BT %s %.1f Tf %.2f %.2f Td %s Tj ET" % (*color, font, size, x, y, _pdf_str(s)))
+
+    def rect(self, x: float, y: float, w: float, h: float, color=(0, 0, 0)):
+        self.ops.append(b"%.3f %.3f %.3f rg %.2f %.2f %.2f %.2f re f" % (*color, x, y, w, h))
+
+    def line(self, x1: float, y1: float, x2: float, y2: float, color=(0.8, 0.8, 0.8), width: float = 0.5):
+        self.ops.append(b"%.3f %.3f %.3f RG %.2f w %.2f %.2f m %.2f %.2f l S" % (*color, width, x1, y1, x2, y2))
+
+    def stream(self) -> bytes:
+        return b"\n".join(self.ops)
+
+
+# rozvržení stránky: y souřadnice sekcí (PDF počítá odspodu)
+Y_SUMMARY = 730
+Y_MONTHLY = 560
+Y_CHART = 250
+COLS = (MARGIN, 170, 270, 390, 510)  # měsíční tabulka: levý okraj + pravé okraje číselných sloupců
+
+
+@lru_cache(maxsize=1)
+def _template() -> bytes:
+    """Statická část stránky (hlavička, nadpisy, záhlaví tabulek, legenda, patička) – sestaví se jednou."""
+    c = _Canvas()
+    c.rect(0, PAGE_H - 70, PAGE_W, 70, BRAND)
+    c.text(MARGIN, PAGE_H - 42, "Nabídka: spotová vs. fixní cena elektřiny", 18, True, color=(1, 1, 1))
+    c.text(MARGIN, Y_SUMMARY + 20, "Srovnání tarifů", 13, True, color=BRAND)
+    for x, label in ((330, "Spot"), (460, "Fix")):
+        c.text(x, Y_SUMMARY - 62, label, 10, True, align="right")
+    c.text(MARGIN, Y_MONTHLY + 20, "Měsíční rozpad", 13, True, color=BRAND)
+    headers = ("Měsíc", "Spotřeba MWh", "Spot Kč/MWh", "Náklad spot Kč", "Náklad fix Kč")
+    c.text(COLS[0], Y_MONTHLY, headers[0], 9, True)
+    for x, label in zip(COLS[1:], headers[1:]):
+        c.text(x, Y_MONTHLY, label, 9, True, align="right")
+    c.line(MARGIN, Y_MONTHLY - 5, PAGE_W - MARGIN, Y_MONTHLY - 5, (0.3, 0.3, 0.3))
+    c.text(MARGIN, Y_CHART + 20, "Měsíční náklady", 13, True, color=BRAND)
+    c.rect(PAGE_W - MARGIN - 150, Y_CHART + 22, 8, 8, SPOT_COLOR)
+    c.text(PAGE_W - MARGIN - 138, Y_CHART + 23, "spot", 9)
+    c.rect(PAGE_W - MARGIN - 80, Y_CHART + 22, 8, 8, FIX_COLOR)
+    c.text(PAGE_W - MARGIN - 68, Y_CHART + 23, "fix", 9)
+    c.text(
+        MARGIN, 30,
+        "Výpočet vychází z průměrných spotových cen pro typový diagram dodávky (TDD). Nabídka je orientační.",
+        8, color=(0.4, 0.4, 0.4),
+    )
+    return c.stream()
+
+
+def _money(value: Optional[float]) -> str:
+    return "–" if value is None else f"{value:,.0f}".replace(",", " ") + " Kč"
+
+
+def _num(value: Optional[float], digits: int = 0) -> str:
+    return "–" if value is None else f"{value:,.{digits}f}".replace(",", " ").replace(".", ",")
+
+
+def _summary(c: _Canvas, stats: Dict):
+    rows = (
+        ("Sazba / TDD", f"{stats.get('sazba', '')} / {stats.get('tdd', '')}"),
+        ("Roční spotřeba", f"{_num(stats.get('consumption_mwh'), 2)} MWh"),
+        ("Cenový rok", str(stats.get("price_year") or "aktuální průměr")),
+    )
+    for i, (label, value) in enumerate(rows):
+        c.text(MARGIN, Y_SUMMARY - i * 16, label, 10)
+        c.text(180, Y_SUMMARY - i * 16, value, 10, True)
+    y = Y_SUMMARY - 78
+    rows = (
+        ("Cena komodity (Kč/MWh)", _num(stats.get("spot_price_per_mwh")), _num(stats.get("fix_price_per_mwh"))),
+        ("Roční náklad", _money(stats.get("spot_total")), _money(stats.get("fix_total"))),
+    )
+    for i, (label, spot, fix) in enumerate(rows):
+        c.text(MARGIN, y - i * 16, label, 10)
+        c.text(330, y - i * 16, spot, 10, align="right")
+        c.text(460, y - i * 16, fix, 10, align="right")
+    savings = (stats.get("fix_total") or 0.0) - (stats.get("spot_total") or 0.0)
+    share = savings / stats["fix_total"] * 100 if stats.get("fix_total") else 0.0
+    c.rect(MARGIN, y - 52, PAGE_W - 2 * MARGIN, 22, (0.92, 0.96, 0.94))
+    c.text(MARGIN + 8, y - 45, "Úspora se spotovou cenou za rok", 11, True, color=BRAND)
+    c.text(PAGE_W - MARGIN - 8, y - 45, f"{_money(savings)} ({_num(share, 1)} %)", 11, True, align="right", color=BRAND)
+
+
+def _monthly(c: _Canvas, monthly: Optional[Dict[str, list]]):
+    if not monthly:
+        c.text(MARGIN, Y_MONTHLY - 20, "Měsíční data pro zvolený rok nejsou k dispozici.", 10, color=(0.4, 0.4, 0.4))
+        return
+    for i in range(12):
+        y = Y_MONTHLY - 20 - i * 14
+        if i % 2:
+            c.rect(MARGIN, y - 4, PAGE_W - 2 * MARGIN, 14, (0.96, 0.96, 0.96))
+        c.text(COLS[0], y, monthly["month_name"][i], 9)
+        values = (
+            _num(monthly["consumption_mwh"][i], 3),
+            _num(monthly["spot_price_per_mwh"][i]),
+            _num(monthly["spot_cost"][i]),
+            _num(monthly["fix_cost"][i]),
+        )
+        for x, value in zip(COLS[1:], values):
+            c.text(x, y, value, 9, align="right")
+
+
+def _chart(c: _Canvas, monthly: Optional[Dict[str, list]]):
+    top, bottom = Y_CHART, 70
+    left, right = MARGIN + 45, PAGE_W - MARGIN
+    c.line(left, bottom, right, bottom, (0.3, 0.3, 0.3))
+    if not monthly:
+        return
+    spot, fix = monthly["spot_cost"], monthly["fix_cost"]
+    peak = max(max(spot), max(fix), 1e-9)
+    scale = (top - bottom - 10) / peak
+    for k in range(5):
+        value = peak * k / 4
+        y = bottom + value * scale
+        c.line(left, y, right, y, (0.88, 0.88, 0.88))
+        c.text(left - 5, y - 3, _num(value), 7, align="right", color=(0.4, 0.4, 0.4))
+    slot = (right - left) / 12
+    bar = slot * 0.35
+    for i in range(12):
+        x = left + i * slot + slot * 0.12
+        c.rect(x, bottom, bar, spot[i] * scale, SPOT_COLOR)
+        c.rect(x + bar, bottom, bar, fix[i] * scale, FIX_COLOR)
+        c.text(x + bar, bottom - 12, MONTHS[i], 7, align="center")
+
+
+def render_offer_pdf(stats: Dict, email: Optional[str] = None, generated: Optional[datetime] = None) -> bytes:
+    """
+    Jednostránková PDF nabídka z výstupu ``compute_tariff_stats``: srovnání
+    spot/fix, měsíční tabulka a sloupcový graf nákladů. Bez závislostí – statická
+    šablona a písma se sestaví jednou, za dokument se kreslí jen data.
+    """
+    c = _Canvas()
+    stamp = (generated or datetime.now()).strftime("%d.%m.%Y %H:%M")
+    c.text(MARGIN, PAGE_H - 60, f"Připraveno {stamp}" + (f" pro {email}" if email else ""), 9, color=(0.85, 0.93, 0.9))
+    _summary(c, stats)
+    _monthly(c, stats.get("monthly"))
+    _chart(c, stats.get("monthly"))
+    content = zlib.compress(_template() + b"\n" + c.stream(), 6)
+    font, font_bold = _font_objects()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R /F2 6 0 R >> >> >>" % (PAGE_W, PAGE_H),
+        b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(content) + content + b"\nendstream",
+        font,
+        font_bold,
+    ]
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for i, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+__all__ = ["render_offer_pdf", "text_width"]
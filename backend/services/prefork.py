@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def memory_report() -> Dict[str, object]:
+    """
+    Paměť aktuálního procesu v kB. Na Linuxu ze ``/proc/self/smaps_rollup``:
+    ``pss`` je férový podíl procesu (sdílené stránky dělené počtem procesů),
+    ``shared_*`` stránky sdílené s masterem nebo ostatními workery.
+    """
+    report: Dict[str, object] = {"pid": os.getpid(), "ppid": os.getppid()}
+    try:
+        with open("/proc/self/smaps_rollup", encoding="ascii") as fh:
+            for line in fh:
+                name, _, rest = line.partition(":")
+                if name in _SMAPS_FIELDS:
+                    report[name.lower() + "_kb"] = int(rest.split()[0])
+    except OSError:
+        import resource
+
+        report["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return report
+
+
+def array_info(arr: Optional[np.ndarray]) -> Optional[Dict[str, object]]:
+    """Velikost pole a zda je namapované ze souboru (sdílené přes page cache)."""
+    if arr is None:
+        return None
+    return {
+        "shape": list(arr.shape),
+        "mb": round(arr.nbytes / 2**20, 2),
+        "mmap": isinstance(arr, np.memmap),
+        "writeable": bool(arr.flags.writeable),
+    }
+
+
+def save_shared_array(path: str, arr: np.ndarray) -> np.ndarray:
+    """
+    Uloží pole jako .npy (atomicky přes dočasný soubor) a vrátí ho namapované
+    jen pro čtení – všechny procesy nad stejným souborem sdílí jednu kopii.
+    """
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh:
+        np.save(fh, np.ascontiguousarray(arr))
+    os.replace(tmp, path)
+    return np.load(path, mmap_mode="r")
+
+
+class SharedStrings(Sequence):
+    """
+    Seznam řetězců uložený jako jeden UTF-8 blok a pole offsetů (.npy
+    namapované jen pro čtení). Procesy sdílí data přes page cache, řetězec se
+    dekóduje až při přístupu.
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data, self.offsets = data, offsets
+
+    @classmethod
+    def save(cls, prefix: str, items: Iterable[Optional[str]]) -> "SharedStrings":
+        encoded = [(item or "").encode("utf-8") for item in items]
+        offsets = np.zeros(len(encoded) + 1, dtype="int64")
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        data = np.frombuffer(b"".join(encoded), dtype="uint8")
+        return cls(save_shared_array(f"{prefix}.data.npy", data), save_shared_array(f"{prefix}.offsets.npy", offsets))
+
+    @classmethod
+    def open(cls, desc: Dict[str, str]) -> "SharedStrings":
+        return cls(np.load(desc["data"], mmap_mode="r"), np.load(desc["offsets"], mmap_mode="r"))
+
+    def describe(self) -> Dict[str, str]:
+        return {"data": self.data.filename, "offsets": self.offsets.filename}
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return bytes(self.data[self.offsets[i] : self.offsets[i + 1]]).decode("utf-8")
+
+
+class SharedVocab:
+    """Slovník token -> sloupec nad seřazenými tokeny (``SharedStrings``) a polem id; hledá se půlením."""
+
+    def __init__(self, keys: SharedStrings, ids: np.ndarray):
+        self.keys, self.ids = keys, ids
+
+    @classmethod
+    def save(cls, prefix: str, vocab: Dict[str, int]) -> "SharedVocab":
+        tokens = sorted(vocab)
+        ids = np.array([vocab[t] for t in tokens], dtype="int64")
+        return cls(SharedStrings.save(f"{prefix}.keys", tokens), save_shared_array(f"{prefix}.ids.npy", ids))
+
+    @classmethod
+    def open(cls, desc: Dict[str, object]) -> "SharedVocab":
+        return cls(SharedStrings.open(desc["keys"]), np.load(desc["ids"], mmap_mode="r"))
+
+    def describe(self) -> Dict[str, object]:
+        return {"keys": self.keys.describe(), "ids": self.ids.filename}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def get(self, token: str, default: Optional[int] = None) -> Optional[int]:
+        i = bisect_left(self.keys, token)
+        if i < len(self.keys) and self.keys[i] == token:
+            return int(self.ids[i])
+        return default
+
+
+def serve_prefork(
+    app,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    workers: int = 2,
+    preload: Optional[Callable[[], None]] = None,
+    log_level: str = "info",
+):
+    """
+    Pre-fork režim: ``preload`` načte index a tarifní data v masteru, pak se
+    proces rozdělí na ``workers`` potomků, kteří sdílí jeho stránky (copy-on-write)
+    a společný naslouchající socket. Spadlý worker se nahradí novým; padá-li
+    hned po startu, čeká se před dalším pokusem čím dál déle (až 30 s).
+    """
+    import uvicorn
+
+    if preload is not None:
+        started = time.perf_counter()
+        preload()
+        logger.info("Preload hotový za %.1f s, master %s", time.perf_counter() - started, memory_report())
+    # sebrané objekty už GC neprochází, takže mu nezapisuje do hlaviček a stránky zůstanou sdílené
+    gc.collect()
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    def spawn() -> int:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            config = uvicorn.Config(app, log_level=log_level, workers=1)
+            server = uvicorn.Server(config)
+            logger.info("Worker %d naslouchá na %s:%d", os.getpid(), host, port)
+            code = 1
+            try:
+                server.run(sockets=[sock])
+                code = 0
+            except Exception:
+                logger.exception("Worker %d spadl.", os.getpid())
+            finally:
+                os._exit(code)
+        started[pid] = time.monotonic()
+        return pid
+
+    started: Dict[int, float] = {}
+    children = {spawn() for _ in range(max(1, workers))}
+    stopping = False
+    backoff = 0.0
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            children.discard(pid)
+            if stopping:
+                continue
+            # worker, který nevydržel ani 10 s, padá nejspíš hned při startu – nerestartovat ve smyčce
+            lived = time.monotonic() - started.pop(pid, 0.0)
+            backoff = 0.0 if lived >= 10 else min(30.0, max(1.0, backoff * 2))
+            logger.warning("Worker %d skončil (status %d), nový za %.0f s.", pid, status, backoff)
+            deadline = time.monotonic() + backoff
+            while not stopping and time.monotonic() < deadline:
+                time.sleep(0.1)
+            if not stopping:
+                children.add(spawn())
+    finally:
+        sock.close()
+
+
+__all__ = ["SharedStrings", "SharedVocab", "array_info", "memory_report", "save_shared_array", "serve_prefork"]
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import os
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from backend.services.tdd_prices import TDD_INDEX, get_price_cube
+
+SERIES_CACHE_SIZE = int(os.getenv("SERIES_CACHE_SIZE", "256"))
+MAX_POINTS = int(os.getenv("SERIES_MAX_POINTS", "5000"))
+
+SERIES_KINDS = {"spot": ("Kč/MWh", 2), "profile": ("relativní zatížení (1 = průměr)", 4)}
+# počet čtvrthodin v kbelíku; měsíc má proměnnou délku, řeší se zvlášť
+RESOLUTIONS = {"15min": 1, "hour": 4, "day": 96, "week": 7 * 96, "month": None}
+QH = np.timedelta64(15, "m")
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indexy ``n_out`` bodů, které nejlépe
+    zachovají tvar křivky (špičky i propady). První a poslední bod zůstávají;
+    vnitřek se rozdělí na ``n_out - 2`` kbelíků a z každého se vezme bod
+    s největším trojúhelníkem vůči minulému vybranému bodu a průměru dalšího
+    kbelíku. Průměry kbelíků se počítají najednou, smyčka je jen přes kbelíky.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = x.astype("float64")
+    y = y.astype("float64")
+    edges = np.linspace(1, n - 1, n_out - 1).astype("int64")
+    counts = np.diff(edges)
+    avg_x = np.append(np.add.reduceat(x[1:-1], edges[:-1] - 1) / counts, x[-1])
+    avg_y = np.append(np.add.reduceat(y[1:-1], edges[:-1] - 1) / counts, y[-1])
+    out = np.empty(n_out, dtype="int64")
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[i + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def _day_range(year: Optional[int], start: Optional[str], end: Optional[str]) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """
+    Požadovaný rok a rozsah dnů v něm [od, do) (``end`` včetně celého dne).
+    Rozsah přes konec roku, nebo mimo zadaný ``year``, se odmítne.
+    """
+    lo_date = date.fromisoformat(start) if start else None
+    hi_date = date.fromisoformat(end) if end else None
+    years = {d.year for d in (lo_date, hi_date) if d is not None}
+    if len(years) > 1:
+        raise ValueError(f"Rozsah {start}–{end} přesahuje konec roku – požádejte o každý rok zvlášť")
+    if year is not None and years and years != {year}:
+        raise ValueError(f"Rozsah {start or ''}–{end or ''} neleží v roce {year}")
+    year = year if year is not None else next(iter(years), None)
+    lo = (lo_date - date(year, 1, 1)).days if lo_date else None
+    hi = (hi_date - date(year, 1, 1)).days + 1 if hi_date else None
+    return year, lo, hi
+
+
+def _range(year: int, lo: Optional[int], hi: Optional[int]) -> Tuple[int, int]:
+    """
+    Rozsah čtvrthodin [od, do) v roce dat ``year`` pro dny roku ``lo``–``hi``;
+    když chybí data požadovaného roku, dny se přenesou na rok dostupný (31. 12.
+    přestupného roku na poslední den nepřestupného).
+    """
+    days = (date(year + 1, 1, 1) - date(year, 1, 1)).days
+    lo = 0 if lo is None else min(lo, days - 1)
+    hi = days if hi is None else min(hi, days)
+    if lo >= hi:
+        raise ValueError(f"Prázdný rozsah dat pro rok {year}")
+    return lo * 96, hi * 96
+
+
+def _buckets(times: np.ndarray, resolution: str, qh: np.ndarray) -> np.ndarray:
+    step = RESOLUTIONS[resolution]
+    if step is None:
+        months = times.astype("datetime64[M]").astype("int64")
+        return months - months[0]
+    return (qh - qh[0]) // step
+
+
+def _aggregate(times: np.ndarray, values: np.ndarray, bucket: np.ndarray):
+    """Průměr, minimum a maximum po kbelících (souvislé úseky), NaN se ignorují; prázdné kbelíky vypadnou."""
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ok = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(ok, values, 0.0), starts)
+    counts = np.add.reduceat(ok.astype("int64"), starts)
+    with np.errstate(invalid="ignore"):
+        mean = sums / counts
+    lo = np.fmin.reduceat(values, starts)
+    hi = np.fmax.reduceat(values, starts)
+    keep = counts > 0
+    return times[starts][keep], mean[keep], lo[keep], hi[keep]
+
+
+@lru_cache(maxsize=SERIES_CACHE_SIZE)
+def _series(kind: str, tdd: Optional[str], year: int, lo_day: Optional[int], hi_day: Optional[int], resolution: str, width: Optional[int]) -> Dict[str, object]:
+    cube = get_price_cube()
+    if kind == "spot":
+        raw = cube.spot_series(year)
+    else:
+        raw = cube.tdd_profile(tdd, year)
+        days = (date(year + 1, 1, 1) - date(year, 1, 1)).days
+        raw = raw * (days * 96)  # podíl čtvrthodiny -> násobek průměrného zatížení
+    lo, hi = _range(year, lo_day, hi_day)
+    qh = np.arange(lo, hi)
+    values = raw[lo:hi].astype("float64")
+    times = np.datetime64(f"{year}-01-01T00:00") + qh * QH
+    unit, digits = SERIES_KINDS[kind]
+    out: Dict[str, object] = {"kind": kind, "tdd": tdd, "year": year, "unit": unit, "resolution": resolution}
+    if resolution == "15min":
+        ok = ~np.isnan(values)
+        times, values = times[ok], values[ok]
+    else:
+        times, values, vmin, vmax = _aggregate(times, values, _buckets(times, resolution, qh))
+    t = times.astype("datetime64[ms]").astype("int64")
+    downsampled = bool(width and len(values) > width)
+    if downsampled:
+        idx = lttb(t, values, width)
+        t, values = t[idx], values[idx]
+        if resolution != "15min":
+            vmin, vmax = vmin[idx], vmax[idx]
+    out.update({"points": int(len(values)), "downsampled": downsampled, "t": t, "value": values.round(digits).astype("float32")})
+    if resolution != "15min":
+        out["min"] = vmin.round(digits).astype("float32")
+        out["max"] = vmax.round(digits).astype("float32")
+    return out
+
+
+def get_series(
+    kind: str = "spot",
+    tdd: Optional[str] = None,
+    year: Optional[int] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    resolution: Optional[str] = None,
+    width: Optional[int] = None,
+) -> Dict[str, object]:
+    """
+    Časová řada pro grafy: spotové ceny (``spot``) nebo profil TDD
+    (``profile``) za rok / rozsah dat, agregovaná po ``resolution``
+    (15min, hour, day, week, month; průměr + min/max v kbelíku) a případně
+    zmenšená LTTB na ``width`` bodů (šířka grafu v pixelech). Bez
+    ``resolution`` a s ``width`` se LTTB aplikuje přímo na 15min data.
+    Výsledky se cachují podle parametrů (čas ``t`` v epoch ms). Chybí-li data
+    požadovaného roku, použije se nejbližší dostupný (``year`` ve výstupu) se
+    stejnými dny v roce; rozsah přes konec roku se odmítne.
+    """
+    if kind not in SERIES_KINDS:
+        raise ValueError(f"Neznámý typ řady {kind!r} (povolené: {', '.join(SERIES_KINDS)})")
+    resolution = resolution or ("15min" if width else "hour")
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Neznámé rozlišení {resolution!r} (povolené: {', '.join(RESOLUTIONS)})")
+    tdd = (tdd or "").upper() or None
+    if kind == "profile" and tdd not in TDD_INDEX:
+        raise ValueError(f"Profil vyžaduje platné TDD (TDD1–TDD8), ne {tdd!r}")
+    if kind == "spot":
+        tdd = None
+    width = min(max(int(width), 3), MAX_POINTS) if width else None
+    if width is None and resolution == "15min":
+        width = MAX_POINTS  # plná 15min data za rok (~35k bodů) nikdy neposíláme
+    requested, lo_day, hi_day = _day_range(int(year) if year else None, start or None, end or None)
+    year = get_price_cube().resolve_year(requested)
+    return _series(kind, tdd, year, lo_day, hi_day, resolution, width)
+
+
+def series_cache_info() -> Dict[str, int]:
+    info = _series.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+
+__all__ = ["RESOLUTIONS", "SERIES_KINDS", "get_series", "lttb", "series_cache_info"]
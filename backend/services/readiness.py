@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# kroky, bez kterých proces není „ready“ (ostatní chyby = degraded, ale ready);
+# bez indexu RAG dotazy neodpoví, proto je povinný – WARMUP_REQUIRED="" to vypne
+WARMUP_REQUIRED = tuple(s.strip() for s in os.getenv("WARMUP_REQUIRED", "index").split(",") if s.strip())
+
+Step = Tuple[str, Callable[[], object]]
+
+
+class Readiness:
+    """
+    Stav zahřátí procesu: pojmenované kroky (index, ceny, klienti, ...) se
+    provedou jednou, synchronně nebo na pozadí, s časem a případnou chybou.
+    Stavy: ``cold`` → ``warming`` → ``ready`` / ``degraded`` (selhal nepovinný
+    krok) / ``failed`` (selhal krok z ``required``). Opakované spuštění během
+    zahřívání nebo po něm nic nedělá.
+    """
+
+    def __init__(self, required: Sequence[str] = WARMUP_REQUIRED):
+        self.required = tuple(required)
+        self.state = "cold"
+        self.steps: Dict[str, Dict[str, object]] = {}
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state in ("ready", "degraded")
+
+    def start(self, steps: Iterable[Step], background: bool = False) -> bool:
+        """Spustí zahřátí; vrací False, pokud už běží nebo proběhlo."""
+        with self._lock:
+            if self.state != "cold":
+                return False
+            self.state = "warming"
+            self.started = time.time()
+        steps = list(steps)
+        if background:
+            self._thread = threading.Thread(target=self._run, args=(steps,), name="warmup", daemon=True)
+            self._thread.start()
+        else:
+            self._run(steps)
+        return True
+
+    def _run(self, steps: Sequence[Step]):
+        for name, fn in steps:
+            t0 = time.perf_counter()
+            try:
+                fn()
+                self.steps[name] = {"ok": True, "ms": round((time.perf_counter() - t0) * 1000, 1)}
+            except Exception as exc:
+                logger.warning("Zahřátí: krok %s selhal: %s", name, exc)
+                self.steps[name] = {"ok": False, "ms": round((time.perf_counter() - t0) * 1000, 1), "error": str(exc)}
+        failed = [name for name, info in self.steps.items() if not info["ok"]]
+        self.state = "failed" if set(failed) & set(self.required) else ("degraded" if failed else "ready")
+        self.finished = time.time()
+        self._done.set()
+        logger.info("Zahřátí hotovo za %.2f s (%s).", self.finished - self.started, self.state)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Počká na konec zahřívání; True, pokud je proces ready."""
+        if self.state == "cold":
+            return False
+        self._done.wait(timeout)
+        return self.ready
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "ready": self.ready,
+            "state": self.state,
+            "steps": dict(self.steps),
+            "required": list(self.required),
+            "seconds": round((self.finished or time.time()) - self.started, 3) if self.started else None,
+        }
+
+
+__all__ = ["Readiness", "WARMUP_REQUIRED"]
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.services.tdd_prices import get_price_cube, interpolate_gaps
+
+DAYS = 365
+QH_PER_DAY = 96
+PERCENTILES = (1, 5, 10, 25, 50, 75, 90, 95, 99)
+# horní mez scénářů na jeden požadavek a velikost dávky, po které se scénáře počítají
+MAX_SCENARIOS = int(os.getenv("RISK_MAX_SCENARIOS", "20000"))
+SCENARIO_CHUNK = int(os.getenv("RISK_SCENARIO_CHUNK", "2000"))
+# matice nákladů (TDD × rok × sada let) držené v paměti, nejdéle nepoužité se zahodí
+POOL_CACHE_SIZE = int(os.getenv("RISK_POOL_CACHE", "8"))
+
+_POOL_CACHE: "OrderedDict[Tuple[str, int, Tuple[int, ...]], dict]" = OrderedDict()
+_POOL_LOCK = threading.Lock()
+
+
+def _pool(tdd: str, base_year: int, years: Tuple[int, ...]) -> dict:
+    """
+    Předpočítá matici nákladů den × zdrojový den: ``C[d, k]`` = podíl profilu
+    TDD v cílovém dni ``d`` (základní rok) ocenění cenami zdrojového dne ``k``
+    (libovolný rok z ``years``). Scénář je pak jen součet vybraných prvků.
+    """
+    key = (tdd, base_year, years)
+    with _POOL_LOCK:
+        cached = _POOL_CACHE.get(key)
+        if cached is not None:
+            _POOL_CACHE.move_to_end(key)
+    if cached is not None:
+        return cached
+    cube = get_price_cube()
+    profile = cube.tdd_profile(tdd, base_year)
+    if profile is None:
+        raise ValueError(f"Neznámá třída TDD: {tdd}")
+    weights = profile[: DAYS * QH_PER_DAY].astype("float64")
+    weights /= weights.sum() or 1.0
+    w_days = weights.reshape(DAYS, QH_PER_DAY)
+    prices = np.concatenate(
+        [interpolate_gaps(cube.spot_series(y))[: DAYS * QH_PER_DAY].reshape(DAYS, QH_PER_DAY) for y in years]
+    )
+    base_weekday = date(base_year, 1, 1).weekday()
+    pool = {
+        "costs": w_days @ prices.T,  # DAYS × (DAYS·len(years)), Kč/MWh
+        "baseline": float((w_days * prices[years.index(base_year) * DAYS :][:DAYS]).sum())
+        if base_year in years
+        else None,
+        # posun zdrojového roku, aby seděly dny v týdnu
+        "weekday_shift": np.array([(base_weekday - date(y, 1, 1).weekday()) % 7 for y in years]),
+    }
+    with _POOL_LOCK:
+        _POOL_CACHE[key] = pool
+        while len(_POOL_CACHE) > max(1, POOL_CACHE_SIZE):
+            _POOL_CACHE.popitem(last=False)
+    return pool
+
+
+def _check_params(n_scenarios, block_days, seed) -> Tuple[int, int, Optional[int]]:
+    """Ověří vstupy simulace; nesmyslné hodnoty vyhodí ValueError (API vrací 400)."""
+    try:
+        n_scenarios = int(n_scenarios)
+        block_days = int(block_days)
+        seed = None if seed is None else int(seed)
+    except (TypeError, ValueError):
+        raise ValueError("scenarios, blockDays a seed musí být celá čísla")
+    if not 1 <= n_scenarios <= MAX_SCENARIOS:
+        raise ValueError(f"Počet scénářů musí být 1–{MAX_SCENARIOS}")
+    if seed is not None and seed < 0:
+        raise ValueError("seed musí být nezáporný")
+    return n_scenarios, min(max(1, block_days), DAYS), seed
+
+
+def simulate_spot_costs(
+    tdd: str,
+    year: Optional[int] = None,
+    years: Optional[Sequence[int]] = None,
+    n_scenarios: int = 10_000,
+    block_days: int = 7,
+    season_window_days: int = 14,
+    seed: Optional[int] = 42,
+) -> Tuple[np.ndarray, Optional[float]]:
+    """
+    Sezónní blokový bootstrap 15min spotových cen. Každý scénář skládá roční
+    řadu z bloků po ``block_days`` dnech, vybraných z libovolného dostupného
+    roku v okně ±``season_window_days`` kolem stejného dne v roce (se zachováním
+    dne v týdnu). Vrací vážené ceny (Kč/MWh) pro profil TDD po scénářích a
+    cenu skutečného základního roku. Scénáře se počítají po dávkách
+    ``SCENARIO_CHUNK``, takže mezivýsledky nerostou s jejich počtem.
+    """
+    n_scenarios, block_days, seed = _check_params(n_scenarios, block_days, seed)
+    cube = get_price_cube()
+    base_year = cube.resolve_year(year)
+    pool_years = tuple(sorted(set(years or cube.years())))
+    pool = _pool(tdd.upper(), base_year, pool_years)
+    costs = pool["costs"]
+    rng = np.random.default_rng(seed)
+    n_blocks = -(-DAYS // block_days)
+    weeks = max(0, int(season_window_days) // 7)
+    # blok, do kterého patří cílový den, a jeho pozice v bloku
+    day_block = np.arange(DAYS) // block_days
+    day_in_block = np.arange(DAYS) - day_block * block_days
+    row_base = np.arange(DAYS) * costs.shape[1]
+    flat = costs.ravel()
+    out = np.empty(n_scenarios)
+    for lo in range(0, n_scenarios, max(1, SCENARIO_CHUNK)):
+        n = min(SCENARIO_CHUNK, n_scenarios - lo)
+        src_year = rng.integers(0, len(pool_years), size=(n, n_blocks))
+        offset = 7 * rng.integers(-weeks, weeks + 1, size=(n, n_blocks)) + pool["weekday_shift"][src_year]
+        src_start = np.arange(n_blocks) * block_days + offset
+        idx = (src_start[:, day_block] + day_in_block) % DAYS
+        idx += src_year[:, day_block] * DAYS
+        idx += row_base
+        out[lo : lo + n] = flat[idx].sum(axis=1)
+    return out, pool["baseline"]
+
+
+def fixed_vs_spot_risk(
+    tdd: str,
+    consumption_mwh: float,
+    fix_price_per_mwh: float,
+    year: Optional[int] = None,
+    n_scenarios: int = 10_000,
+    block_days: int = 7,
+    season_window_days: int = 14,
+    seed: Optional[int] = 42,
+    confidence: float = 0.95,
+) -> Dict[str, object]:
+    """
+    Rozdělení úspory spot vs. fix (Kč, kladná = spot je levnější) přes
+    ``n_scenarios`` scénářů. VaR/CVaR udávají, o kolik může spot při dané
+    hladině spolehlivosti vyjít dráž než fix.
+    """
+    n_scenarios, block_days, seed = _check_params(n_scenarios, block_days, seed)
+    prices, baseline = simulate_spot_costs(
+        tdd, year, n_scenarios=n_scenarios, block_days=block_days,
+        season_window_days=season_window_days, seed=seed,
+    )
+    spot_costs = prices * consumption_mwh
+    fix_total = fix_price_per_mwh * consumption_mwh
+    savings = fix_total - spot_costs
+    tail = np.quantile(savings, 1 - confidence)
+    losses = savings[savings <= tail]
+    return {
+        "tdd": tdd.upper(),
+        "price_year": get_price_cube().resolve_year(year),
+        "scenarios": int(n_scenarios),
+        "seed": seed,
+        "consumption_mwh": consumption_mwh,
+        "fix_total": fix_total,
+        "baseline_spot_price_per_mwh": baseline,
+        "spot_price_per_mwh": {
+            "mean": float(prices.mean()),
+            "std": float(prices.std()),
+        },
+        "savings": {
+            "mean": float(savings.mean()),
+            "std": float(savings.std()),
+            "percentiles": {str(p): float(v) for p, v in zip(PERCENTILES, np.percentile(savings, PERCENTILES))},
+            "probability_spot_cheaper": float((savings > 0).mean()),
+        },
+        "confidence": confidence,
+        "var": float(max(0.0, -tail)),
+        "cvar": float(max(0.0, -losses.mean())) if losses.size else 0.0,
+    }
+
+
+__all__ = ["MAX_SCENARIOS", "simulate_spot_costs", "fixed_vs_spot_risk"]
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "5000"))
+SESSION_MAX_MB = float(os.getenv("SESSION_MAX_MB", "64"))
+
+_ENTRY_OVERHEAD = 512  # hrubý odhad režie slovníku jedné session v bajtech
+
+
+def _entry_size(entry: Dict[str, object]) -> int:
+    size = _ENTRY_OVERHEAD
+    for value in entry.values():
+        if isinstance(value, str):
+            size += len(value)
+        elif isinstance(value, list):
+            size += sum(len(h.get("text") or "") + 128 for h in value if isinstance(h, dict))
+        elif hasattr(value, "nbytes"):
+            size += int(value.nbytes)
+    return size
+
+
+class SessionStore:
+    """
+    Kontext konverzace po ``sessionId`` (poslední dotaz, nalezené pasáže, sazba,
+    spotřeba, ...). Položky vyprší po ``ttl`` sekundách nečinnosti; při překročení
+    počtu session nebo odhadu paměti se vyřazují nejdéle nepoužité (LRU).
+    """
+
+    def __init__(self, ttl: float = SESSION_TTL_SECONDS, max_sessions: int = SESSION_MAX, max_mb: float = SESSION_MAX_MB):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = int(max_mb * 2**20)
+        self._items: "OrderedDict[str, Dict[str, object]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+    def _drop(self, key: str):
+        self._items.pop(key, None)
+        self._bytes -= self._sizes.pop(key, 0)
+
+    def get(self, session_id: str) -> Optional[Dict[str, object]]:
+        """Kopie kontextu session, nebo None (neznámá / vypršelá)."""
+        with self._lock:
+            entry = self._items.get(session_id)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if time.monotonic() - entry["_touched"] > self.ttl:
+                self._drop(session_id)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._items.move_to_end(session_id)
+            self.stats["hits"] += 1
+            return {k: v for k, v in entry.items() if not k.startswith("_")}
+
+    def update(self, session_id: str, **fields):
+        """Doplní/přepíše pole kontextu session a podle potřeby vyřadí nejstarší session."""
+        with self._lock:
+            entry = dict(self._items.get(session_id) or {})
+            entry.update(fields)
+            entry["_touched"] = time.monotonic()
+            self._drop(session_id)
+            size = _entry_size(entry)
+            self._items[session_id] = entry
+            self._sizes[session_id] = size
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        now = time.monotonic()
+        # nejdřív vypršelé od nejstarších, pak LRU, dokud nejsme pod limity
+        while self._items:
+            key, entry = next(iter(self._items.items()))
+            if now - entry["_touched"] > self.ttl:
+                self._drop(key)
+                self.stats["expired"] += 1
+            elif len(self._items) > self.max_sessions or self._bytes > self.max_bytes:
+                self._drop(key)
+                self.stats["evicted"] += 1
+            else:
+                break
+
+    def discard(self, session_id: str):
+        with self._lock:
+            self._drop(session_id)
+
+    def metrics(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "sessions": len(self._items),
+                "mb": round(self._bytes / 2**20, 3),
+                "max_sessions": self.max_sessions,
+                "max_mb": round(self.max_bytes / 2**20, 1),
+                **self.stats,
+            }
+
+
+__all__ = ["SessionStore"]
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Sloučí souběžná volání se stejným klíčem: první volající (leader) provede
+    ``fn``, ostatní čekají na jeho výsledek nebo výjimku. Každý čekající má vlastní
+    timeout – po jeho vypršení dostane ``TimeoutError``, leader běží dál a výsledek
+    dostanou ostatní. Po dokončení se klíč uvolní, nic se necachuje.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "upstream": 0, "shared": 0, "timeouts": 0}
+
+    def do(self, key: Hashable, fn: Callable[[], T], timeout: Optional[float] = None) -> T:
+        with self._lock:
+            self.stats["calls"] += 1
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.stats["upstream"] += 1
+            else:
+                self.stats["shared"] += 1
+        if not leader:
+            try:
+                return future.result(timeout)
+            except FutureTimeout:
+                with self._lock:
+                    self.stats["timeouts"] += 1
+                raise TimeoutError(f"Čekání na sdílené volání vypršelo po {timeout} s") from None
+        try:
+            result = fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def metrics(self) -> Dict[str, object]:
+        with self._lock:
+            calls = self.stats["calls"]
+            return {
+                **self.stats,
+                "in_flight": len(self._calls),
+                "dedup_ratio": round(self.stats["shared"] / calls, 3) if calls else 0.0,
+            }
+
+
+__all__ = ["SingleFlight"]
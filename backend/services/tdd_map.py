@@ -1,16 +1,22 @@
 from __future__ import annotations
 import os
 import unicodedata, re
+import threading
+import time
+import logging
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 
 import pandas as pd  # vyžaduje "pandas" a "openpyxl"
 
+logger = logging.getLogger(__name__)
+
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 DATA_DIRS = [
     PROJECT_ROOT / "rag" / "docs" / "data",
     PROJECT_ROOT / "rag" / "data",
 ]
+CHECK_SECONDS = float(os.getenv("TDD_MAP_CHECK_SECONDS", "2"))
 
 
 def _default_excel_path() -> Path:
@@ -28,6 +34,8 @@ def _default_excel_path() -> Path:
 
 EXCEL_PATH = _default_excel_path()
 
+Key = Tuple[str, Optional[str]]
+
 
 def _norm(s: str) -> str:
     s = (s or "").strip().lower()
@@ -36,44 +44,140 @@ def _norm(s: str) -> str:
     return s
 
 
-def load_tdd_map(path: Path = EXCEL_PATH) -> Dict[tuple, Dict[str, Any]]:
+def normalize_sazba(sazba: Optional[str]) -> str:
+    """Kanonický tvar sazby: bez diakritiky, mezer a oddělovačů, velkými písmeny ("d 25 d" -> "D25D")."""
+    return re.sub(r"[\s\-_./]+", "", _norm(str(sazba or ""))).upper()
+
+
+def _norm_column(values: pd.Series, sazba: bool = False) -> pd.Series:
+    """Vektorová obdoba ``_norm``/``normalize_sazba`` nad celým sloupcem."""
+    s = values.astype("string").str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+    s = s.str.strip().str.lower()
+    if sazba:
+        return s.str.replace(r"[\s\-_./]+", "", regex=True).str.upper()
+    return s.str.replace(r"\s+", " ", regex=True)
+
+
+def load_tdd_map(path: Path = EXCEL_PATH) -> Dict[Key, Dict[str, Any]]:
     if not path.exists():
         return {}
     # vezmeme první list; pokud máš pojmenovaný „Sazby“, dej sheet_name="Sazby"
-    df = pd.read_excel(path)
+    df = pd.read_excel(path, dtype=str)
     # tolerantní mapování názvů sloupců
-    cols = {_norm(c): c for c in df.columns}
-    col_sazba = cols.get("sazba") or cols.get("tarif") or list(df.columns)[0]
-    col_tdd = cols.get("tdd") or cols.get("diagram") or list(df.columns)[1]
-    col_dist = cols.get("distributor") or cols.get("distribuce")  # volitelný
-
-    out: Dict[tuple, Dict[str, Any]] = {}
-    for _, row in df.iterrows():
-        sazba = _norm(str(row[col_sazba]))
-        tdd = str(row[col_tdd]).strip()
-        dist = _norm(str(row[col_dist])) if col_dist else None
-        out[(sazba, dist)] = {"sazba": sazba, "tdd": tdd, "distributor": dist, "raw": row.to_dict()}
+    cols = {_norm(str(c)): c for c in df.columns}
+    col_sazba = next((c for n, c in cols.items() if "sazba" in n or "tarif" in n), df.columns[0])
+    col_tdd = next((c for n, c in cols.items() if "tdd" in n or "diagram" in n), df.columns[1])
+    col_dist = next((c for n, c in cols.items() if "distribu" in n and c != col_sazba), None)  # volitelný
+
+    sazby = _norm_column(df[col_sazba], sazba=True)
+    tdds = df[col_tdd].astype("string").str.replace(r"\s+", "", regex=True).str.upper()
+    dists = _norm_column(df[col_dist]) if col_dist is not None else pd.Series(pd.NA, index=df.index, dtype="string")
+    valid = (sazby.fillna("") != "") & (tdds.fillna("") != "")
+    records = df[valid].to_dict("records")
+
+    out: Dict[Key, Dict[str, Any]] = {}
+    for sazba, tdd, dist, raw in zip(sazby[valid], tdds[valid], dists[valid], records):
+        dist = dist if isinstance(dist, str) and dist else None
+        entry = {"sazba": sazba, "tdd": tdd, "distributor": dist, "raw": raw}
+        out[(sazba, dist)] = entry
         # fallback bez distributora
-        out.setdefault((sazba, None), {"sazba": sazba, "tdd": tdd, "distributor": None, "raw": row.to_dict()})
+        out.setdefault((sazba, None), {**entry, "distributor": None})
     return out
 
 
-_TDD_MAP = None  # lazy load
-
-
-def _ensure_loaded():
-    global _TDD_MAP
-    if _TDD_MAP is None:
-        _TDD_MAP = load_tdd_map()
+class TariffMap:
+    """
+    Mapování (sazba, distributor) -> TDD nad jedním Excelem. Čtenáři vždy
+    dostanou hotový neměnný slovník; při změně mtime souboru se nový slovník
+    sestaví mimo zámek čtenářů a atomicky vymění. Kontrola mtime proběhne
+    nejvýše jednou za ``check_seconds``.
+    """
+
+    def __init__(self, path: Optional[Path] = None, check_seconds: float = CHECK_SECONDS):
+        self.path = Path(path) if path else None
+        self.check_seconds = check_seconds
+        self._map: Optional[Dict[Key, Dict[str, Any]]] = None
+        self._mtime: Optional[float] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _current_path(self) -> Path:
+        return self.path or _default_excel_path()
+
+    def _stat(self, path: Path) -> Optional[float]:
+        try:
+            return path.stat().st_mtime
+        except OSError:
+            return None
+
+    def _reload(self, blocking: bool) -> None:
+        # obnovu dělá jediné vlákno; ostatní zatím čtou původní mapu
+        if not self._lock.acquire(blocking=blocking):
+            return
+        try:
+            path = self._current_path()
+            mtime = self._stat(path)
+            if self._map is not None and mtime == self._mtime:
+                return
+            try:
+                mapping = load_tdd_map(path)
+            except Exception as exc:
+                logger.warning("Nepodařilo se načíst mapování sazeb z %s: %s", path, exc)
+                if self._map is None:
+                    self._map = {}
+                return
+            if self._map is not None:
+                logger.info("Mapování sazeb %s znovu načteno (%d položek).", path, len(mapping))
+            self._map, self._mtime = mapping, mtime
+        finally:
+            self._checked = time.monotonic()
+            self._lock.release()
+
+    def mapping(self) -> Dict[Key, Dict[str, Any]]:
+        if self._map is None:
+            self._reload(blocking=True)
+        elif time.monotonic() - self._checked >= self.check_seconds:
+            self._checked = time.monotonic()
+            if self._stat(self._current_path()) != self._mtime:
+                self._reload(blocking=False)
+        return self._map or {}
+
+    def resolve(self, sazba: str, distributor: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        mapping = self.mapping()
+        key = normalize_sazba(sazba)
+        if distributor:
+            hit = mapping.get((key, _norm(distributor)))
+            if hit is not None:
+                return hit
+        return mapping.get((key, None))
+
+    def tdd_for(self, sazba: str, distributor: Optional[str] = None, default: Optional[str] = None) -> Optional[str]:
+        hit = self.resolve(sazba, distributor)
+        return hit["tdd"] if hit else default
+
+
+_TDD_MAP = TariffMap()
+
+
+def get_tariff_map() -> TariffMap:
+    return _TDD_MAP
 
 
 def resolve_tdd(sazba: str, distributor: Optional[str] = None) -> Optional[Dict[str, Any]]:
     """Vrátí dict s klíči: sazba, tdd, distributor, raw; nebo None."""
-    _ensure_loaded()
-    if not _TDD_MAP:
-        return None
-    key_exact = (_norm(sazba), _norm(distributor) if distributor else None)
-    if key_exact in _TDD_MAP:
-        return _TDD_MAP[key_exact]
-    key_any = (_norm(sazba), None)
-    return _TDD_MAP.get(key_any)
+    return _TDD_MAP.resolve(sazba, distributor)
+
+
+def tdd_for_sazba(sazba: str, distributor: Optional[str] = None, default: Optional[str] = None) -> Optional[str]:
+    """Třída TDD pro sazbu (tolerantně k zápisu, např. "d 25 d"); jinak ``default``."""
+    return _TDD_MAP.tdd_for(sazba, distributor, default)
+
+
+__all__ = [
+    "TariffMap",
+    "get_tariff_map",
+    "load_tdd_map",
+    "normalize_sazba",
+    "resolve_tdd",
+    "tdd_for_sazba",
+]
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
 import os
+import re
+import threading
+import time
 from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
@@ -12,28 +16,60 @@ DATA_DIRS = [
     PROJECT_ROOT / "rag" / "docs" / "data",
     PROJECT_ROOT / "rag" / "data",
 ]
-PRICE_FILENAME = "tddskutecne_2024_15min.xlsx"
+PRICE_FILENAME_PATTERN = "tddskutecne_{year}_15min.xlsx"
+PRICE_FILENAME_RE = re.compile(r"tddskutecne_(\d{4})_15min\.xlsx$", re.IGNORECASE)
+DEFAULT_PRICE_YEAR = 2024
+YEARS_RESCAN_SECONDS = 60.0
+QUARTERS_PER_YEAR = 366 * 96
+PRICE_FILENAME = PRICE_FILENAME_PATTERN.format(year=DEFAULT_PRICE_YEAR)
+# osa TDD v kostce cen – normalizované třídy OTE
+TDD_CLASSES: Tuple[str, ...] = tuple(f"TDD{i}" for i in range(1, 9))
+TDD_INDEX: Dict[str, int] = {tdd: i for i, tdd in enumerate(TDD_CLASSES)}
 
 
-def _candidate_paths(path_override: Optional[str] = None):
+def _candidate_paths(path_override: Optional[str] = None, year: Optional[int] = None) -> Iterator[Path]:
+    year = year or DEFAULT_PRICE_YEAR
     if path_override:
         yield Path(path_override).expanduser()
     env_path = os.getenv("TDD_PRICES_XLSX")
     if env_path:
-        yield Path(env_path).expanduser()
+        if "{year}" in env_path:
+            yield Path(env_path.format(year=year)).expanduser()
+        elif year == DEFAULT_PRICE_YEAR:
+            yield Path(env_path).expanduser()
     for base in DATA_DIRS:
-        yield base / PRICE_FILENAME
+        yield base / PRICE_FILENAME_PATTERN.format(year=year)
 
 
-def _resolve_price_path(path_override: Optional[str] = None) -> Path:
-    for candidate in _candidate_paths(path_override):
+def _resolve_price_path(path_override: Optional[str] = None, year: Optional[int] = None) -> Path:
+    for candidate in _candidate_paths(path_override, year):
         if candidate.exists():
             return candidate
     raise FileNotFoundError(
-        f"Soubor s TDD cenami ({PRICE_FILENAME}) nebyl nalezen v žádném z očekávaných umístění."
+        f"Soubor s TDD cenami ({PRICE_FILENAME_PATTERN.format(year=year or DEFAULT_PRICE_YEAR)}) "
+        "nebyl nalezen v žádném z očekávaných umístění."
     )
 
 
+def available_years() -> List[int]:
+    """Roky, pro které existuje sešit s 15min cenami (bez jeho načítání)."""
+    years = set()
+    env_path = os.getenv("TDD_PRICES_XLSX")
+    if env_path and "{year}" not in env_path and Path(env_path).expanduser().exists():
+        years.add(DEFAULT_PRICE_YEAR)
+    dirs = list(DATA_DIRS)
+    if env_path and "{year}" in env_path:
+        dirs.append(Path(env_path).expanduser().parent)
+    for base in dirs:
+        if not base.is_dir():
+            continue
+        for path in base.iterdir():
+            match = PRICE_FILENAME_RE.search(path.name)
+            if match:
+                years.add(int(match.group(1)))
+    return sorted(years)
+
+
 def _is_tdd_column(name: str) -> bool:
     return isinstance(name, str) and name.upper().startswith("TDD")
 
@@ -63,53 +99,246 @@ def _prepare_dataframe(path: Path) -> Tuple[pd.DataFrame, list[str]]:
     return df, tdd_cols
 
 
-def _aggregate_prices(frame: pd.DataFrame, tdd_cols: list[str]) -> Dict[str, float]:
-    price_series = frame["spot_price"]
-    buckets: Dict[str, Dict[str, float]] = {}
-    for col in tdd_cols:
-        weights = frame[col]
-        weight_sum = float(weights.sum())
-        if weight_sum <= 0:
-            continue
-        cost_sum = float((weights * price_series).sum())
-        base = _base_tdd(col)
-        bucket = buckets.setdefault(base, {"weight": 0.0, "cost": 0.0})
-        bucket["weight"] += weight_sum
-        bucket["cost"] += cost_sum
-    return {
-        base: bucket["cost"] / bucket["weight"]
-        for base, bucket in buckets.items()
-        if bucket["weight"]
-    }
+def _column_map(tdd_cols: list[str]) -> np.ndarray:
+    """Matice sloupce sešitu × TDD_CLASSES; varianty se stejným základem ("TDD4 ...") se sčítají do jedné třídy."""
+    col_map = np.zeros((len(tdd_cols), len(TDD_CLASSES)))
+    for i, col in enumerate(tdd_cols):
+        j = TDD_INDEX.get(_base_tdd(col))
+        if j is not None:
+            col_map[i, j] = 1.0
+    return col_map
+
+
+def _year_tables(frame: pd.DataFrame, tdd_cols: list[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Dvě tabulky tvaru 13 × len(TDD_CLASSES) (řádek 0 = celý rok, řádky 1–12 = měsíce):
+      - vážené průměrné ceny (Kč/MWh), chybějící kombinace jsou NaN,
+      - podíl měsíce na roční spotřebě podle TDD (řádek 0 = 1).
+    """
+    weights = frame[tdd_cols].to_numpy(dtype="float64")
+    prices = frame["spot_price"].to_numpy(dtype="float64")
+    months = frame["month"].to_numpy()
+    col_map = _column_map(tdd_cols)
+    onehot = np.zeros((len(months), 13))
+    valid = (months >= 1) & (months <= 12)
+    onehot[np.flatnonzero(valid), months[valid]] = 1.0
+    onehot[:, 0] = 1.0
+    weight_sum = onehot.T @ weights @ col_map
+    cost_sum = onehot.T @ (weights * prices[:, None]) @ col_map
+    with np.errstate(invalid="ignore", divide="ignore"):
+        table = np.where(weight_sum > 0, cost_sum / weight_sum, np.nan)
+        shares = np.where(weight_sum[0] > 0, weight_sum / weight_sum[0], 0.0)
+    return table.astype("float32"), shares.astype("float32")
+
+
+def parse_datetimes(values: pd.Series) -> pd.Series:
+    """
+    Časy z exportů a cenových sešitů: ISO (2024-01-03 00:15) i české
+    03.01.2024 00:15. ``dayfirst`` by ISO přečetl jako rok-den-měsíc, proto se
+    formát určí podle většiny vyplněných hodnot; nečitelné = NaT.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    text = values.dropna().astype(str)
+    iso = bool(len(text)) and text.str.match(r"\s*\d{4}-\d{2}-\d{2}").mean() >= 0.5
+    return pd.to_datetime(values, errors="coerce", **({"format": "ISO8601"} if iso else {"dayfirst": True}))
+
+
+def quarter_of_year(times) -> np.ndarray:
+    """Index čtvrthodiny v roce (0 … QUARTERS_PER_YEAR-1) pro pole časů."""
+    t = pd.DatetimeIndex(times)
+    return (t.dayofyear.to_numpy() - 1) * 96 + t.hour.to_numpy() * 4 + t.minute.to_numpy() // 15
+
+
+def interpolate_gaps(series: np.ndarray) -> np.ndarray:
+    """Kopie řady (float64) s NaN doplněnými lineární interpolací; okraje se drží krajních hodnot."""
+    series = np.asarray(series, dtype="float64").copy()
+    missing = np.isnan(series)
+    if missing.all():
+        raise ValueError("Cenová řada neobsahuje žádná data.")
+    if missing.any():
+        idx = np.arange(series.size)
+        series[missing] = np.interp(idx[missing], idx[~missing], series[~missing])
+    return series
+
+
+def _series_tables(frame: pd.DataFrame, tdd_cols: list[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Husté čtvrthodinové řady indexované ``quarter_of_year``:
+      - spotové ceny (Kč/MWh), NaN = chybí,
+      - profil TDD (QUARTERS_PER_YEAR × len(TDD_CLASSES)) normalizovaný na roční součet 1.
+    """
+    times = parse_datetimes(frame["datetime"])
+    ok = times.notna().to_numpy()
+    qh = quarter_of_year(times[ok])
+    series = np.full(QUARTERS_PER_YEAR, np.nan, dtype="float32")
+    series[qh] = frame["spot_price"].to_numpy(dtype="float32")[ok]
+    col_map = _column_map(tdd_cols)
+    weights = frame[tdd_cols].to_numpy(dtype="float64")[ok] @ col_map
+    profile = np.zeros((QUARTERS_PER_YEAR, len(TDD_CLASSES)))
+    np.add.at(profile, qh, weights)
+    totals = profile.sum(axis=0)
+    profile = np.divide(profile, totals, out=np.zeros_like(profile), where=totals > 0)
+    return series, profile.astype("float32")
+
+
+def _price_table(frame: pd.DataFrame, tdd_cols: list[str]) -> np.ndarray:
+    return _year_tables(frame, tdd_cols)[0]
+
+
+def _table_to_dicts(table: np.ndarray) -> Tuple[Dict[str, float], Dict[int, Dict[str, float]]]:
+    def row(values: np.ndarray) -> Dict[str, float]:
+        return {tdd: float(v) for tdd, v in zip(TDD_CLASSES, values) if not np.isnan(v)}
+
+    monthly = {month: row(table[month]) for month in range(1, 13)}
+    return row(table[0]), {m: prices for m, prices in monthly.items() if prices}
+
+
+class TddPriceCube:
+    """
+    Předpočítaná kostka cen rok × měsíc × TDD (float32). Každý rok se načte
+    z Excelu líně při prvním dotazu a pak se už jen indexuje – lookup je O(1).
+    """
+
+    def __init__(self):
+        self._tables: Dict[int, np.ndarray] = {}
+        self._shares: Dict[int, np.ndarray] = {}
+        self._series: Dict[int, np.ndarray] = {}
+        self._profiles: Dict[int, np.ndarray] = {}
+        self._paths: Dict[int, str] = {}
+        self._years: Optional[List[int]] = None
+        self._years_at = 0.0
+        self._lock = threading.Lock()
+
+    def years(self) -> List[int]:
+        # adresáře s daty se prochází nejvýš jednou za YEARS_RESCAN_SECONDS, ne při každém dotazu
+        now = time.monotonic()
+        if self._years is None or now - self._years_at > YEARS_RESCAN_SECONDS:
+            self._years = sorted(set(available_years()) | set(self._tables))
+            self._years_at = now
+        return self._years
+
+    def resolve_year(self, year: Optional[int] = None) -> int:
+        """Požadovaný rok, pokud pro něj jsou data; jinak nejbližší starší (případně nejbližší novější)."""
+        years = self.years()
+        if not years:
+            raise FileNotFoundError(
+                f"Nebyl nalezen žádný sešit s TDD cenami ({PRICE_FILENAME_PATTERN.format(year='RRRR')})."
+            )
+        if year is None:
+            return years[-1]
+        year = int(year)
+        if year in years:
+            return year
+        older = [y for y in years if y < year]
+        return older[-1] if older else years[0]
+
+    def table(self, year: Optional[int] = None) -> np.ndarray:
+        year = self.resolve_year(year)
+        table = self._tables.get(year)
+        if table is None:
+            with self._lock:
+                table = self._tables.get(year)
+                if table is None:
+                    path = _resolve_price_path(year=year)
+                    frame, tdd_cols = _prepare_dataframe(path)
+                    table, shares = _year_tables(frame, tdd_cols)
+                    self._series[year], self._profiles[year] = _series_tables(frame, tdd_cols)
+                    self._shares[year] = shares
+                    self._tables[year] = table
+                    self._paths[year] = str(path)
+        return table
+
+    def path(self, year: Optional[int] = None) -> str:
+        year = self.resolve_year(year)
+        self.table(year)
+        return self._paths[year]
+
+    def spot_series(self, year: Optional[int] = None) -> np.ndarray:
+        """15min spotové ceny (Kč/MWh) indexované čtvrthodinou v roce (viz ``quarter_of_year``), NaN = chybí."""
+        year = self.resolve_year(year)
+        self.table(year)
+        return self._series[year]
+
+    def tdd_profile(self, tdd: str, year: Optional[int] = None) -> Optional[np.ndarray]:
+        """Čtvrthodinový profil spotřeby TDD (součet za rok = 1), zarovnaný se ``spot_series``."""
+        j = TDD_INDEX.get((tdd or "").upper())
+        if j is None:
+            return None
+        year = self.resolve_year(year)
+        self.table(year)
+        return self._profiles[year][:, j]
+
+    def shares(self, year: Optional[int] = None) -> np.ndarray:
+        """Podíly měsíců na roční spotřebě (13 × TDD, řádek 0 = 1)."""
+        year = self.resolve_year(year)
+        self.table(year)
+        return self._shares[year]
+
+    def monthly_profile(self, tdd: str, year: Optional[int] = None) -> Optional[np.ndarray]:
+        """Matice 2 × 12: podíl měsíce na roční spotřebě a cena (Kč/MWh) pro dané TDD."""
+        j = TDD_INDEX.get((tdd or "").upper())
+        if j is None:
+            return None
+        year = self.resolve_year(year)
+        return np.vstack([self.shares(year)[1:, j], self.table(year)[1:, j]])
+
+    def price(self, tdd: str, year: Optional[int] = None, month: Optional[int] = None) -> Optional[float]:
+        """Kč/MWh pro TDD v daném roce (a volitelně měsíci); None, pokud data chybí."""
+        j = TDD_INDEX.get((tdd or "").upper())
+        if j is None:
+            return None
+        value = self.table(year)[month or 0, j]
+        return None if np.isnan(value) else float(value)
+
+
+@lru_cache(maxsize=1)
+def get_price_cube() -> TddPriceCube:
+    return TddPriceCube()
 
 
 @lru_cache(maxsize=4)
-def load_tdd_price_summary(path_override: Optional[str] = None) -> Dict[str, Dict]:
+def load_tdd_price_summary(path_override: Optional[str] = None, year: Optional[int] = None) -> Dict[str, Dict]:
     """
     Vrátí slovník se dvěma úrovněmi agregace:
       - ``year``: vážené průměrné ceny (Kč/MWh) pro každé TDD za celý rok
       - ``monthly``: totéž po jednotlivých měsících (1–12)
     """
-    path = _resolve_price_path(path_override)
-    frame, tdd_cols = _prepare_dataframe(path)
-    yearly = _aggregate_prices(frame, tdd_cols)
-    monthly = {
-        int(month): _aggregate_prices(group, tdd_cols)
-        for month, group in frame.groupby("month")
-    }
-    return {"path": str(path), "year": yearly, "monthly": monthly}
+    if path_override:
+        path = _resolve_price_path(path_override, year)
+        table = _price_table(*_prepare_dataframe(path))
+        resolved = year
+    else:
+        cube = get_price_cube()
+        resolved = cube.resolve_year(year)
+        table = cube.table(resolved)
+        path = cube.path(resolved)
+    yearly, monthly = _table_to_dicts(table)
+    return {"path": str(path), "price_year": resolved, "year": yearly, "monthly": monthly}
 
 
-def get_yearly_tdd_prices(path_override: Optional[str] = None) -> Dict[str, float]:
+def get_yearly_tdd_prices(path_override: Optional[str] = None, year: Optional[int] = None) -> Dict[str, float]:
     """Snadno dostupná mapovací funkce (TDD -> Kč/MWh)."""
-    summary = load_tdd_price_summary(path_override)
+    summary = load_tdd_price_summary(path_override, year)
     return dict(summary.get("year", {}))
 
 
-def get_monthly_tdd_prices(path_override: Optional[str] = None) -> Dict[int, Dict[str, float]]:
+def get_monthly_tdd_prices(path_override: Optional[str] = None, year: Optional[int] = None) -> Dict[int, Dict[str, float]]:
     """Vrací přehled cen pro jednotlivé měsíce (1–12)."""
-    summary = load_tdd_price_summary(path_override)
+    summary = load_tdd_price_summary(path_override, year)
     return dict(summary.get("monthly", {}))
 
 
-__all__ = ["get_yearly_tdd_prices", "get_monthly_tdd_prices", "load_tdd_price_summary"]
+__all__ = [
+    "get_yearly_tdd_prices",
+    "get_monthly_tdd_prices",
+    "load_tdd_price_summary",
+    "get_price_cube",
+    "available_years",
+    "TddPriceCube",
+    "TDD_CLASSES",
+    "QUARTERS_PER_YEAR",
+    "quarter_of_year",
+    "interpolate_gaps",
+    "parse_datetimes",
+]
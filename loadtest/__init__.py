@@ -0,0 +1 @@
+# Zátěžové testy local_serveru s lokálními náhradami externích API.
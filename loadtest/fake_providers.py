@@ -0,0 +1,224 @@
+"""
+Lokální náhrady placených API pro zátěžové testy: Bedrock runtime (Titan
+embeddings/text, Anthropic), Polly, OpenAI chat/embeddings a HeyGen streaming.
+Latence a chybovost se nastavují globálně i po providerech.
+
+    python -m loadtest.fake_providers --port 9100 --latency-ms 300 --throttle-rate 0.05
+
+local_server se na ně přesměruje proměnnými (viz ``provider_env``).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+from typing import Dict
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+PROVIDERS = ("bedrock", "openai", "polly", "heygen")
+EMBED_DIM = 1024
+
+CONFIG: Dict[str, Dict[str, float]] = {
+    name: {"latency_ms": 200.0, "jitter_ms": 50.0, "error_rate": 0.0, "throttle_rate": 0.0} for name in PROVIDERS
+}
+STATS: Dict[str, Dict[str, int]] = {name: {"requests": 0, "errors": 0, "throttled": 0} for name in PROVIDERS}
+
+app = FastAPI()
+
+
+def provider_env(base_url: str) -> Dict[str, str]:
+    """Proměnné prostředí, které nasměrují boto3, OpenAI SDK a HeyGen klienta na fake server."""
+    return {
+        "AWS_ENDPOINT_URL_BEDROCK_RUNTIME": base_url,
+        "AWS_ENDPOINT_URL_POLLY": base_url,
+        "AWS_ACCESS_KEY_ID": "loadtest",
+        "AWS_SECRET_ACCESS_KEY": "loadtest",
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "OPENAI_API_KEY": "loadtest",
+        "HEYGEN_API_BASE": base_url,
+        "HEYGEN_API_KEY": "loadtest",
+    }
+
+
+def fake_embedding(text: str, dim: int = EMBED_DIM) -> np.ndarray:
+    """Deterministický jednotkový vektor z hashe textu (stejný text = stejný vektor)."""
+    seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+    v = np.random.default_rng(seed).standard_normal(dim).astype("float32")
+    return v / np.linalg.norm(v)
+
+
+async def _simulate(provider: str):
+    """Počká nastavenou latenci; vrátí chybovou odpověď, pokud má požadavek selhat."""
+    cfg = CONFIG[provider]
+    stats = STATS[provider]
+    stats["requests"] += 1
+    delay = max(0.0, random.gauss(cfg["latency_ms"], cfg["jitter_ms"])) / 1000.0
+    await asyncio.sleep(delay)
+    roll = random.random()
+    if roll < cfg["throttle_rate"]:
+        stats["throttled"] += 1
+        if provider in ("bedrock", "polly"):
+            return JSONResponse(
+                {"message": "Rate exceeded"}, status_code=429, headers={"x-amzn-ErrorType": "ThrottlingException"}
+            )
+        return JSONResponse({"error": {"message": "Rate limit reached", "type": "rate_limit_error"}}, status_code=429)
+    if roll < cfg["throttle_rate"] + cfg["error_rate"]:
+        stats["errors"] += 1
+        if provider in ("bedrock", "polly"):
+            return JSONResponse(
+                {"message": "Internal error"}, status_code=500, headers={"x-amzn-ErrorType": "InternalServerException"}
+            )
+        return JSONResponse({"error": {"message": "Internal error", "type": "server_error"}}, status_code=500)
+    return None
+
+
+def _answer(prompt: str) -> str:
+    return f"Testovací odpověď ({len(prompt)} znaků promptu)."
+
+
+@app.post("/model/{model_id}/invoke")
+async def bedrock_invoke(model_id: str, request: Request):
+    failed = await _simulate("bedrock")
+    if failed:
+        return failed
+    body = json.loads(await request.body() or b"{}")
+    if "embed" in model_id:
+        dim = int(body.get("dimensions") or EMBED_DIM)
+        text = body.get("inputText", "")
+        return {"embedding": fake_embedding(text, dim).tolist(), "inputTextTokenCount": len(text.split())}
+    if model_id.startswith("anthropic."):
+        text = json.dumps(body.get("messages", []), ensure_ascii=False)
+        return {"content": [{"type": "text", "text": _answer(text)}], "stop_reason": "end_turn"}
+    return {"results": [{"outputText": _answer(body.get("inputText", "")), "completionReason": "FINISH"}]}
+
+
+@app.post("/v1/speech")
+async def polly_speech(request: Request):
+    failed = await _simulate("polly")
+    if failed:
+        return failed
+    body = json.loads(await request.body() or b"{}")
+    text = body.get("Text", "")
+    audio = b"ID3" + hashlib.sha1(text.encode("utf-8")).digest() * 64
+    return Response(audio, media_type="audio/mpeg", headers={"x-amzn-RequestCharacters": str(len(text))})
+
+
+@app.post("/v1/chat/completions")
+async def openai_chat(request: Request):
+    failed = await _simulate("openai")
+    if failed:
+        return failed
+    body = await request.json()
+    prompt = " ".join(str(m.get("content", "")) for m in body.get("messages", []))
+    return {
+        "id": "chatcmpl-loadtest",
+        "object": "chat.completion",
+        "created": 0,
+        "model": body.get("model", "loadtest"),
+        "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": _answer(prompt)}, "finish_reason": "stop"}
+        ],
+        "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 10, "total_tokens": len(prompt) // 4 + 10},
+    }
+
+
+@app.post("/v1/embeddings")
+async def openai_embeddings(request: Request):
+    failed = await _simulate("openai")
+    if failed:
+        return failed
+    body = await request.json()
+    inputs = body.get("input")
+    inputs = [inputs] if isinstance(inputs, str) else list(inputs or [])
+    dim = int(body.get("dimensions") or 1536)
+    return {
+        "object": "list",
+        "data": [
+            {"object": "embedding", "index": i, "embedding": fake_embedding(t, dim).tolist()}
+            for i, t in enumerate(inputs)
+        ],
+        "model": body.get("model", "loadtest"),
+        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+    }
+
+
+@app.get("/v2/avatars")
+async def heygen_avatars():
+    failed = await _simulate("heygen")
+    if failed:
+        return failed
+    avatars = [
+        {"avatar_id": f"loadtest_{i}", "avatar_name": f"Avatar {i}", "avatar_type": "streaming"} for i in range(5)
+    ]
+    return {"error": None, "data": {"avatars": avatars}}
+
+
+@app.post("/v1/streaming.{action}")
+async def heygen_streaming(action: str, request: Request):
+    failed = await _simulate("heygen")
+    if failed:
+        return failed
+    payload = json.loads(await request.body() or b"{}")
+    session_id = payload.get("session_id") or f"sess-{random.getrandbits(32):08x}"
+    data = {"session_id": session_id}
+    if action == "new":
+        data.update({"sdp": {"type": "offer", "sdp": "v=0"}, "ice_servers2": []})
+    return {"code": 100, "message": "success", "data": data}
+
+
+@app.get("/_stats")
+async def stats():
+    return {"config": CONFIG, "stats": STATS}
+
+
+def _apply(spec: str, field: str):
+    """``bedrock=300,openai=800`` -> nastaví pole jen u uvedených providerů."""
+    for item in filter(None, (s.strip() for s in (spec or "").split(","))):
+        name, _, value = item.partition("=")
+        if name not in CONFIG:
+            raise SystemExit(f"Neznámý provider {name!r}, povolené: {', '.join(PROVIDERS)}")
+        CONFIG[name][field] = float(value)
+
+
+def configure(latency_ms=200.0, jitter_ms=50.0, error_rate=0.0, throttle_rate=0.0, overrides=None):
+    for cfg in CONFIG.values():
+        cfg.update(latency_ms=latency_ms, jitter_ms=jitter_ms, error_rate=error_rate, throttle_rate=throttle_rate)
+    for field, spec in (overrides or {}).items():
+        _apply(spec, field)
+
+
+def main(argv=None):
+    import uvicorn
+
+    ap = argparse.ArgumentParser(description="Fake Bedrock/OpenAI/Polly/HeyGen pro zátěžové testy")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9100)
+    ap.add_argument("--latency-ms", type=float, default=200.0)
+    ap.add_argument("--jitter-ms", type=float, default=50.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--throttle-rate", type=float, default=0.0)
+    ap.add_argument("--provider-latency", default="", help="např. bedrock=300,openai=800")
+    ap.add_argument("--provider-error-rate", default="")
+    ap.add_argument("--provider-throttle-rate", default="")
+    a = ap.parse_args(argv)
+    configure(
+        a.latency_ms,
+        a.jitter_ms,
+        a.error_rate,
+        a.throttle_rate,
+        {
+            "latency_ms": a.provider_latency,
+            "error_rate": a.provider_error_rate,
+            "throttle_rate": a.provider_throttle_rate,
+        },
+    )
+    uvicorn.run(app, host=a.host, port=a.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
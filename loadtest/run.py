@@ -0,0 +1,332 @@
+"""
+Zátěžový test local_serveru: ``--concurrency`` vláken posílá po dobu
+``--duration`` s požadavky podle mixu rout a měří propustnost, p50/p95/p99
+a chybovost po routách. Výsledek jde uložit jako JSON (s commitem a konfigurací)
+a porovnat s jiným během přes ``--compare``.
+
+    # vše lokálně: fake provideři + server s --workers 2
+    python -m loadtest.run --spawn --workers 2 --concurrency 32 --duration 30 --out results/HEAD.json
+    # proti běžícímu serveru
+    python -m loadtest.run --url http://127.0.0.1:8000 --mix chat=2,calculate=5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+
+from loadtest.fake_providers import fake_embedding, provider_env
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+QUESTIONS = (
+    "Kolik ušetřím při přechodu na spotový tarif se sazbou D25d a spotřebou 40 MWh?",
+    "Jaký je rozdíl mezi fixním a spotovým tarifem?",
+    "Co je to TDD a jak se počítá?",
+    "Jak se změní cena elektřiny příští rok?",
+    "Mám sazbu D57d, kolik zaplatím za 120 MWh?",
+    "Jak funguje distribuční sazba pro firmy?",
+)
+SAZBY = ("D01d", "D25d", "D35d", "D45d", "D57d", "D61d")
+
+Call = Tuple[str, str, Optional[dict]]
+
+
+def _chat(rng: random.Random) -> Call:
+    return "POST", "/chat", {"q": rng.choice(QUESTIONS)}
+
+
+def _ai_chat(rng: random.Random) -> Call:
+    return "POST", "/api/ai/chat", {"message": rng.choice(QUESTIONS)}
+
+
+def _calculate(rng: random.Random) -> Call:
+    return "POST", "/api/calculate", {"tddCode": rng.choice(SAZBY), "yearlyConsumption": rng.randint(2, 500) * 1000}
+
+
+def _tts(rng: random.Random) -> Call:
+    return "POST", "/api/tts", {"text": rng.choice(QUESTIONS)}
+
+
+def _avatar_list(rng: random.Random) -> Call:
+    return "GET", "/api/avatar/list", None
+
+
+def _avatar_session(rng: random.Random) -> Call:
+    return "GET", "/api/avatar/session", None
+
+
+def _avatar_speak(rng: random.Random) -> Call:
+    return "POST", "/api/avatar/speak", {"sessionId": "sess-loadtest", "text": rng.choice(QUESTIONS)}
+
+
+ROUTES: Dict[str, Callable[[random.Random], Call]] = {
+    "chat": _chat,
+    "ai_chat": _ai_chat,
+    "calculate": _calculate,
+    "tts": _tts,
+    "avatar_list": _avatar_list,
+    "avatar_session": _avatar_session,
+    "avatar_speak": _avatar_speak,
+}
+DEFAULT_MIX = "chat=3,ai_chat=3,calculate=5,tts=1,avatar_list=1,avatar_session=1,avatar_speak=1"
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix: Dict[str, float] = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        name, _, weight = item.partition("=")
+        if name not in ROUTES:
+            raise SystemExit(f"Neznámá routa {name!r}, povolené: {', '.join(ROUTES)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def run_load(
+    url: str,
+    mix: Dict[str, float],
+    concurrency: int = 16,
+    duration: float = 30.0,
+    warmup: float = 3.0,
+    timeout: float = 30.0,
+    seed: int = 1,
+) -> Dict[str, object]:
+    """Uzavřená smyčka: každé vlákno posílá další požadavek hned po odpovědi předchozího."""
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    samples: Dict[str, List[float]] = {n: [] for n in names}
+    errors: Dict[str, Dict[str, int]] = {n: {} for n in names}
+    lock = threading.Lock()
+    started = time.monotonic()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    def worker(idx: int):
+        rng = random.Random(seed * 1000 + idx)
+        session = requests.Session()
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                return
+            name = rng.choices(names, weights)[0]
+            method, path, payload = ROUTES[name](rng)
+            t0 = time.perf_counter()
+            try:
+                resp = session.request(method, url + path, json=payload, timeout=timeout)
+                resp.content
+                error = None if resp.ok else str(resp.status_code)
+            except requests.RequestException as exc:
+                error = type(exc).__name__
+            elapsed = time.perf_counter() - t0
+            if now < measure_from:
+                continue
+            with lock:
+                samples[name].append(elapsed)
+                if error:
+                    errors[name][error] = errors[name].get(error, 0) + 1
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(samples, errors, duration)
+
+
+def summarize(samples: Dict[str, List[float]], errors: Dict[str, Dict[str, int]], duration: float) -> Dict[str, object]:
+    routes: Dict[str, object] = {}
+    everything: List[float] = []
+    total_errors = 0
+    for name, lat in samples.items():
+        everything.extend(lat)
+        n_err = sum(errors[name].values())
+        total_errors += n_err
+        routes[name] = _stats(lat, n_err, duration, errors[name])
+    return {"routes": routes, "total": _stats(everything, total_errors, duration, {})}
+
+
+def _stats(latencies: List[float], n_errors: int, duration: float, error_kinds: Dict[str, int]) -> Dict[str, object]:
+    n = len(latencies)
+    if not n:
+        return {"requests": 0, "rps": 0.0, "error_rate": 0.0}
+    ms = np.asarray(latencies) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    out = {
+        "requests": n,
+        "rps": round(n / duration, 2),
+        "p50_ms": round(float(p50), 1),
+        "p95_ms": round(float(p95), 1),
+        "p99_ms": round(float(p99), 1),
+        "mean_ms": round(float(ms.mean()), 1),
+        "error_rate": round(n_errors / n, 4),
+    }
+    if error_kinds:
+        out["errors"] = dict(error_kinds)
+    return out
+
+
+def print_report(result: Dict[str, object], baseline: Optional[Dict[str, object]] = None):
+    cols = ("requests", "rps", "p50_ms", "p95_ms", "p99_ms", "error_rate")
+    print(f"{'route':<16}" + "".join(f"{c:>12}" for c in cols))
+    base_routes = (baseline or {}).get("routes", {})
+    rows = list(result["routes"].items()) + [("TOTAL", result["total"])]
+    for name, st in rows:
+        print(f"{name:<16}" + "".join(f"{st.get(c, '-'):>12}" for c in cols))
+        base = (baseline or {}).get("total") if name == "TOTAL" else base_routes.get(name)
+        if base and base.get("requests"):
+            deltas = []
+            for c in cols[1:]:
+                old, new = base.get(c), st.get(c)
+                if isinstance(old, (int, float)) and isinstance(new, (int, float)) and old:
+                    deltas.append(f"{(new - old) / old * 100:+.0f}%")
+                else:
+                    deltas.append("-")
+            print(f"{'  vs baseline':<16}{'':>12}" + "".join(f"{d:>12}" for d in deltas))
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=10
+        )
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD"], cwd=PROJECT_ROOT, timeout=30).returncode != 0
+        return out.stdout.strip() + ("-dirty" if dirty else "") if out.returncode == 0 else None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _build_fake_index(root: Path, bucket: str, prefix: str, n_chunks: int = 500):
+    """Malý index se stejnými (hashovými) embeddingy, jaké vrací fake Bedrock."""
+    rng = random.Random(0)
+    words = "spot fix tarif sazba distribuce TDD elektřina cena MWh úspora firma smlouva odběr".split()
+    chunks = [" ".join(rng.choice(words) for _ in range(60)) for _ in range(n_chunks)]
+    vectors = np.stack([fake_embedding(c) for c in chunks])
+    dest = root / bucket / prefix / "index.npz"
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(dest, vectors=vectors, chunks=np.array(chunks))
+
+
+def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"Proces skončil s kódem {proc.returncode} dřív, než začal odpovídat ({url}).")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise SystemExit(f"{url} neodpovídá ani po {timeout:.0f} s.")
+
+
+def spawn_stack(args, workdir: Path) -> Tuple[str, List[subprocess.Popen], Dict[str, object]]:
+    """Spustí fake providery a local_server proti nim; vrací URL serveru, procesy a popis prostředí."""
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    fake_cmd = [
+        sys.executable, "-m", "loadtest.fake_providers", "--port", str(args.fake_port),
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        "--error-rate", str(args.error_rate), "--throttle-rate", str(args.throttle_rate),
+        "--provider-latency", args.provider_latency,
+    ]
+    _build_fake_index(workdir / "s3", "loadtest", "index")
+    env = {
+        **os.environ,
+        **provider_env(fake_url),
+        "RAG_S3_LOCAL_ROOT": str(workdir / "s3"),
+        "RAG_BUCKET": "loadtest",
+        "RAG_PREFIX": "index/",
+        "RAG_REFRESH_SECONDS": "0",
+        "PYTHONPATH": str(PROJECT_ROOT),
+    }
+    log = open(workdir / "server.log", "wb")
+    procs = [subprocess.Popen(fake_cmd, cwd=PROJECT_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)]
+    _wait_ready(f"{fake_url}/_stats", procs[0])
+    server_cmd = [sys.executable, "local_server.py", "--port", str(args.port), "--workers", str(args.workers)]
+    procs.append(subprocess.Popen(server_cmd, cwd=PROJECT_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT))
+    url = f"http://127.0.0.1:{args.port}"
+    _wait_ready(f"{url}/api/contacts", procs[1])
+    described = {
+        "workers": args.workers,
+        "fake_latency_ms": args.latency_ms,
+        "fake_jitter_ms": args.jitter_ms,
+        "fake_error_rate": args.error_rate,
+        "fake_throttle_rate": args.throttle_rate,
+        "fake_provider_latency": args.provider_latency,
+    }
+    return url, procs, described
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Zátěžový test local_serveru")
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--mix", default=DEFAULT_MIX)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=30.0)
+    ap.add_argument("--warmup", type=float, default=3.0)
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", help="uložit výsledek jako JSON")
+    ap.add_argument("--compare", help="JSON předchozího běhu pro porovnání")
+    ap.add_argument("--spawn", action="store_true", help="spustit fake providery a local_server lokálně")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--fake-port", type=int, default=9100)
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--latency-ms", type=float, default=200.0)
+    ap.add_argument("--jitter-ms", type=float, default=50.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--throttle-rate", type=float, default=0.0)
+    ap.add_argument("--provider-latency", default="")
+    a = ap.parse_args(argv)
+
+    mix = parse_mix(a.mix)
+    procs: List[subprocess.Popen] = []
+    environment: Dict[str, object] = {"spawned": a.spawn}
+    url = a.url.rstrip("/")
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as tmp:
+        try:
+            if a.spawn:
+                url, procs, described = spawn_stack(a, Path(tmp))
+                environment.update(described)
+            result = run_load(url, mix, a.concurrency, a.duration, a.warmup, a.timeout, a.seed)
+        finally:
+            for proc in reversed(procs):
+                proc.terminate()
+            for proc in procs:
+                try:
+                    proc.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+    result["meta"] = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "url": url,
+        "mix": mix,
+        "concurrency": a.concurrency,
+        "duration": a.duration,
+        "warmup": a.warmup,
+        "seed": a.seed,
+        "environment": environment,
+    }
+    baseline = json.loads(Path(a.compare).read_text()) if a.compare else None
+    if baseline:
+        print(f"baseline: {baseline.get('meta', {}).get('commit')}  current: {result['meta']['commit']}")
+    print_report(result, baseline)
+    if a.out:
+        Path(a.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(a.out).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
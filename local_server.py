@@ -1,18 +1,44 @@
 
 import os
 import re
-import json
+import argparse
+import hashlib
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List
 
 import requests
-from fastapi import Body, FastAPI, HTTPException, Request, UploadFile, File
+from fastapi import Body, FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
-from api.chat_handler import lambda_handler, compute_tariff_stats
-from api.tts import synthesize
+import api.chat_handler as chat_handler
+from api.chat_handler import (
+    answer_query,
+    compute_tariff_stats,
+    FIX_MARKUP,
+    flight_metrics,
+    index_memory,
+    offer_metrics,
+    preload,
+    READINESS,
+    session_metrics,
+    warm_up,
+)
+from api.tts import polly_client, synthesize
+from backend.services.meter_data import compute_meter_cost
+from backend.services.admission import limiter_metrics
+from backend.services.compression import CompressionMiddleware
+from backend.services.invoice_jobs import InvoiceJobs, SUPPORTED_SUFFIXES
+from backend.services.json_codec import dumps as json_dumps
+from backend.services.load_shift import optimize_load_shift
+from backend.services.prefork import memory_report, serve_prefork
+from backend.services.price_series import get_series, series_cache_info
+from backend.services.risk import fixed_vs_spot_risk
 
 PROJECT_ROOT = Path(__file__).resolve().parent
 STATIC_DIR = PROJECT_ROOT
@@ -21,6 +47,8 @@ FRONTEND_DIST = FRONTEND_ROOT / "EnergySageAI" / "dist" / "public"
 UPLOAD_DIR = PROJECT_ROOT / "uploads"
 WEB_DIR = PROJECT_ROOT / "web"
 UPLOAD_DIR.mkdir(exist_ok=True)
+INVOICES = InvoiceJobs(UPLOAD_DIR / ".jobs")
+INVOICE_POLL_SECONDS = float(os.getenv("INVOICE_POLL_SECONDS", "0.25"))
 WEB_DIR.mkdir(exist_ok=True)
 FRONTEND_ROOT.mkdir(exist_ok=True)
 FRONTEND_SERVE_DIR = FRONTEND_DIST if FRONTEND_DIST.exists() else FRONTEND_ROOT
@@ -28,12 +56,32 @@ FRONTEND_SERVE_DIR = FRONTEND_DIST if FRONTEND_DIST.exists() else FRONTEND_ROOT
 HEYGEN_API_KEY = os.getenv("HEYGEN_API_KEY")
 HEYGEN_AVATAR_ID = os.getenv("HEYGEN_AVATAR_ID", "Anna_public_3_20240108")
 HEYGEN_VOICE_ID = os.getenv("HEYGEN_VOICE_ID", "1bd001e7e50f421d891986aad5158bc8")
+HEYGEN_API_BASE = os.getenv("HEYGEN_API_BASE", "https://api.heygen.com").rstrip("/")
+# zahřátí při startu: background (server hned přijímá, /ready vrací 503 do zahřátí), sync, nebo off
+WARMUP_MODE = os.getenv("WARMUP_MODE", "background")
 
 CHAT_MESSAGES: List[Dict] = []
 CONTACTS: List[Dict] = []
 
-app = FastAPI()
+class FastJSONResponse(JSONResponse):
+    """JSON odpověď přes orjson (numpy pole a skaláry serializuje přímo), bez orjson standardní json."""
+
+    def render(self, content) -> bytes:
+        return json_dumps(content)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # v pre-fork režimu zahřál už master (preload) a worker jen zdědí stav
+    if WARMUP_MODE != "off":
+        warm_up(background=WARMUP_MODE != "sync", extra_steps=[("polly", polly_client)])
+    yield
+    INVOICES.shutdown()
+
+
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
 
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESS_MIN_BYTES", "1024")))
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -46,6 +94,30 @@ app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 app.mount("/web", StaticFiles(directory=WEB_DIR, html=True), name="web")
 
 
+def _monthly_results(monthly: Dict | None) -> List[Dict] | None:
+    """Sloupcový měsíční rozpad z compute_tariff_stats -> MonthlyResult[] frontendu (kWh, Kč/kWh)."""
+    if not monthly:
+        return None
+    return [
+        {
+            "month": month,
+            "monthName": name,
+            "averagePricePerKWh": round(spot_price / 1000.0, 4),
+            "consumption": round(consumption * 1000.0),
+            "totalCost": round(spot_cost),
+            "fixedCost": round(fix_cost),
+        }
+        for month, name, consumption, spot_price, spot_cost, fix_cost in zip(
+            monthly["month"],
+            monthly["month_name"],
+            monthly["consumption_mwh"],
+            monthly["spot_price_per_mwh"],
+            monthly["spot_cost"],
+            monthly["fix_cost"],
+        )
+    ]
+
+
 def _chart_to_calculation(chart: Dict | None):
     if not chart or not isinstance(chart, dict):
         return None
@@ -70,6 +142,7 @@ def _chart_to_calculation(chart: Dict | None):
             "yearlyConsumption": int(consumption * 1000),
             "year": meta.get("year", datetime.now().year),
         },
+        "monthlyBreakdown": _monthly_results(chart.get("monthly")),
     }
     comparison = {
         "fixedPrice": round(fix_total / denom, 4),
@@ -115,21 +188,67 @@ def _heygen_request(method: str, url: str, payload: Dict | None = None):
 
 
 @app.post("/chat")
-async def chat(req: Request):
-    body = await req.json()
-    event = {"body": json.dumps(body)}
-    resp = lambda_handler(event, None)
-    return json.loads(resp["body"])
+def chat(payload: dict = Body(...)):
+    _, data = answer_query(payload)
+    return data
 
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    data = await file.read()
-    dest = UPLOAD_DIR / file.filename
-    with dest.open("wb") as fh:
-        fh.write(data)
+def upload_file(file: UploadFile = File(...)):
+    # jen uložení a založení jobu; parsování faktury běží v poolu procesů
+    name = Path(file.filename or "upload").name
+    if not name.strip("."):
+        raise HTTPException(status_code=400, detail="Neplatný název souboru")
+    # soubor se ukládá pod otiskem obsahu – stejné jméno jiného nahrání nepřepíše soubor čekajícího jobu
+    suffix = Path(name).suffix.lower() if re.fullmatch(r"\.[a-z0-9]{1,10}", Path(name).suffix.lower()) else ""
+    sha1 = hashlib.sha1()
+    tmp = UPLOAD_DIR / f".upload-{uuid.uuid4().hex}.tmp"
+    try:
+        with tmp.open("wb") as fh:
+            for block in iter(lambda: file.file.read(1 << 20), b""):
+                sha1.update(block)
+                fh.write(block)
+        dest = UPLOAD_DIR / f"{sha1.hexdigest()}{suffix}"
+        os.replace(tmp, dest)
+    finally:
+        tmp.unlink(missing_ok=True)
     rel_path = dest.relative_to(PROJECT_ROOT)
-    return {"saved_as": str(rel_path), "url": f"/static/{rel_path.as_posix()}"}
+    job = INVOICES.submit(dest, name, sha1.hexdigest()) if suffix in SUPPORTED_SUFFIXES else None
+    return {
+        "saved_as": str(rel_path),
+        "url": f"/static/{rel_path.as_posix()}",
+        "jobId": job["id"] if job else None,
+        "status": job["status"] if job else None,
+    }
+
+
+@app.get("/api/invoices/{job_id}")
+def invoice_job(job_id: str):
+    """Stav zpracování nahrané faktury (queued / done / failed) a po dokončení výsledek výpočtu."""
+    job = INVOICES.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Neznámý job")
+    return {"success": True, "data": job}
+
+
+@app.get("/api/invoices/{job_id}/events")
+async def invoice_job_events(job_id: str):
+    """SSE: posílá stav jobu při každé změně, po done/failed stream skončí."""
+    if INVOICES.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Neznámý job")
+
+    async def events():
+        last = None
+        while True:
+            job = INVOICES.get(job_id)
+            if job["status"] != last:
+                last = job["status"]
+                yield f"event: {last}\ndata: {json_dumps(job).decode('utf-8')}\n\n"
+            if last in ("done", "failed"):
+                return
+            await asyncio.sleep(INVOICE_POLL_SECONDS)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 @app.post("/speak")
@@ -141,13 +260,11 @@ async def speak(payload: dict = Body(...)):
 
 
 @app.post("/api/ai/chat")
-async def api_ai_chat(payload: dict = Body(...)):
+def api_ai_chat(payload: dict = Body(...)):
     message = (payload or {}).get("message", "").strip()
     if not message:
         raise HTTPException(status_code=400, detail="message is required")
-    event = {"body": json.dumps({"q": message})}
-    resp = lambda_handler(event, None)
-    body = json.loads(resp["body"])
+    _, body = answer_query({"q": message, "sessionId": (payload or {}).get("sessionId")})
     chart = body.get("chart")
     data = {
         "response": body.get("answer", ""),
@@ -198,7 +315,7 @@ def calculate_spot(payload: dict = Body(...)):
     yearly = float(payload.get("yearlyConsumption") or 0)
     year = int(payload.get("year") or datetime.now().year)
     fixed_price = payload.get("fixedPrice")
-    stats = compute_tariff_stats(tdd, yearly / 1000.0, fixed_price)
+    stats = compute_tariff_stats(tdd, yearly / 1000.0, fixed_price, year)
     denom = stats["consumption_mwh"] * 1000.0 or 1
     result = {
         "averagePricePerKWh": round(stats["spot_price_per_mwh"] / 1000.0, 4),
@@ -207,7 +324,9 @@ def calculate_spot(payload: dict = Body(...)):
             "tddCode": stats["sazba"],
             "yearlyConsumption": int(yearly or stats["consumption_mwh"] * 1000),
             "year": year,
+            "priceYear": stats["price_year"],
         },
+        "monthlyBreakdown": _monthly_results(stats["monthly"]),
     }
     comparison = {
         "fixedPrice": round(stats["fix_price_per_mwh"] / 1000.0, 4),
@@ -218,6 +337,121 @@ def calculate_spot(payload: dict = Body(...)):
     return {"success": True, "data": {"result": result, "comparison": comparison}}
 
 
+@app.post("/api/calculate/risk")
+def calculate_risk(payload: dict = Body(...)):
+    tdd = payload.get("tddCode") or payload.get("sazba") or "D25D"
+    yearly = float(payload.get("yearlyConsumption") or 0)
+    year = payload.get("year")
+    stats = compute_tariff_stats(tdd, yearly / 1000.0, payload.get("fixedPrice"), int(year) if year else None)
+    try:
+        risk = fixed_vs_spot_risk(
+            stats["tdd"],
+            stats["consumption_mwh"],
+            stats["fix_price_per_mwh"],
+            year=stats["price_year"],
+            n_scenarios=payload.get("scenarios", 10_000),
+            block_days=payload.get("blockDays", 7),
+            seed=payload.get("seed", 42),
+            confidence=float(payload.get("confidence") or 0.95),
+        )
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"success": True, "data": {**risk, "sazba": stats["sazba"]}}
+
+
+@app.post("/api/calculate/shift")
+def calculate_shift(payload: dict = Body(...)):
+    tdd = payload.get("tddCode") or payload.get("sazba") or "D25D"
+    yearly = float(payload.get("yearlyConsumption") or 0)
+    year = payload.get("year")
+    stats = compute_tariff_stats(tdd, yearly / 1000.0, None, int(year) if year else None)
+    share, window, max_power = (payload.get(k) for k in ("shiftableShare", "windowHours", "maxPowerKw"))
+    try:
+        shift = optimize_load_shift(
+            stats["tdd"],
+            stats["consumption_mwh"],
+            0.1 if share is None else float(share),
+            window_hours=24.0 if window is None else float(window),
+            max_power_kw=None if max_power is None else float(max_power),
+            year=stats["price_year"],
+        )
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"success": True, "data": {**shift, "sazba": stats["sazba"]}}
+
+
+@app.get("/api/series/{kind}")
+def series(
+    kind: str,
+    tdd: str | None = None,
+    year: int | None = None,
+    start: str | None = None,
+    end: str | None = None,
+    resolution: str | None = None,
+    width: int | None = None,
+):
+    """Řady pro grafy (spot / profile): agregace hour/day/week/month nebo LTTB na ``width`` bodů."""
+    try:
+        data = get_series(kind, tdd, year, start, end, resolution, width)
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    # numpy pole serializuje rovnou orjson (bez jsonable_encoder); historická data může držet prohlížeč/CDN
+    return FastJSONResponse({"success": True, "data": data}, headers={"Cache-Control": "public, max-age=3600"})
+
+
+@app.post("/api/calculate/meter")
+def calculate_meter(
+    file: UploadFile = File(...),
+    fixedPrice: float | None = Form(None),
+    intervalEnd: bool = Form(False),
+):
+    # sync endpoint -> FastAPI ho pouští v threadpoolu, parsování neblokuje event loop
+    try:
+        stats = compute_meter_cost(
+            file.file,
+            fixed_price_kwh=fixedPrice,
+            fix_markup=FIX_MARKUP,
+            interval_end=intervalEnd,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    consumption_kwh = stats["consumption_mwh"] * 1000.0
+    # vícerocní export přepočteme na roční hodnoty podle délky období
+    period_days = (
+        datetime.fromisoformat(stats["period_end"]) - datetime.fromisoformat(stats["period_start"])
+    ).total_seconds() / 86400.0 + 1 / 96.0
+    per_year = 365.0 / period_days if period_days > 365.0 else 1.0
+    result = {
+        "averagePricePerKWh": round(stats["spot_price_per_mwh"] / 1000.0, 4),
+        "totalCost": round(stats["spot_total"], 2),
+        "totalCostPerYear": round(stats["spot_total"] * per_year, 2),
+        "input": {
+            "fileName": file.filename,
+            "rows": stats["rows"],
+            "periodStart": stats["period_start"],
+            "periodEnd": stats["period_end"],
+            "consumption": round(consumption_kwh, 3),
+            "unmatchedConsumption": round(stats["unmatched_mwh"] * 1000.0, 3),
+        },
+        "years": stats["years"],
+    }
+    comparison = {
+        "fixedPrice": round(stats["fix_price_per_mwh"] / 1000.0, 4),
+        "savingsPerYear": round(stats["savings"] * per_year, 2),
+        "savingsPercentage": round(stats["savings"] / stats["fix_total"] * 100, 2) if stats["fix_total"] else 0,
+        "isSpotCheaper": stats["savings"] > 0,
+    }
+    return {"success": True, "data": {"result": result, "comparison": comparison}}
+
+
 @app.post("/api/tts")
 async def api_tts(payload: dict = Body(...)):
     text = (payload or {}).get("text", "").strip()
@@ -228,7 +462,7 @@ async def api_tts(payload: dict = Body(...)):
 
 @app.get("/api/avatar/list")
 def avatar_list():
-    data = _heygen_request("GET", "https://api.heygen.com/v2/avatars")
+    data = _heygen_request("GET", f"{HEYGEN_API_BASE}/v2/avatars")
     avatars = data.get("data", {}).get("avatars", [])
     streaming = [a for a in avatars if a.get("is_streaming") or a.get("avatar_type") == "streaming" or a.get("preview_video_url")]
     return {"success": True, "data": {"total": len(avatars), "streaming_count": len(streaming), "all": avatars[:20], "streaming": streaming[:20]}}
@@ -241,7 +475,7 @@ def avatar_session():
         "avatar_name": HEYGEN_AVATAR_ID,
         "voice": {"voice_id": HEYGEN_VOICE_ID},
     }
-    data = _heygen_request("POST", "https://api.heygen.com/v1/streaming.new", payload)
+    data = _heygen_request("POST", f"{HEYGEN_API_BASE}/v1/streaming.new", payload)
     return {"success": True, "data": data.get("data", data)}
 
 
@@ -251,7 +485,7 @@ def avatar_start(payload: dict = Body(...)):
         raise HTTPException(status_code=400, detail="sessionId a sdp jsou povinné")
     data = _heygen_request(
         "POST",
-        "https://api.heygen.com/v1/streaming.start",
+        f"{HEYGEN_API_BASE}/v1/streaming.start",
         {"session_id": payload["sessionId"], "sdp": payload["sdp"]},
     )
     return {"success": True, "data": data}
@@ -263,7 +497,7 @@ def avatar_speak(payload: dict = Body(...)):
         raise HTTPException(status_code=400, detail="sessionId a text jsou povinné")
     data = _heygen_request(
         "POST",
-        "https://api.heygen.com/v1/streaming.task",
+        f"{HEYGEN_API_BASE}/v1/streaming.task",
         {
             "session_id": payload["sessionId"],
             "text": payload["text"],
@@ -284,7 +518,7 @@ def avatar_ice(payload: dict = Body(...)):
         raise HTTPException(status_code=400, detail="candidate nebo sdp je povinné")
     data = _heygen_request(
         "POST",
-        "https://api.heygen.com/v1/streaming.ice",
+        f"{HEYGEN_API_BASE}/v1/streaming.ice",
         {k: v for k, v in {"session_id": session_id, "candidate": candidate, "sdp": sdp}.items() if v},
     )
     return {"success": True, "data": data}
@@ -297,11 +531,60 @@ def avatar_stop(payload: dict = Body(...)):
         raise HTTPException(status_code=400, detail="sessionId je povinný")
     data = _heygen_request(
         "POST",
-        "https://api.heygen.com/v1/streaming.stop",
+        f"{HEYGEN_API_BASE}/v1/streaming.stop",
         {"session_id": session_id},
     )
     return {"success": True, "data": data}
 
 
+@app.get("/ready")
+def ready():
+    """Readiness pro load balancer: 200 až po zahřátí (index, ceny, klienti), do té doby 503 se stavem kroků."""
+    status = READINESS.status()
+    return FastJSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/api/debug/memory")
+def debug_memory():
+    """Paměť workeru, který požadavek obsloužil (RSS/PSS/sdílené stránky) a velikost sdílených polí indexu."""
+    return {"success": True, "data": {**memory_report(), "index": index_memory()}}
+
+
+@app.get("/api/debug/providers")
+def debug_providers():
+    """Stav limiterů volání LLM/embeddingů po modelech a slučování stejných souběžných dotazů."""
+    return {
+        "success": True,
+        "data": {
+            "limits": limiter_metrics(),
+            "coalescing": flight_metrics(),
+            "series_cache": series_cache_info(),
+            "invoices": INVOICES.metrics(),
+            "offers": offer_metrics(),
+        },
+    }
+
+
+@app.get("/api/debug/sessions")
+def debug_sessions():
+    """Obsazenost úložiště kontextu konverzací (počet session, odhad paměti, vypršení/vyřazení)."""
+    return {"success": True, "data": session_metrics()}
+
+
 # Mount frontend last so that /api routes stay accessible
 app.mount("/", StaticFiles(directory=FRONTEND_SERVE_DIR, html=True), name="frontend")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lokální server (uvicorn, volitelně pre-fork workery)")
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    args = parser.parse_args()
+    if args.workers > 1:
+        chat_handler.INDEX_MMAP = True
+        serve_prefork(app, args.host, args.port, args.workers, preload=preload)
+    else:
+        import uvicorn
+
+        uvicorn.run(app, host=args.host, port=args.port)
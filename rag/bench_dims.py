@@ -0,0 +1,65 @@
+import os, sys, argparse, json, time, numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.services.embeddings import fit_pca, get_embedder, project
+
+def _topk(V, Q, k):
+    S = Q @ V.T
+    idx = np.argpartition(-S, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(idx, np.argsort(-np.take_along_axis(S, idx, 1), 1), 1)
+
+def _recall(truth, got):
+    return float(np.mean([len(set(t) & set(g)) / len(t) for t, g in zip(truth, got)]))
+
+def _latency(V, Q, k):
+    times = []
+    for q in Q:
+        t = time.perf_counter(); s = V @ q; np.argpartition(-s, k - 1)[:k]; times.append(time.perf_counter() - t)
+    return float(np.percentile(times, 50) * 1e3), float(np.percentile(times, 95) * 1e3)
+
+def bench(index, dims, k=10, queries=None, n_queries=200, native=False):
+    """
+    Recall@k a latence vyhledávání pro menší dimenze proti přesnému výsledku
+    v plné dimenzi indexu. Varianty: PCA z existujícího indexu (jako
+    ``reduce_index``) a volitelně ``native`` – nové embeddování v dané dimenzi
+    (Titan v2 ``dimensions``, u hashing backendu jiné ``dim``).
+    """
+    with np.load(index, allow_pickle=True) as data:
+        V = data["vectors"].astype("float32"); chunks = data["chunks"].tolist()
+        spec = str(data["embedding"]) if "embedding" in data.files else None
+    V /= np.linalg.norm(V, axis=1, keepdims=True) + 1e-9
+    embedder = get_embedder(spec)
+    if not queries:  # bez dotazů: začátky náhodných pasáží
+        pick = np.random.default_rng(0).choice(len(chunks), min(n_queries, len(chunks)), replace=False)
+        queries = [chunks[i][:200] for i in pick]
+    Q = embedder.embed(queries)
+    truth = _topk(V, Q, k)
+    p50, p95 = _latency(V, Q, k)
+    rows = [{"variant": "full", "dim": V.shape[1], f"recall@{k}": 1.0, "p50_ms": p50, "p95_ms": p95, "index_mb": V.nbytes / 2**20}]
+    for d in dims:
+        mean, P = fit_pca(V, d)
+        Vd, Qd = project(V, mean, P), project(Q, mean, P)
+        p50, p95 = _latency(Vd, Qd, k)
+        rows.append({"variant": "pca", "dim": d, f"recall@{k}": _recall(truth, _topk(Vd, Qd, k)), "p50_ms": p50, "p95_ms": p95, "index_mb": Vd.nbytes / 2**20})
+        if native:
+            e = get_embedder(spec, d); Vn, Qn = e.embed(chunks), e.embed(queries)
+            p50, p95 = _latency(Vn, Qn, k)
+            rows.append({"variant": "native", "dim": d, f"recall@{k}": _recall(truth, _topk(Vn, Qn, k)), "p50_ms": p50, "p95_ms": p95, "index_mb": Vn.nbytes / 2**20})
+    return {"index": index, "embedding": spec, "chunks": len(chunks), "queries": len(queries), "k": k, "results": rows}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index", required=True)
+    ap.add_argument("--dims", default="256,512", help="čárkou oddělené cílové dimenze")
+    ap.add_argument("-k", type=int, default=10)
+    ap.add_argument("--queries", default=None, help="soubor s dotazy, jeden na řádek (jinak začátky pasáží)")
+    ap.add_argument("--n-queries", type=int, default=200)
+    ap.add_argument("--native", action="store_true", help="i nové embeddování v cílové dimenzi (u Bedrocku volá API)")
+    ap.add_argument("--json", default=None, help="uložit výsledky do JSON")
+    a = ap.parse_args()
+    qs = [l.strip() for l in open(a.queries, encoding="utf-8") if l.strip()] if a.queries else None
+    res = bench(a.index, [int(d) for d in a.dims.split(",")], a.k, qs, a.n_queries, a.native)
+    print(f"{'variant':8} {'dim':>5} {'recall@'+str(a.k):>10} {'p50 ms':>8} {'p95 ms':>8} {'MB':>8}")
+    for r in res["results"]:
+        print(f"{r['variant']:8} {r['dim']:>5} {r['recall@'+str(a.k)]:>10.3f} {r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f} {r['index_mb']:>8.1f}")
+    if a.json:
+        with open(a.json, "w", encoding="utf-8") as f: json.dump(res, f, ensure_ascii=False, indent=2)
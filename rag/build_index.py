@@ -1,56 +1,421 @@
-import os, glob, argparse, json, numpy as np
+import os, sys, glob, argparse, json, numpy as np
+import zipfile, hashlib, time, zlib, shutil, cProfile, pstats
+import multiprocessing as mp
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
 from pypdf import PdfReader
-import boto3, re
+import re
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.services.embeddings import EMBEDDINGS_BACKEND, EMBEDDINGS_DIM, get_embedder
+from backend.services.index_shards import BASE_SHARD, LEGACY_INDEX, MANIFEST_NAME, add_shard, file_sha1, load_manifest, new_manifest, save_manifest, shard_file, shard_name
 
-REG = os.getenv("AWS_REGION","eu-central-1")
-EMB_ID = os.getenv("EMBEDDINGS_MODEL_ID","amazon.titan-embed-text-v2:0")
-br = boto3.client("bedrock-runtime", region_name=REG)
+BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE","32"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 2)))
+PDF_TIMEOUT = float(os.getenv("PDF_TIMEOUT","120"))
+PDF_CACHE_VERSION = "1"
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD","0.85"))
+DEDUP_PERMS, DEDUP_BANDS = 64, 8
+CHECKPOINT_EVERY = int(os.getenv("CHECKPOINT_EVERY","512"))
+PROGRESS_SECONDS = float(os.getenv("PROGRESS_SECONDS","10"))
+_MERSENNE = np.uint64((1 << 61) - 1)
+
+_PARA_RE = re.compile(r"\n\s*\n")
+_SENT_RE = re.compile(r"(?<=[.!?…:;])\s+(?=[^\s])")
+
+def iter_files(src):
+    for p in sorted(glob.glob(os.path.join(src,"**","*.*"), recursive=True)):
+        if p.lower().endswith((".md",".txt",".pdf")):
+            yield p
+
+def _read_pdf_pages(path):
+    reader = PdfReader(path)
+    return [pg.extract_text() or "" for pg in reader.pages]
+
+def _extract_pdf_worker(path, cache_path):
+    pages = _read_pdf_pages(path)
+    tmp = cache_path + f".{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(pages, fh, ensure_ascii=False)
+    os.replace(tmp, cache_path)
+
+def _file_hash(path):
+    h = hashlib.sha256(PDF_CACHE_VERSION.encode())
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def extract_pdfs(paths, cache_dir, workers=PDF_WORKERS, timeout=PDF_TIMEOUT):
+    """
+    Extrahuje text PDF v samostatných procesech (max. ``workers`` najednou) a
+    vrací (cesta, seznam stránek | None) ve vstupním pořadí. Výsledek se ukládá
+    do ``cache_dir`` podle SHA-256 obsahu, takže nezměněná PDF se znovu
+    neparsují. Proces, který běží déle než ``timeout`` sekund, se ukončí.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    paths = list(paths)
+    cache = {p: os.path.join(cache_dir, _file_hash(p) + ".json") for p in paths}
+    todo = deque(p for p in paths if not os.path.exists(cache[p]))
+    running = {}; failed = set()
+    for p in paths:
+        while not os.path.exists(cache[p]) and p not in failed:
+            while todo and len(running) < max(1, workers):
+                q = todo.popleft()
+                proc = mp.Process(target=_extract_pdf_worker, args=(q, cache[q]), daemon=True)
+                proc.start(); running[q] = (proc, time.monotonic())
+            for q, (proc, started) in list(running.items()):
+                if not proc.is_alive():
+                    proc.join(); del running[q]
+                    if proc.exitcode != 0 or not os.path.exists(cache[q]):
+                        print("[WARN] PDF:", q, f"extrakce selhala (exit {proc.exitcode})"); failed.add(q)
+                elif time.monotonic() - started > timeout:
+                    proc.terminate(); proc.join(); del running[q]
+                    print("[WARN] PDF:", q, f"timeout po {timeout:.0f} s"); failed.add(q)
+            if p not in running and p not in failed and not os.path.exists(cache[p]) and p not in todo:
+                failed.add(p)
+            time.sleep(0.01)
+        if p in failed:
+            yield p, None; continue
+        with open(cache[p], encoding="utf-8") as fh:
+            yield p, json.load(fh)
+
+class BuildStats:
+    """
+    Čisté časy fází buildu (load, extract, chunk, dedup, embed, write) a počítadla.
+    Fáze jsou vnořené generátory (chunk si tahá dokumenty, ty PDF), proto se čas
+    vnořené fáze od nadřazené odečítá. Každých ``every`` s vypíše průběh.
+    """
+    STAGES = ("load", "extract", "chunk", "dedup", "embed", "write")
+    def __init__(self, every=PROGRESS_SECONDS):
+        self.times = dict.fromkeys(self.STAGES, 0.0); self.counts = {}
+        self.every = every; self.started = self._last = time.perf_counter(); self._stack = []
+
+    def add(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    @contextmanager
+    def span(self, name):
+        t = time.perf_counter(); self._stack.append(0.0)
+        try: yield
+        finally:
+            dt = time.perf_counter() - t; inner = self._stack.pop()
+            self.times[name] += dt - inner
+            if self._stack: self._stack[-1] += dt
+
+    def wrap(self, name, it):
+        it = iter(it)
+        while True:
+            with self.span(name):
+                try: x = next(it)
+                except StopIteration: return
+            yield x
+
+    def progress(self, force=False):
+        now = time.perf_counter()
+        if not force and now - self._last < self.every: return
+        self._last = now; c = self.counts; el = now - self.started
+        print(f"[build] {el:.0f} s: {c.get('files',0)} souborů, {c.get('chunks',0)} chunků, embedováno {c.get('embedded',0)} "
+              f"({c.get('embedded',0) / max(el, 1e-9):.1f}/s), z checkpointu {c.get('resumed',0)}", flush=True)
+
+    def report(self):
+        el = time.perf_counter() - self.started; c = self.counts
+        return {"elapsed_s": round(el, 3), "counts": c,
+                "stages": {k: {"s": round(v, 3), "share": round(v / max(el, 1e-9), 3)} for k, v in self.times.items()},
+                "throughput": {"chunks_per_s": round(c.get("chunks", 0) / max(el, 1e-9), 1),
+                               "embedded_per_s": round(c.get("embedded", 0) / max(self.times["embed"], 1e-9), 1),
+                               "chars_per_s": round(c.get("chars", 0) / max(el, 1e-9))}}
+
+    def print_report(self, rep=None):
+        rep = rep or self.report()
+        print(f"{'fáze':8} {'s':>9} {'podíl':>7}")
+        for k, v in rep["stages"].items(): print(f"{k:8} {v['s']:>9.2f} {v['share']:>7.1%}")
+        print("počty:", ", ".join(f"{k}={v}" for k, v in rep["counts"].items()), "|",
+              ", ".join(f"{k}={v}" for k, v in rep["throughput"].items()))
+
+def _untimed(name, it): return it
+
+def iter_documents(src, cache_dir, stats=None):
+    """(cesta, iterátor (číslo stránky od 1, text)) – PDF po stránkách, textové soubory jako jedna stránka."""
+    wrap = stats.wrap if stats else _untimed
+    files = list(iter_files(src))
+    pdfs = wrap("extract", extract_pdfs([p for p in files if p.lower().endswith(".pdf")], cache_dir))
+    for p in files:
+        if stats: stats.add("files")
+        if p.lower().endswith(".pdf"):
+            _, pages = next(pdfs)
+            if stats: stats.add("pdf_pages", len(pages or []))
+            yield p, enumerate(pages or [], 1)
+            continue
+        with open(p,"r",encoding="utf-8",errors="ignore") as fh:
+            yield p, iter([(1, fh.read())])
+
+def _units(t, size):
+    """Odstavce -> věty; příliš dlouhé věty se rozřežou na okna o velikosti ``size``."""
+    for para in _PARA_RE.split(t):
+        para = re.sub(r"\s+"," ", para).strip()
+        if not para: continue
+        sents = [para] if len(para) <= size else _SENT_RE.split(para)
+        for i, s in enumerate(sents):
+            sep = "\n" if i == 0 else " "
+            while len(s) > size:
+                yield s[:size], sep; s = s[size:]; sep = " "
+            if s: yield s, sep
 
 def chunk_text(t, size=900, overlap=180):
-    t = re.sub(r"\s+"," ", t).strip()
-    out=[]; i=0
-    while i < len(t):
-        out.append(t[i:i+size]); i += size - overlap
-    return [c for c in out if c]
-
-def load_docs(src):
-    docs=[]
-    for p in glob.glob(os.path.join(src,"**","*.*"), recursive=True):
-        pl = p.lower()
-        if pl.endswith((".md",".txt")):
-            docs.append((p, open(p,"r",encoding="utf-8",errors="ignore").read()))
-        elif pl.endswith(".pdf"):
-            try:
-                reader = PdfReader(p)
-                text = "\n".join([pg.extract_text() or "" for pg in reader.pages])
-                docs.append((p, text))
-            except Exception as e:
-                print("[WARN] PDF:", p, e)
-    return docs
-
-def embed_many(chunks):
-    vecs=[]
-    for c in chunks:
-        body = json.dumps({"inputText": c})
-        r = br.invoke_model(modelId=EMB_ID, body=body)
-        vecs.append(json.loads(r["body"].read())["embedding"])
-    V = np.array(vecs, dtype="float32")
-    V /= (np.linalg.norm(V, axis=1, keepdims=True) + 1e-9)
-    return V
-
-def main(src, out):
+    """Skládá celé věty/odstavce do chunků ~``size`` znaků; překryv tvoří poslední věty předchozího chunku."""
+    buf=[]; n=0
+    for u, sep in _units(t, size):
+        if buf and n + len(u) + 1 > size:
+            yield "".join(s + x for x, s in buf).strip()
+            keep=[]; k=0
+            for x, s in reversed(buf):
+                if k + len(x) > overlap: break
+                keep.insert(0, (x, s)); k += len(x) + 1
+            buf, n = keep, k
+        buf.append((u, sep)); n += len(u) + 1
+    if buf:
+        yield "".join(s + x for x, s in buf).strip()
+
+def iter_chunks(src, cache_dir, size=900, overlap=180, stats=None):
+    wrap = stats.wrap if stats else _untimed
+    for p, pages in wrap("load", iter_documents(src, cache_dir, stats)):
+        rel = os.path.relpath(p, src)
+        for page, text in pages:
+            for c in chunk_text(text, size, overlap):
+                if stats: stats.add("chunks"); stats.add("chars", len(c))
+                yield {"text": c, "source": rel, "page": page}
+
+class Deduper:
+    """
+    Odstraní (téměř) duplicitní chunky před embeddováním: MinHash nad slovními
+    3-gramy a LSH po ``bands`` pásmech. Kandidát z LSH se zahodí, pokud odhad
+    Jaccardovy podobnosti s už ponechaným chunkem dosáhne ``threshold``;
+    přesné duplikáty se poznají rovnou podle SHA-1. V paměti jsou jen podpisy
+    ponechaných chunků (``perms`` × uint64).
+    """
+    def __init__(self, threshold=DEDUP_THRESHOLD, perms=DEDUP_PERMS, bands=DEDUP_BANDS, seed=1):
+        assert perms % bands == 0
+        self.threshold = threshold; self.bands = bands; self.rows = perms // bands
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 31, perms, dtype="uint64"); self.b = rng.integers(0, 1 << 31, perms, dtype="uint64")
+        self.exact = set(); self.buckets = {}; self.sigs = []
+        self.seen = 0; self.removed_exact = 0; self.removed_near = 0
+
+    def signature(self, text):
+        words = [zlib.crc32(w.encode()) for w in re.findall(r"\w+", text.lower())] or [0]
+        x = np.array(words, dtype="uint64")
+        if len(x) >= 3: x = (x[:-2] * np.uint64(0x9E3779B1) ^ x[1:-1] * np.uint64(0x85EBCA77) ^ x[2:]) & np.uint64(0xFFFFFFFF)
+        return ((np.unique(x)[:, None] * self.a + self.b) % _MERSENNE).min(axis=0)
+
+    def is_duplicate(self, text):
+        self.seen += 1
+        key = hashlib.sha1(re.sub(r"\s+", " ", text.lower()).strip().encode()).digest()
+        if key in self.exact:
+            self.removed_exact += 1; return True
+        sig = self.signature(text)
+        keys = [(i, sig[i*self.rows:(i+1)*self.rows].tobytes()) for i in range(self.bands)]
+        for j in {j for k in keys for j in self.buckets.get(k, ())}:
+            if np.mean(self.sigs[j] == sig) >= self.threshold:
+                self.removed_near += 1; return True
+        self.exact.add(key); self.sigs.append(sig)
+        for k in keys: self.buckets.setdefault(k, []).append(len(self.sigs) - 1)
+        return False
+
+    def __call__(self, records):
+        for r in records:
+            if not self.is_duplicate(r["text"]): yield r
+
+    def report(self):
+        removed = self.removed_exact + self.removed_near
+        return f"Dedup: removed {removed} of {self.seen} chunks ({removed / max(self.seen, 1):.1%}; exact {self.removed_exact}, near {self.removed_near}, threshold {self.threshold})"
+
+def batched(it, n):
+    it = iter(it)
+    while True:
+        batch = list(islice(it, n))
+        if not batch: return
+        yield batch
+
+def embed_many(chunks, embedder=None):
+    return (embedder or get_embedder()).embed(chunks)
+
+class IndexWriter:
+    """
+    Průběžně ukládá dávky vektorů a metadat do ``<out>/.build`` a na konci
+    je streamuje do ``filename`` (``index.npz`` nebo ``shards/<jméno>.npz``;
+    vectors, chunks, sources, pages) – paměť nezávisí na velikosti korpusu. ``embedding`` (spec backendu) a ``dim``
+    se uloží do indexu, aby se dotazy vektorizovaly stejně.
+
+    Každých ``checkpoint_every`` chunků se soubory fsyncnou a zapíše se
+    ``state.json``. Nový writer se stejným ``key`` (otisk vstupů a nastavení)
+    na checkpoint naváže – ``resumed`` chunků už je hotových a data za
+    checkpointem se zahodí.
+    """
+    def __init__(self, out, embedding="", key=None, checkpoint_every=CHECKPOINT_EVERY, filename=LEGACY_INDEX):
+        self.out = out; self.embedding = embedding; self.key = key; self.checkpoint_every = checkpoint_every
+        self.filename = filename; self.sources = set()
+        stem = os.path.splitext(os.path.basename(filename))[0]
+        self.tmp = os.path.join(out, ".build" if filename == LEGACY_INDEX else f".build-{stem}")
+        self.vec_path = os.path.join(self.tmp, "vectors.f32")
+        self.meta_path = os.path.join(self.tmp, "chunks.jsonl")
+        self.state_path = os.path.join(self.tmp, "state.json")
+        self.count = 0; self.dim = 0; self.width = 1; self.src_width = 1; self.meta_bytes = 0
+        state = self._load_state() if key else None
+        if state:
+            for k in ("count", "dim", "width", "src_width", "meta_bytes"): setattr(self, k, state[k])
+            self._vec = open(self.vec_path, "r+b"); self._vec.truncate(self.count * self.dim * 4); self._vec.seek(0, 2)
+            self._meta = open(self.meta_path, "r+b"); self._meta.truncate(self.meta_bytes); self._meta.seek(0, 2)
+        else:
+            shutil.rmtree(self.tmp, ignore_errors=True); os.makedirs(self.tmp)
+            self._vec = open(self.vec_path, "wb"); self._meta = open(self.meta_path, "wb")
+        self.resumed = self._checkpointed = self.count
+        self._done = self._state()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, encoding="utf-8") as fh: state = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if state.get("key") != self.key or state.get("embedding") != self.embedding: return None
+        if os.path.getsize(self.vec_path) < state["count"] * state["dim"] * 4 or os.path.getsize(self.meta_path) < state["meta_bytes"]: return None
+        return state
+
+    def add(self, V, records):
+        self.dim = V.shape[1]
+        self._vec.write(np.ascontiguousarray(V, dtype="float32").tobytes())
+        for r in records:
+            line = (json.dumps(r, ensure_ascii=False) + "\n").encode("utf-8")
+            self._meta.write(line); self.meta_bytes += len(line)
+            self.width = max(self.width, len(r["text"])); self.src_width = max(self.src_width, len(r["source"]))
+            self.sources.add(r["source"])
+        self.count += len(records)
+        # stav po celé dávce; výjimka uprostřed další dávky nesmí do checkpointu dostat její metadata bez vektorů
+        self._done = self._state()
+        if self.key and self.count - self._checkpointed >= self.checkpoint_every: self.checkpoint()
+
+    def _state(self):
+        return {"key": self.key, "embedding": self.embedding, "count": self.count, "dim": self.dim,
+                "width": self.width, "src_width": self.src_width, "meta_bytes": self.meta_bytes}
+
+    def checkpoint(self):
+        """Uloží stav po poslední dokončené dávce, aby přerušený build mohl navázat (volá se i při chybě)."""
+        if not self.key or self._vec.closed: return
+        for f in (self._vec, self._meta): f.flush(); os.fsync(f.fileno())
+        state = self._done
+        with open(self.state_path + ".tmp", "w", encoding="utf-8") as fh: json.dump(state, fh)
+        os.replace(self.state_path + ".tmp", self.state_path)
+        self._checkpointed = state["count"]
+
+    def _iter_meta(self, key, n=4096):
+        with open(self.meta_path, encoding="utf-8") as fh:
+            yield from batched((json.loads(line)[key] for line in fh), n)
+
+    def _write_stream(self, zf, name, dtype, key):
+        with zf.open(name + ".npy", "w", force_zip64=True) as f:
+            header = {"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)), "fortran_order": False, "shape": (self.count,)}
+            np.lib.format.write_array_header_2_0(f, header)
+            for batch in self._iter_meta(key):
+                f.write(np.array(batch, dtype=dtype).tobytes())
+
+    def close(self):
+        self._vec.close(); self._meta.close()
+        path = os.path.join(self.out, self.filename)
+        tmp_path = path + ".tmp"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        V = np.memmap(self.vec_path, dtype="float32", mode="r", shape=(self.count, self.dim)) if self.count else np.zeros((0, 0), dtype="float32")
+        with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            with zf.open("vectors.npy", "w", force_zip64=True) as f:
+                np.lib.format.write_array(f, V)
+            self._write_stream(zf, "chunks", f"<U{self.width}", "text")
+            self._write_stream(zf, "sources", f"<U{self.src_width}", "source")
+            self._write_stream(zf, "pages", "<i4", "page")
+            with zf.open("embedding.npy", "w") as f:
+                np.lib.format.write_array(f, np.array(self.embedding))
+            with zf.open("dim.npy", "w") as f:
+                np.lib.format.write_array(f, np.array(self.dim, dtype="<i4"))
+        del V
+        os.replace(tmp_path, path)
+        shutil.rmtree(self.tmp)
+        return path
+
+    def discard(self):
+        self._vec.close(); self._meta.close()
+        shutil.rmtree(self.tmp)
+
+def build_key(src, spec, dedup, size=900, overlap=180):
+    """Otisk vstupů a nastavení – checkpoint platí jen pro stejné soubory (velikost, mtime) i parametry."""
+    files = [(os.path.relpath(p, src), os.path.getsize(p), os.stat(p).st_mtime_ns) for p in iter_files(src)]
+    return hashlib.sha1(json.dumps([spec, dedup, size, overlap, PDF_CACHE_VERSION, files]).encode()).hexdigest()
+
+def build(src, out, batch_size, cache_dir, embedder, dedup, resume, stats, filename=LEGACY_INDEX):
+    key = build_key(src, embedder.spec, dedup) if resume else None
+    writer = IndexWriter(out, embedder.spec, key, filename=filename)
+    if writer.resumed: print(f"[build] navazuji na checkpoint: {writer.resumed} chunků už je embedováno")
+    chunks = stats.wrap("chunk", iter_chunks(src, cache_dir, stats=stats))
+    deduper = Deduper(dedup) if dedup else None
+    if deduper: chunks = stats.wrap("dedup", deduper(chunks))
+    # chunky z checkpointu projdou chunkováním i deduplikací znovu (stav Deduperu), embedding se přeskočí
+    stats.add("resumed", sum(1 for _ in islice(chunks, writer.resumed)))
+    try:
+        for batch in batched(chunks, batch_size):
+            with stats.span("embed"): V = embed_many([r["text"] for r in batch], embedder)
+            with stats.span("write"): writer.add(V, batch)
+            stats.add("embedded", len(batch)); stats.progress()
+    except BaseException:
+        writer.checkpoint(); print(f"[build] přerušeno, checkpoint {writer.count} chunků v {writer.tmp}"); raise
+    if not writer.count:
+        writer.discard(); raise SystemExit(f"No docs in {src}")
+    with stats.span("write"): path = writer.close()
+    if deduper: print(deduper.report())
+    return path, writer.count, sorted(writer.sources)
+
+def register_shard(out, name, path, count, spec, sources):
+    """
+    Zapíše shard do ``<out>/manifest.json``. První shard převezme existující
+    ``index.npz`` jako ``base``, takže původní korpus se kvůli novým
+    dokumentům nepřestavuje.
+    """
+    mpath = os.path.join(out, MANIFEST_NAME); legacy = os.path.join(out, LEGACY_INDEX)
+    manifest = load_manifest(mpath) or new_manifest(file_sha1(legacy) if name != BASE_SHARD and os.path.exists(legacy) else None)
+    entry = add_shard(manifest, name, os.path.relpath(path, out).replace(os.sep, "/"), file_sha1(path), count, spec, sources)
+    save_manifest(mpath, manifest)
+    return manifest, entry
+
+def main(src, out, batch_size=BATCH_SIZE, cache_dir=None, embedder=None, dim=None, dedup=DEDUP_THRESHOLD, resume=True, profile=None, shard=None):
     os.makedirs(out, exist_ok=True)
-    docs = load_docs(src)
-    if not docs: raise SystemExit(f"No docs in {src}")
-    chunks=[]
-    for _,t in docs: chunks += chunk_text(t)
-    V = embed_many(chunks)
-    np.savez_compressed(os.path.join(out,"index.npz"), vectors=V, chunks=np.array(chunks, dtype=object))
-    print(f"Built {len(chunks)} chunks -> {os.path.join(out,'index.npz')} (Bedrock)")
+    cache_dir = cache_dir or os.path.join(out, ".cache", "pdf")
+    embedder = get_embedder(embedder, dim)
+    stats = BuildStats()
+    prof = cProfile.Profile() if profile else None
+    if prof: prof.enable()
+    shard = shard_name(shard) if shard else None
+    try:
+        path, count, sources = build(src, out, batch_size, cache_dir, embedder, dedup, resume, stats, shard_file(shard) if shard else LEGACY_INDEX)
+    finally:
+        if prof:
+            prof.disable(); prof.dump_stats(profile)
+            pstats.Stats(prof).sort_stats("cumulative").print_stats(15)
+    rep = stats.report()
+    with open(os.path.join(out, "build_report.json"), "w", encoding="utf-8") as fh: json.dump(rep, fh, ensure_ascii=False, indent=2)
+    stats.print_report(rep)
+    print(f"Built {count} chunks -> {path} ({embedder.spec})")
+    # shard (nebo přestavěný base, pokud už index shardy má) se zapíše do manifestu
+    if shard or os.path.exists(os.path.join(out, MANIFEST_NAME)):
+        manifest, entry = register_shard(out, shard or BASE_SHARD, path, count, embedder.spec, sources)
+        print(f"Manifest v{manifest['version']}: shard {entry['name']} ({len(manifest['shards'])} shardů)")
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--src", required=True)
     ap.add_argument("--out", required=True)
+    ap.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    ap.add_argument("--cache", default=None, help="adresář cache extrahovaných PDF (výchozí <out>/.cache/pdf)")
+    ap.add_argument("--embedder", default=EMBEDDINGS_BACKEND, help="bedrock[:model] nebo hashing (offline, bez sítě)")
+    ap.add_argument("--dim", type=int, default=EMBEDDINGS_DIM, help="dimenze embeddingů (Titan v2: 256/512/1024)")
+    ap.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD, help="odhad Jaccardovy podobnosti, od které se chunk zahodí (0 = bez deduplikace)")
+    ap.add_argument("--no-resume", action="store_true", help="nenavazovat na checkpoint přerušeného buildu")
+    ap.add_argument("--profile", default=None, help="uložit cProfile statistiky do souboru (a vypsat top 15)")
+    ap.add_argument("--shard", default=None, help="postavit jen shard <out>/shards/<jméno>.npz ze --src a zapsat ho do manifest.json (např. nové dokumenty, jeden distributor)")
     a = ap.parse_args()
-    main(a.src, a.out)
+    main(a.src, a.out, a.batch_size, a.cache, a.embedder, a.dim, a.dedup_threshold, not a.no_resume, a.profile, a.shard)
@@ -0,0 +1,46 @@
+import os, sys, argparse, zipfile, shutil, numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.services.embeddings import fit_pca, project
+
+BLOCK = 65536
+REPLACED = ("vectors.npy", "dim.npy", "projection.npy", "projection_mean.npy")
+
+def _write(zf, name, arr):
+    with zf.open(name, "w", force_zip64=True) as f:
+        np.lib.format.write_array(f, np.asarray(arr))
+
+def reduce_index(src, out, dim, sample=200_000):
+    """
+    Dodatečně zmenší existující index PCA na ``dim`` dimenzí bez nového
+    embeddování. Projekce (a střed) se uloží do indexu – dotaz se vektorizuje
+    původním backendem a promítne stejně. Ostatní pole se kopírují beze změny.
+    """
+    with np.load(src, allow_pickle=True) as data:
+        if "projection" in data.files:
+            raise SystemExit(f"{src} už je zmenšený PCA – zmenšujte původní index")
+        V = data["vectors"].astype("float32")
+    V /= np.linalg.norm(V, axis=1, keepdims=True) + 1e-9
+    fit = V if len(V) <= sample else V[np.random.default_rng(0).choice(len(V), sample, replace=False)]
+    mean, P = fit_pca(fit, dim)
+    R = np.empty((len(V), dim), dtype="float32")
+    for s in range(0, len(V), BLOCK): R[s:s+BLOCK] = project(V[s:s+BLOCK], mean, P)
+    tmp = out + ".tmp"
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zout:
+        for info in zin.infolist():
+            if info.filename in REPLACED: continue
+            with zin.open(info) as fi, zout.open(info.filename, "w", force_zip64=True) as fo: shutil.copyfileobj(fi, fo, 1 << 20)
+        _write(zout, "vectors.npy", R); _write(zout, "dim.npy", np.array(dim, dtype="<i4"))
+        _write(zout, "projection.npy", P); _write(zout, "projection_mean.npy", mean)
+    os.replace(tmp, out)
+    X = fit - mean; kept = float(np.square(X @ P).sum() / (np.square(X).sum() + 1e-9))
+    print(f"Reduced {len(V)} x {V.shape[1]} -> {dim} -> {out} (retained variance {kept:.1%})")
+    return out
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index", required=True, help="původní index.npz")
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--dim", type=int, required=True)
+    ap.add_argument("--sample", type=int, default=200_000, help="max. počet vektorů pro výpočet PCA")
+    a = ap.parse_args()
+    reduce_index(a.index, a.out, a.dim, a.sample)